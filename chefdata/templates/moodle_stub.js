@@ -0,0 +1,21 @@
+/* Offline stand-in for the Moodle/YUI runtime scripts removed from this page
+   (scripts=stub), so inline Moodle code on the page runs without errors. */
+(function (window) {
+  var noop = function () {};
+  var yui = {};
+  yui.use = function () { return yui; };
+  yui.on = function () { return yui; };
+  yui.one = function () { return null; };
+  yui.all = function () { return []; };
+  window.YUI = window.YUI || function () { return yui; };
+  window.Y = window.Y || yui;
+  window.M = window.M || {};
+  window.M.cfg = window.M.cfg || {};
+  window.M.str = window.M.str || {};
+  window.M.yui = window.M.yui || {};
+  window.M.util = window.M.util || {};
+  window.M.util.js_pending = window.M.util.js_pending || noop;
+  window.M.util.js_complete = window.M.util.js_complete || noop;
+  window.M.util.init_collapsible_region = window.M.util.init_collapsible_region || noop;
+  window.require = window.require || noop;
+})(window);
@@ -1,26 +1,65 @@
 #!/usr/bin/env python
 
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import importlib
 import json
 import logging
 import os
 import re
+import sys
 import tempfile
+import threading
+import time
 import shutil
-from urllib.parse import urlparse, parse_qs
+import zipfile
+from html import escape as html_escape
+from urllib.parse import urldefrag, urljoin, urlparse, parse_qs
+from xml.etree import ElementTree
 
-from bs4 import BeautifulSoup
-import jinja2
-import requests
+
+class LazyModule(object):
+    """
+    Stand-in for module `name` that imports it on first attribute access. Used
+    for subsystems that quick CLI operations don't need. (Thread-safe, unlike
+    importlib.util.LazyLoader, since the first access may happen in a worker.)
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+bs4 = lazy_import('bs4')
+jinja2 = lazy_import('jinja2')
 
 from le_utils.constants import content_kinds, file_types, licenses
-from ricecooker.chefs import JsonTreeChef
-from ricecooker.classes.licenses import get_license
-from ricecooker.config import LOGGER
-from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter
-from ricecooker.utils.html import download_file
-from ricecooker.utils.zip import create_predictable_zip
 
-from tessa_cralwer import TessaCrawler
+from tessa_nodes import BINARY_EXT, Node, load_tree, save_tree
+from tessa_logging import get_logger, parse_log_levels, setup_logging
+from tessa_search import SEARCH_INDEX_FILENAME, loads_search_index, write_search_index
+from tessa_packaging import ZIP_COMPRESSION_LEVEL, create_predictable_zip, get_process_pool, minify_html_files
+from tessa_media import AUDIO_TRANSCODE_DEFAULTS, get_ffmpeg, transcode_audio_cached
+from tessa_media import PDF_OPTIMIZE_DEFAULTS, get_ghostscript, get_qpdf, optimize_pdf_cached
+from tessa_media import download_resumable
+
+# ricecooker, basiccrawler, and the crawlers are imported on first use, see
+# get_chef_class, get_session, get_tessa_license, and TessaChefBase.crawl
+LOGGER = logging.getLogger()    # same as ricecooker.config.LOGGER
 
 
 
@@ -31,6 +70,34 @@ TREES_DATA_DIR = os.path.join(DATA_DIR, 'trees')
 CRAWLING_STAGE_OUTPUT_TPL = 'web_resource_tree_{}.json'
 SCRAPING_STAGE_OUTPUT_TPL = 'ricecooker_json_tree_{}.json'
 ZIP_FILES_TMP_DIR = os.path.join(DATA_DIR, 'zipfiles')
+ASSET_STORE_DIR = os.path.join(DATA_DIR, 'assetstore')
+ASSET_FETCH_WORKERS = 8
+MODULE_INGEST_MODES = ['sections', 'printable', 'scxml']  # use ingest=printable or ingest=scxml on command line
+RENDER_MODES = ['default', 'lowend']   # use render=lowend on command line for low-end devices
+SCRIPT_POLICIES = ['stub', 'drop', 'keep']   # use scripts=keep on command line to package all scripts
+AUDIO_MODES = ['original', 'download', 'transcode']   # use audio=transcode on command line (needs ffmpeg)
+AUDIO_STORE_DIR = os.path.join(ASSET_STORE_DIR, 'audio')
+PDF_MODES = ['original', 'download', 'optimize']   # use pdf=optimize on command line (needs qpdf, and gs for images)
+PDF_STORE_DIR = os.path.join(ASSET_STORE_DIR, 'pdf')
+SRCSET_WIDTHS = [320, 640, 960]        # responsive image variants made in render=lowend
+LOWEND_CRITICAL_CSS = os.path.join(DATA_DIR, 'templates', 'lowend_critical.css')
+MODULE_MEMO_DIR = os.path.join(ZIP_FILES_TMP_DIR, 'modules')
+MODULE_MEMO_MAX_AGE = 3 * 24 * 3600   # reuse module zips built in the last 3 days (all four lang runs)
+MODULE_SEARCH_INDEX = True   # ship a search index and search box in module zips with a TOC
+SECTION_PREFETCH_WINDOW = 3   # pages fetched ahead of the Next links in modules without TOC
+SCRAPE_HISTORY_PATH = os.path.join(DATA_DIR, 'scrape_history.json')
+SCRAPE_SECONDS_PER_PAGE = 3.0   # expected time per module page when there is no history
+ESTIMATE_DEFAULTS = dict(    # used by --estimate when there is no history for a module
+    module_seconds=60.0,
+    module_pages=10,
+    module_zip_bytes=500 * 1024,
+    module_asset_bytes=300 * 1024,   # download size of a module's images, CSS, and JS
+    page_bytes=60 * 1024,        # download size of an HTML page
+    request_seconds=0.5,         # latency of an uncached request
+    bandwidth=1024 * 1024,       # bytes per second
+)
+STARTUP_TIME_BUDGET = 0.5     # seconds, checked by --benchmark-startup
+STARTUP_LAZY_MODULES = ['ricecooker.chefs', 'basiccrawler.crawler', 'requests', 'bs4', 'jinja2']
 
 
 # TESSA settings
@@ -42,29 +109,74 @@ TESSA_LANG_URL_MAP = {
     'ar': 'http://www.open.edu/openlearnworks/course/view.php?id=2198',
     'sw': 'http://www.open.edu/openlearnworks/course/view.php?id=2199',
 }
-TESSA_LICENSE = get_license(licenses.CC_BY_NC_SA, copyright_holder='TESSA').as_dict()
+TESSA_LICENSE = None    # see get_tessa_license
+TESSA_SEARCH_LABELS = {   # search box in module_index.html
+    'en': dict(placeholder='Search this module', no_results='No results'),
+    'fr': dict(placeholder='Rechercher dans ce module', no_results='Aucun résultat'),
+    'ar': dict(placeholder='ابحث في هذه الوحدة', no_results='لا توجد نتائج'),
+    'sw': dict(placeholder='Tafuta katika moduli hii', no_results='Hakuna matokeo'),
+}
 
 
 
 
 # Set up webcaches
 ################################################################################
-sess = requests.Session()
-cache = FileCache('.webcache')
-basic_adapter = CacheControlAdapter(cache=cache)
-forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
-sess.mount('http://', basic_adapter)
-sess.mount('https://', basic_adapter)
-sess.mount('http://www.open.edu', forever_adapter)
-sess.mount('https://www.open.edu', forever_adapter)
+SESSION = None
+
+def get_session():
+    """
+    The cached requests session used for all page and asset requests, created on
+    first use.
+    """
+    global SESSION
+    if SESSION is None:
+        import requests
+        from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter
+        sess = requests.Session()
+        cache = FileCache('.webcache')
+        basic_adapter = CacheControlAdapter(cache=cache)
+        forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
+        sess.mount('http://', basic_adapter)
+        sess.mount('https://', basic_adapter)
+        sess.mount('http://www.open.edu', forever_adapter)
+        sess.mount('https://www.open.edu', forever_adapter)
+        SESSION = sess
+    return SESSION
+
+
+MEDIA_SESSION = None
+
+def get_media_session():
+    """
+    Uncached requests session for audio and PDF downloads. CacheControl reads
+    the whole response body into memory to cache it, and these files are
+    already kept in the asset store.
+    """
+    global MEDIA_SESSION
+    if MEDIA_SESSION is None:
+        import requests
+        MEDIA_SESSION = requests.Session()
+    return MEDIA_SESSION
+
+
+def get_tessa_license():
+    global TESSA_LICENSE
+    if TESSA_LICENSE is None:
+        from ricecooker.classes.licenses import get_license
+        TESSA_LICENSE = get_license(licenses.CC_BY_NC_SA, copyright_holder='TESSA').as_dict()
+    return TESSA_LICENSE
 
 
 
 # LOGGING SETTINGS
 ################################################################################
-logging.getLogger("cachecontrol.controller").setLevel(logging.WARNING)
+# per-component levels and the background log writer are set up in tessa_logging
+# use log_levels=sections:DEBUG,assets:DEBUG and log_json=path on the command line
 logging.getLogger("requests.packages").setLevel(logging.WARNING)
-LOGGER.setLevel(logging.DEBUG)
+CHEF_LOGGER = get_logger('chef')
+SECTION_LOGGER = get_logger('sections')
+ASSET_LOGGER = get_logger('assets')
 
 
 
@@ -97,48 +209,57 @@ def get_section_filename(sec_url):
 
 
 def make_request(url, *args, **kwargs):
-    response = sess.get(url, *args, **kwargs)
+    response = get_session().get(url, *args, **kwargs)
+    count_job_requests(url, response=response)
     if response.status_code != 200:
-        LOGGER.debug("NOT FOUND:" + url)
+        ASSET_LOGGER.debug("NOT FOUND: %s", url, extra=dict(url=url, status=response.status_code))
     elif not response.from_cache:
-        LOGGER.debug("NOT CACHED:" + url)
+        ASSET_LOGGER.debug("NOT CACHED: %s", url, extra=dict(url=url))
     return response
 
 
 def get_parsed_html_from_url(url, *args, **kwargs):
     html = make_request(url, *args, **kwargs).content
-    return BeautifulSoup(html, "html.parser")
+    return bs4.BeautifulSoup(html, "html.parser")
 
 
 def make_fully_qualified_url(url):
     if url.startswith("//"):
-        print('unexpecded // url', url)
+        ASSET_LOGGER.debug('unexpecded // url %s', url)
         return "http:" + url
     if url.startswith("/"):
-        print('unexpecded / url', url)
+        ASSET_LOGGER.debug('unexpecded / url %s', url)
         return "http://www.open.edu" + url
     if not url.startswith("http"):
-        print('unexpecded non-full url', url)
+        ASSET_LOGGER.debug('unexpecded non-full url %s', url)
         return "http://www.open.edu/" + url
     return url
 
 
 
-def download_module(module_url, lang=None):
-    LOGGER.debug('Scrapring module @ url = ' + module_url)
-    doc = get_parsed_html_from_url(module_url)
-    source_id = parse_qs(urlparse(module_url).query)['id'][0]
+def get_module_title(doc):
     raw_title = doc.select_one("head title").text
     module_title = raw_title.replace('OLCreate:', '')\
             .replace('TESSA_ARABIC', '')\
             .replace('TESSA_Eng', '')\
             .replace('TESSA_Fr', '')\
             .strip()
+    return module_title
+
+
+def get_module_toc(doc, module_url, lang=None):
+    """
+    Build the `module_contents_dict` (sections and subsections, used for the
+    module's index.html) from the TOC sidebar menu of the module page `doc`.
+    Returns None for modules with no TOC in the sidebar.
+    """
+    source_id = parse_qs(urlparse(module_url).query)['id'][0]
     module_contents_dict = dict(
         kind='TessaModuleContentsDict',
         lang=lang,
         source_id=source_id,
-        title=module_title,
+        title=get_module_title(doc),
+        is_simple_module=False,
         children=[],
     )
 
@@ -148,17 +269,12 @@ def download_module(module_url, lang=None):
 
     # Sept 5th: special treatement for modules with no TOC in sidebar
     if current_li_deep is None:
-        return download_module_no_toc(module_url, lang=lang)
+        return None
 
 
     # CREATE MODULE TOC SIDEBAR MENU
     # July 28 HACK : infer module_toc_li  using marker on sublist-li
     ############################################################################
-    destination = tempfile.mkdtemp()
-    print('destination=', destination)
-    # copy css/js/images from skel
-    shutil.copytree('chefdata/templates/module_skel/styles', os.path.join(destination,'styles'))
-
     is_first_section = True
     module_toc_li = current_li_deep.find_parent('li', class_='item-section')
     # print(module_toc_li.prettify())
@@ -166,25 +282,23 @@ def download_module(module_url, lang=None):
     outer_module_ul = module_toc_li.find('ul', class_='child-item-list', recursive=False)
     inner_module_ul = outer_module_ul.find('div', class_='oucontent-contents').find('ul', recursive=False)
     section_lis = inner_module_ul.find_all('li', recursive=False)
-    print(len(section_lis))
+    SECTION_LOGGER.debug('Found %d sections in module TOC', len(section_lis))
 
     # DETECT IF SIMPLE MODULE (single page, so sections) OR COMPLEX MODULE (with sections)
     if len(section_lis) == 0:
-        print('UNEXPECTED --------  len(section_lis) == 0')
-        print(module_url, '<<< <<< '*6)
+        SECTION_LOGGER.warning('UNEXPECTED: no sections in module TOC of %s', module_url)
     if len(section_lis) == 1:
         is_simple_module = True
     else:
         is_simple_module = False
+    module_contents_dict['is_simple_module'] = is_simple_module
 
     # SIMPLE MODULES THAT CONSIST OF A SINGLE PAGE -- becomes index.html
     if  is_simple_module:
         section_li =  section_lis[0]
-        # print('*'*120)
-        # print(section_li.prettify())
         section_title_span = section_li.find('span', class_='oucontent-tree-item')
         section_title = get_text(section_title_span)
-        print('Processing simple module:', section_title)
+        SECTION_LOGGER.debug('Processing simple module: %s', section_title)
         section_dict = dict(
             kind='TessaModuleContentsSection',
             title=section_title,
@@ -192,118 +306,390 @@ def download_module(module_url, lang=None):
             filename='index.html',  # TODO: figure out if this is necessary
             children=[],
         )
-        # print('  section:', section_title)
         module_contents_dict['children'].append(section_dict)
+        return module_contents_dict
+    # /SIMPLE MODULE
+
+
+    # COMPLEX MODULES WITH SECTIONS AND custom-made TOC in index.html
+    for section_li in section_lis:
+
+        if 'download individual sections' in get_text(section_li):  # TODO: AR, SW, FR
+            SECTION_LOGGER.debug('skipping section "Read or download individual sections..."')
+            continue
+
+        section_title_span = section_li.find('span', class_='oucontent-tree-item')
+        if section_title_span:
+            if section_title_span.find('span', class_='current-title'):
+                section_href = module_url
+            else:
+                section_a = section_title_span.find('a')
+                if section_a:
+                    section_href = section_a['href']
+                else:
+                    section_href = '#NOLINK' # for sections like "Top 20 ideas for teaching large classes"
+        else:
+            section_href = '#NOLINK' # for sections like "Read or download individual sections of the m..."
+
+        # special case for first section --- since it doesn't save section in filename
+        # manually call download_page with filename section_1.html with contents of current page
+        if is_first_section:
+            section_filename = 'section-1.html'
+            is_first_section = False
+        else:
+            if '#NOLINK' not in section_href:
+                section_filename = get_section_filename(section_href)
+
+        section_title = get_text(section_title_span)
+
+        section_dict = dict(
+            kind='TessaModuleContentsSection',
+            title=section_title,
+            href=section_href,
+            filename=section_filename,
+            children=[],
+        )
+        module_contents_dict['children'].append(section_dict)
+
 
         subsections_ul = section_li.find('ul', recursive=False)
         if subsections_ul:
-            pass
-            #print('found some subsections...')
+            subsection_lis = subsections_ul.find_all('li')
+            for subsection_li in subsection_lis:
+                subsection_link = subsection_li.find('a')
+                if not subsection_link:  # handle wrird
+                    SECTION_LOGGER.warning('Skipping section %s because no subsection_link', subsection_li.get_text())
+                    continue
+                subsection_href = subsection_link['href']
+                subsection_filename = get_section_filename(subsection_href)
+                subsection_title = get_text(subsection_li)
+                subsection_dict = dict(
+                    kind='TessaModuleContentsSubsection',
+                    title=subsection_title,
+                    href=subsection_href,
+                    filename=subsection_filename,
+                )
+                section_dict['children'].append(subsection_dict)
         else:
-            pass
-            #print('no subsections <ul> found in this section')
+            SECTION_LOGGER.debug('no subsections <ul> found in this section')
 
-        download_page(module_url, destination, 'index.html', lang)
-    # /SIMPLE MODULE
+    return module_contents_dict
 
 
-    # COMPLEX MODULES WITH SECTIONS AND custom-made TOC in index.html
-    else:
-        for section_li in section_lis:
+def make_module_destination():
+    destination = tempfile.mkdtemp()
+    SECTION_LOGGER.debug('destination=%s', destination)
+    # copy css/js/images from skel
+    shutil.copytree('chefdata/templates/module_skel/styles', os.path.join(destination,'styles'))
+    return destination
 
-            if 'download individual sections' in get_text(section_li):  # TODO: AR, SW, FR
-                print('skipping section "Read or download individual sections..." ')
-                continue
 
-            # print(section_li.prettify())
-            # print('>'*80)
-            section_title_span = section_li.find('span', class_='oucontent-tree-item')
-            if section_title_span:
-                if section_title_span.find('span', class_='current-title'):
-                    section_href = module_url
-                else:
-                    section_a = section_title_span.find('a')
-                    if section_a:
-                        section_href = section_a['href']
-                    else:
-                        section_href = '#NOLINK' # for sections like "Top 20 ideas for teaching large classes"
-            else:
-                section_href = '#NOLINK' # for sections like "Read or download individual sections of the m..."
+def get_section_text(html_path):
+    """
+    Text of the main content of a written section file, without the copyright box.
+    """
+    with open(html_path) as f:
+        doc = bs4.BeautifulSoup(f.read(), 'html.parser')
+    content = doc.find('div', class_='oucontent-content') or doc.body or doc
+    for copyright_div in content.find_all('div', class_='oucontent-copyright'):
+        copyright_div.extract()
+    return content.get_text(' ')
 
-            # special case for first section --- since it doesn't save section in filename
-            # manually call download_page with filename section_1.html with contents of current page
-            if is_first_section:
-                section_filename = 'section-1.html'
-                is_first_section = False
-            else:
-                if '#NOLINK' not in section_href:
-                    section_filename = get_section_filename(section_href)
-
-            # accesshide_span = section_title_span.find('span', class_='accesshide')
-            # if accesshide_span:
-            #     accesshide_span.extract()
-            # subsections_ul.extract()
-            section_title = get_text(section_title_span)
-
-            section_dict = dict(
-                kind='TessaModuleContentsSection',
-                title=section_title,
-                href=section_href,
-                filename=section_filename,
-                children=[],
-            )
-            # print('  section:', section_title)
-            module_contents_dict['children'].append(section_dict)
-
-
-            subsections_ul = section_li.find('ul', recursive=False)
-            if subsections_ul:
-                subsection_lis = subsections_ul.find_all('li')
-                for subsection_li in subsection_lis:
-                    # print('<'*100)
-                    # print(subsection_li)
-                    #print('>>>>>')
-                    #print(subsection_li.prettify())
-                    subsection_link = subsection_li.find('a')
-                    if not subsection_link:  # handle wrird
-                        LOGGER.warning('(((((  Skipping section ' + subsection_li.get_text() + ' because no subsection_link')
-                        continue
-                    subsection_href = subsection_link['href']
-                    subsection_filename = get_section_filename(subsection_href)
-                    # subaccesshide_span = subsection_li.find('span', class_='accesshide')
-                    # if subaccesshide_span:
-                    #     subaccesshide_span.extract()
-                    subsection_title = get_text(subsection_li)
-                    subsection_dict = dict(
-                        kind='TessaModuleContentsSubsection',
-                        title=subsection_title,
-                        href=subsection_href,
-                        filename=subsection_filename,
-                    )
-                    # print('    subsection:', subsection_title)
-                    section_dict['children'].append(subsection_dict)
-            else:
-                print('no subsections <ul> found in this section')
 
-        module_index_tmpl = jinja2.Template(open('chefdata/templates/module_index.html').read())
-        index_contents = module_index_tmpl.render(module=module_contents_dict)
-        with open(os.path.join(destination, "index.html"), "w") as f:
-            f.write(index_contents)
+def write_module_search_index(module_contents_dict, destination):
+    """
+    Index the text of all section and subsection files already written to
+    `destination`. Returns the dict used by the search box in module_index.html.
+    """
+    docs = []
+    for section in module_contents_dict['children']:
+        entries = [(section, section['title'])]
+        entries += [(sub, section['title'] + ' \u203a ' + sub['title']) for sub in section['children']]
+        for entry, title in entries:
+            html_path = os.path.join(destination, entry['filename'])
+            if os.path.exists(html_path):
+                docs.append((entry['filename'], title, get_section_text(html_path)))
+    if not docs:
+        return None
+    lang = module_contents_dict.get('lang')
+    search = dict(TESSA_SEARCH_LABELS.get(lang, TESSA_SEARCH_LABELS['en']))
+    search['src'] = write_search_index(docs, destination, lang=lang)
+    SECTION_LOGGER.debug('Indexed %d sections of %s', len(docs), module_contents_dict['title'])
+    return search
+
 
+def relang_module_search(destination, from_lang, to_lang):
+    """
+    Redo the search index and search box labels of the module in `destination`
+    for `to_lang`, as if it had been built in the `to_lang` run (see relang_zip).
+    """
+    index_path = os.path.join(destination, SEARCH_INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        return
+    with open(index_path) as f:
+        index = loads_search_index(f.read())
+    docs = [(filename, title, get_section_text(os.path.join(destination, filename)))
+            for filename, title in index['docs']]
+    write_search_index(docs, destination, lang=to_lang)
+    old_labels = TESSA_SEARCH_LABELS.get(from_lang, TESSA_SEARCH_LABELS['en'])
+    new_labels = TESSA_SEARCH_LABELS.get(to_lang, TESSA_SEARCH_LABELS['en'])
+    module_index_path = os.path.join(destination, 'index.html')
+    with open(module_index_path) as f:
+        html = f.read()
+    html = html.replace('placeholder="' + old_labels['placeholder'] + '"',
+                        'placeholder="' + new_labels['placeholder'] + '"')
+    html = html.replace("createTextNode('" + old_labels['no_results'] + "')",
+                        "createTextNode('" + new_labels['no_results'] + "')")
+    with open(module_index_path, 'w') as f:
+        f.write(html)
+
+
+def write_module_index(module_contents_dict, destination):
+    """
+    Render the module TOC page. Call after the sections are written so they can
+    be indexed for the search box.
+    """
+    search = None
+    if MODULE_SEARCH_INDEX:
+        search = write_module_search_index(module_contents_dict, destination)
+    module_index_tmpl = jinja2.Template(open('chefdata/templates/module_index.html').read())
+    index_contents = module_index_tmpl.render(module=module_contents_dict, search=search)
+    with open(os.path.join(destination, "index.html"), "w") as f:
+        f.write(index_contents)
+
+
+
+
+
+# PACKAGING
+################################################################################
+
+MINIFY_STATS_LOCK = threading.Lock()
+MINIFY_STATS = Counter()   # files, before, after
+
+
+def package_zip(destination, source_url):
+    """
+    Packaging stage for the module or content page from `source_url` built in
+    `destination`: minify its HTML (SCRAPE_SETTINGS['minify']) and zip it
+    (images and audio are stored, the rest deflated at SCRAPE_SETTINGS['zip_level']).
+    """
+    if SCRAPE_SETTINGS['minify']:
+        num_files, before, after = minify_html_files(destination)
+        with MINIFY_STATS_LOCK:
+            MINIFY_STATS.update(files=num_files, before=before, after=after)
+        SECTION_LOGGER.info('Minified %d HTML files of %s: %.1f -> %.1f KB (-%.1f%%)', num_files, source_url,
+                            before / 1024.0, after / 1024.0, 100.0 * (before - after) / max(before, 1))
+    return create_predictable_zip(destination, level=SCRAPE_SETTINGS['zip_level'])
+
+
+def report_minify():
+    with MINIFY_STATS_LOCK:
+        stats = dict(MINIFY_STATS)
+    if stats.get('files'):
+        CHEF_LOGGER.info('Minified %d HTML files: %.1f -> %.1f KB (-%.1f%%)', stats['files'], stats['before'] / 1024.0,
+                         stats['after'] / 1024.0, 100.0 * (stats['before'] - stats['after']) / max(stats['before'], 1))
+
+
+def download_module(module_url, lang=None):
+    SECTION_LOGGER.debug('Scrapring module @ url = %s', module_url)
+    doc = get_parsed_html_from_url(module_url)
+    module_contents_dict = get_module_toc(doc, module_url, lang=lang)
+    if module_contents_dict is None:
+        return download_module_no_toc(module_url, lang=lang)
+
+    destination = make_module_destination()
+
+    # SIMPLE MODULES THAT CONSIST OF A SINGLE PAGE -- becomes index.html
+    if module_contents_dict['is_simple_module']:
+        download_page(module_url, destination, 'index.html', lang)
+
+    # COMPLEX MODULES WITH SECTIONS AND custom-made TOC in index.html
+    else:
         # download the html content from each section/subsection
         for section in module_contents_dict['children']:
             if '#NOLINK' in section['href']:
-                print('nothing to download for #NOLINK section')
+                SECTION_LOGGER.debug('nothing to download for #NOLINK section')
                 continue
             download_section(section['href'], destination, section['filename'], lang)
             for subsection in section['children']:
                 if '#NOLINK' in subsection['href']:
-                    print('nothing to download for #NOLINK subsection')
+                    SECTION_LOGGER.debug('nothing to download for #NOLINK subsection')
                     continue
                 download_section(subsection['href'], destination, subsection['filename'], lang)
-        # /COMPLEX MODULE
+        write_module_index(module_contents_dict, destination)
 
-    zip_path = create_predictable_zip(destination)
+    zip_path = package_zip(destination, module_url)
+    return zip_path
+
+
+
+# PRINTABLE MODULE INGESTION
+################################################################################
+
+PRINTABLE_SPLIT_ATTR = 'data-tessa-split'
+PRINTABLE_HEADINGS = ['h1', 'h2', 'h3', 'h4', 'h5']
+SECTION_NUMBER_RE = re.compile(r'^\d+(\.\d+)*\.?\s+')   # "2 ", "2.1 ", "2.1. "
+
+
+def get_printable_url(module_url):
+    return module_url + ('&' if '?' in module_url else '?') + 'printable=1'
+
+
+def _normalize_title(title):
+    return SECTION_NUMBER_RE.sub('', ' '.join(title.split()).lower())
+
+
+def _get_split_point(heading, main_region, matched_headings):
+    """
+    Move the split point up from `heading` to the outermost wrapper element that
+    starts with it, so section wrappers (e.g. div.oucontent-section) are kept
+    whole instead of being cut in two.
+    """
+    node = heading
+    while node.parent is not None and node.parent is not main_region:
+        parent = node.parent
+        first_child = None
+        for child in parent.children:
+            if isinstance(child, bs4.NavigableString) and not child.strip():
+                continue
+            first_child = child
+            break
+        if first_child is not node:
+            break
+        if any(other is not heading and parent in other.parents for other in matched_headings):
+            break
+        node = parent
+    return node
+
+
+def _match_toc_headings(entries, headings):
+    """
+    Match each TOC entry in `entries`, a list of (depth, entry) with depth 0 for
+    sections and 1 for subsections, in order, to the heading with the same title
+    (ignoring case and section numbers). Sections must all match headings of one
+    level, and subsections headings of one level. No other heading of those levels
+    may have a TOC title, so a heading in the content ("Activity 1", "Summary")
+    can't be taken for the next section. Returns the headings or None.
+    """
+    levels = {}   # depth --> heading tag name
+    matched_headings = []
+    pos = 0
+    for depth, entry in entries:
+        entry_title = _normalize_title(entry['title'])
+        while pos < len(headings):
+            heading = headings[pos]
+            pos += 1
+            if _normalize_title(get_text(heading)) == entry_title \
+                    and levels.setdefault(depth, heading.name) == heading.name:
+                matched_headings.append(heading)
+                break
+        else:
+            SECTION_LOGGER.debug('Printable view has no heading for %s', entry['title'])
+            return None
+    entry_titles = set(_normalize_title(entry['title']) for depth, entry in entries)
+    candidates = [heading for heading in headings
+                  if heading.name in levels.values() and _normalize_title(get_text(heading)) in entry_titles]
+    if len(candidates) != len(matched_headings) or \
+            any(candidate is not heading for candidate, heading in zip(candidates, matched_headings)):
+        SECTION_LOGGER.debug('Printable view has other headings with TOC titles')
+        return None
+    return matched_headings
+
+
+def _cut_before(node, root):
+    """
+    Remove everything before `node` in `root`, keeping the elements around it.
+    """
+    while node is not root:
+        for sibling in list(node.previous_siblings):
+            sibling.extract()
+        node = node.parent
+
+
+def _cut_from(node, root):
+    """
+    Remove `node` and everything after it in `root`, keeping the elements around it.
+    """
+    parent = node.parent
+    for sibling in list(node.next_siblings):
+        sibling.extract()
+    node.extract()
+    node = parent
+    while node is not root:
+        for sibling in list(node.next_siblings):
+            sibling.extract()
+        node = node.parent
+
+
+def split_printable_module(printable_doc, module_contents_dict):
+    """
+    Split the printable view of a whole module into the sections and subsections
+    listed in `module_contents_dict`. Each TOC entry is matched, in order, with
+    a heading in the printable page (see _match_toc_headings) and gets the
+    content up to the next entry, inside copies of the wrappers around it.
+    Returns a list of (toc_entry, section_element) or None if the split failed.
+    """
+    entries = []
+    for section in module_contents_dict['children']:
+        if '#NOLINK' not in section['href']:
+            entries.append((0, section))
+        for subsection in section['children']:
+            if '#NOLINK' not in subsection['href']:
+                entries.append((1, subsection))
+    main_region = printable_doc.find('section', id='region-main')
+    if main_region is None or not entries:
+        return None
+    matched_headings = _match_toc_headings(entries, main_region.find_all(PRINTABLE_HEADINGS))
+    if matched_headings is None:
+        return None
+
+    # mark the split points, then cut a fresh copy of the page for each entry
+    split_points = [_get_split_point(heading, main_region, matched_headings) for heading in matched_headings]
+    for i, split_point in enumerate(split_points):
+        split_point[PRINTABLE_SPLIT_ATTR] = str(i)
+    main_region_html = str(main_region)
+    for split_point in split_points:
+        del split_point[PRINTABLE_SPLIT_ATTR]
+    sections = []
+    for i, (depth, entry) in enumerate(entries):
+        section = bs4.BeautifulSoup(main_region_html, "html.parser").find('section', id='region-main')
+        next_split_point = section.find(attrs={PRINTABLE_SPLIT_ATTR: str(i + 1)})
+        if next_split_point is not None:
+            _cut_from(next_split_point, section)
+        _cut_before(section.find(attrs={PRINTABLE_SPLIT_ATTR: str(i)}), section)
+        for tag in section.find_all(attrs={PRINTABLE_SPLIT_ATTR: True}):
+            del tag[PRINTABLE_SPLIT_ATTR]
+        sections.append((entry, section))
+    return sections
+
+
+def download_module_printable(module_url, lang=None):
+    """
+    Download a whole module with a single request for its printable view
+    (`&printable=1`) and split it locally into the section-N.html files.
+    Falls back to `download_module` (one request per section) if the module has
+    no TOC, is a single page, or the printable view can't be split.
+    """
+    SECTION_LOGGER.debug('Scrapring printable module @ url = %s', module_url)
+    doc = get_parsed_html_from_url(module_url)
+    module_contents_dict = get_module_toc(doc, module_url, lang=lang)
+    if module_contents_dict is None or module_contents_dict['is_simple_module']:
+        return download_module(module_url, lang=lang)
+
+    printable_doc = get_parsed_html_from_url(get_printable_url(module_url))
+    sections = split_printable_module(printable_doc, module_contents_dict)
+    if sections is None:
+        SECTION_LOGGER.warning('Could not split printable view of %s so downloading sections one by one', module_url)
+        return download_module(module_url, lang=lang)
+
+    destination = make_module_destination()
+    for entry, section in sections:
+        section_title = module_contents_dict['title'] + ': ' + entry['title']
+        write_section(section, section_title, destination, entry['filename'], lang)
+    write_module_index(module_contents_dict, destination)
+
+    zip_path = package_zip(destination, module_url)
     return zip_path
 
 
@@ -312,7 +698,7 @@ def _get_next_section_url(doc):
     # PARSE CURRENT PAGE
     wrapper_div = doc.find('div', class_="direction-btn-wrapper")
     if wrapper_div is None:
-        print('wrapper_div is None')
+        SECTION_LOGGER.debug('wrapper_div is None')
         return None
     next_link = wrapper_div.find('a', class_="next")
     if next_link is None:
@@ -321,116 +707,235 @@ def _get_next_section_url(doc):
     return next_link['href']
 
 
-def download_module_no_toc(module_url, lang=None):
-    """
-    Extracting the module table of contents from the sidebad nav doesn't work for certain modules in FR
-    e.g. http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=105334&section=1.1
+# SECTION PREFETCH
+################################################################################
 
-    If NO TOC is available, then we'll crawl pages one by one
-    (`module_contents_dict`)
+def get_section_num(url):
     """
-    LOGGER.debug('Scrapring module @ url = ' + str(module_url))
-    doc = get_parsed_html_from_url(module_url)
-    destination = tempfile.mkdtemp()
-    print('destination=', destination)
+    Returns the section number in `url` (e.g. '3.2') or None for the module page.
+    """
+    section_nums = parse_qs(urlparse(url).query).get('section')
+    return section_nums[0] if section_nums else None
 
-    # copy css/js/images from skel
-    shutil.copytree('chefdata/templates/module_skel/styles', os.path.join(destination,'styles'))
 
-    source_id = parse_qs(urlparse(module_url).query)['id'][0]
-    raw_title = doc.select_one("head title").text
-    module_title = raw_title.replace('OLCreate:', '')\
-            .replace('TESSA_ARABIC', '')\
-            .replace('TESSA_Eng', '')\
-            .replace('TESSA_Fr', '')\
-            .strip()
+def clean_section_url(url):
+    """
+    Section URL as compared with the prefetched guesses: fully qualified, no fragment.
+    """
+    return urldefrag(make_fully_qualified_url(url))[0]
 
-    module_contents_dict = dict(
-        kind='TessaModuleContentsDict',
-        source_id=source_id,
-        title=module_title,
-        lang=lang,
-        children=[],
-    )
-    # print(module_contents_dict)
 
-    # recusively download all sections by following "Next" links
-    current_url = module_url
-    current_section = None
-    is_first_section = True
-    while True:
-        LOGGER.debug('processing current_url' + str(current_url))
-        current_doc = get_parsed_html_from_url(current_url)
+def _section_key(section_num):
+    """
+    Sort key for section numbers: None (module page) < '1' < '1.1' < '1.2' < '2'.
+    """
+    if section_num is None:
+        return (0, 0)
+    parts = section_num.split('.')
+    try:
+        return (int(parts[0]), int(parts[1]) if len(parts) > 1 else 0)
+    except ValueError:
+        return (0, 0)
 
 
-        # special handling for module-level page (no section in url but is really Section 1)
-        if is_first_section:
-            section_filename = 'section-1.html'
-            is_first_section = False
+class SectionPrefetcher(object):
+    """
+    Speculatively fetches the pages likely to follow the current one in a module
+    without TOC, so following the Next links one by one doesn't cost a round-trip
+    per page. Prefetched pages are only used when the URL of a Next link is the
+    URL that was guessed; guesses for sections before the current one are dropped.
+    Use as a context manager, so pending guesses are cancelled on errors too.
+    """
+
+    def __init__(self, module_url, window=SECTION_PREFETCH_WINDOW):
+        self.base_url = re.sub(r'&section=[\d.]+', '', module_url)
+        self.window = window
+        self.executor = ThreadPoolExecutor(max_workers=max(window, 1))
+        self.inflight = {}              # guessed section URL --> Future of the response
+        self.section_pages = None       # True when whole sections have their own page (section=N)
+        self.current = None
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def predict(self, section_num):
+        """
+        Guess the section numbers following `section_num`: the next subsections,
+        then the start of the next section, following the numbering seen so far.
+        """
+        major, minor = _section_key(section_num)
+        major = max(major, 1)   # the module page is section 1
+        guesses = [str(major) + '.' + str(minor + i) for i in range(1, self.window + 1)]
+        if self.section_pages is not False:
+            guesses.insert(1, str(major + 1))
+        if self.section_pages is not True:
+            guesses.insert(2, str(major + 1) + '.1')
+        return guesses
+
+    def observe(self, section_num):
+        """
+        Learn whether the module has pages for whole sections from the Next links.
+        """
+        if section_num is None:
+            return
+        if '.' not in section_num:
+            self.section_pages = True
+        elif section_num.endswith('.1') and self.current is not None \
+                and _section_key(section_num)[0] > _section_key(self.current)[0]:
+            self.section_pages = False
+
+    def get(self, url):
+        """
+        Returns the parsed page at `url`, from the prefetched responses when a
+        guess was right, and starts prefetching the pages likely to follow it.
+        """
+        url = clean_section_url(url)
+        section_num = get_section_num(url)
+        future = self.inflight.pop(url, None)
+        if future is not None:
+            self.hits += 1
+            response = future.result()
+            count_job_requests(url, response=response)
         else:
-            section_filename = get_section_filename(current_url)
+            self.misses += 1
+            response = make_request(url)
+        self.observe(section_num)
+        self.current = section_num
+
+        # drop wrong guesses and prefetch the next pages
+        for guess_url in list(self.inflight.keys()):
+            if _section_key(get_section_num(guess_url)) <= _section_key(section_num):
+                self.inflight.pop(guess_url).cancel()
+                self.wasted += 1
+        for guess in self.predict(section_num):
+            if len(self.inflight) >= self.window + 1:   # + guess for the next section
+                break
+            guess_url = self.base_url + '&section=' + guess
+            if guess_url not in self.inflight:
+                self.inflight[guess_url] = self.executor.submit(make_request, guess_url)
+        return bs4.BeautifulSoup(response.content, "html.parser")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for future in self.inflight.values():
+            future.cancel()
+        self.wasted += len(self.inflight)
+        self.inflight = {}
+        self.executor.shutdown(wait=False)
+        SECTION_LOGGER.info('Section prefetch for %s: %d hits, %d misses, %d wasted guesses',
+                            self.base_url, self.hits, self.misses, self.wasted,
+                            extra=dict(url=self.base_url, hits=self.hits, misses=self.misses, wasted=self.wasted))
 
 
-        # Do the actual download
-        download_section(current_url, destination, section_filename, lang)
 
+def download_module_no_toc(module_url, lang=None):
+    """
+    Extracting the module table of contents from the sidebad nav doesn't work for certain modules in FR
+    e.g. http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=105334&section=1.1
+
+    If NO TOC is available, then we'll crawl pages one by one
+    (`module_contents_dict`)
+    """
+    SECTION_LOGGER.debug('Scrapring module @ url = %s', module_url)
+    with SectionPrefetcher(module_url) as prefetcher:
+        doc = prefetcher.get(module_url)
+        destination = tempfile.mkdtemp()
+        SECTION_LOGGER.debug('destination=%s', destination)
+
+        # copy css/js/images from skel
+        shutil.copytree('chefdata/templates/module_skel/styles', os.path.join(destination,'styles'))
 
-        # Store section/subsecito info so we can build TOC later
-        doc = get_parsed_html_from_url(current_url)
+        source_id = parse_qs(urlparse(module_url).query)['id'][0]
         raw_title = doc.select_one("head title").text
-        the_title = raw_title.replace('OLCreate:', '')\
+        module_title = raw_title.replace('OLCreate:', '')\
                 .replace('TESSA_ARABIC', '')\
                 .replace('TESSA_Eng', '')\
                 .replace('TESSA_Fr', '')\
                 .strip()
 
-        # sections e.g. section-3.html
-        if '_' not in section_filename:
-            section_dict = dict(
-                kind='TessaModuleContentsSection',
-                title=the_title,
-                href=current_url,
-                filename=section_filename,
-                children=[]
-            )
-            module_contents_dict['children'].append(section_dict)
-            print('  - section:', the_title[0:80])
-            current_section = section_dict
+        module_contents_dict = dict(
+            kind='TessaModuleContentsDict',
+            source_id=source_id,
+            title=module_title,
+            lang=lang,
+            children=[],
+        )
+        # print(module_contents_dict)
 
-        # subsections e.g. section-3_2.html
-        else:
-            subsection_title = the_title.replace(module_title,'')
-            subsection_title.replace(current_section['title'],'')
-            subsection_title = subsection_title.lstrip()
-            if subsection_title.startswith(': '):
-                subsection_title = subsection_title.replace(': ', '', 1)
-            subsection_dict = dict(
-                kind='TessaModuleContentsSubsection',
-                title=subsection_title,
-                href=current_url,
-                filename=section_filename,
-            )
-            print('     - subsection:', subsection_title[0:80])
-            current_section['children'].append(subsection_dict)
+        # recusively download all sections by following "Next" links
+        current_url = module_url
+        current_section = None
+        is_first_section = True
+        while True:
+            SECTION_LOGGER.debug('processing current_url %s', current_url)
 
+            # special handling for module-level page (no section in url but is really Section 1)
+            if is_first_section:
+                current_doc = doc
+                section_filename = 'section-1.html'
+                is_first_section = False
+            else:
+                current_doc = prefetcher.get(current_url)
+                section_filename = get_section_filename(current_url)
+            next_url = _get_next_section_url(current_doc)
 
-        # Recurse if next
-        next_url = _get_next_section_url(current_doc)
-        if next_url:
-            current_url = next_url
-        else:
-            break
+
+            # Do the actual download
+            the_title = get_module_title(current_doc)
+            section = current_doc.find('section', id='region-main')
+            write_section(section, the_title, destination, section_filename, lang)
+
+
+            # Store section/subsecito info so we can build TOC later
+
+            # sections e.g. section-3.html
+            if '_' not in section_filename:
+                section_dict = dict(
+                    kind='TessaModuleContentsSection',
+                    title=the_title,
+                    href=current_url,
+                    filename=section_filename,
+                    children=[]
+                )
+                module_contents_dict['children'].append(section_dict)
+                SECTION_LOGGER.debug('  - section: %.80s', the_title)
+                current_section = section_dict
+
+            # subsections e.g. section-3_2.html
+            else:
+                subsection_title = the_title.replace(module_title,'')
+                subsection_title.replace(current_section['title'],'')
+                subsection_title = subsection_title.lstrip()
+                if subsection_title.startswith(': '):
+                    subsection_title = subsection_title.replace(': ', '', 1)
+                subsection_dict = dict(
+                    kind='TessaModuleContentsSubsection',
+                    title=subsection_title,
+                    href=current_url,
+                    filename=section_filename,
+                )
+                SECTION_LOGGER.debug('     - subsection: %.80s', subsection_title)
+                current_section['children'].append(subsection_dict)
+
+
+            # Recurse if next
+            if next_url:
+                current_url = next_url
+            else:
+                break
 
     # for debugging...
     # pp.pprint(module_contents_dict)
 
-    module_index_tmpl = jinja2.Template(open('chefdata/templates/module_index.html').read())
-    index_contents = module_index_tmpl.render(module=module_contents_dict)
-    with open(os.path.join(destination, "index.html"), "w") as f:
-        f.write(index_contents)
+    write_module_index(module_contents_dict, destination)
 
     # return module_contents_dict
-    zip_path = create_predictable_zip(destination)
+    zip_path = package_zip(destination, module_url)
     return zip_path
 
 
@@ -447,11 +952,11 @@ def scrape_content_page(content_page_url, lang):
           - description
           - zip_path
     """
-    LOGGER.debug('Scrapring content page @ url = ' + str(content_page_url))
+    SECTION_LOGGER.debug('Scrapring content page @ url = %s', content_page_url)
     doc = get_parsed_html_from_url(content_page_url)
 
     destination = tempfile.mkdtemp()
-    print('destination=', destination)
+    SECTION_LOGGER.debug('destination=%s', destination)
 
     source_id = parse_qs(urlparse(content_page_url).query)['id'][0]
     raw_title = doc.select_one("head title").text
@@ -473,7 +978,7 @@ def scrape_content_page(content_page_url, lang):
     download_page(content_page_url, destination, 'index.html', lang)
 
     # zip it
-    page_info['zip_path'] = create_predictable_zip(destination)
+    page_info['zip_path'] = package_zip(destination, content_page_url)
 
     # ship it
     return page_info
@@ -481,35 +986,447 @@ def scrape_content_page(content_page_url, lang):
 
 
 
-def download_assets(doc, selector, attr, destination, middleware=None):
+def get_asset_store_path(url, store_dir=ASSET_STORE_DIR):
+    ext = os.path.splitext(urlparse(url).path)[1][:10]
+    return os.path.join(store_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+
+class AssetFetcher(object):
     """
-    Find all assets in `attr` for DOM elements that match `selector` within doc
-    and download them to `destination` dir.
+    Downloads page assets (images, CSS, JS) into a shared asset store using a
+    bounded thread pool. Requests for a URL that is already being downloaded
+    wait on the same download instead of issuing a duplicate (single-flight),
+    and responses are streamed to disk in chunks. Error responses are never
+    stored: the download raises (after retries for transient errors) and the
+    failed future is dropped, so the URL is tried again the next time.
     """
+    CHUNK_SIZE = 64 * 1024
+    MAX_RETRIES = 3
+    RETRY_DELAY = 1.0   # seconds, times the attempt number
+    TRANSIENT_STATUSES = [429, 500, 502, 503, 504]
+
+    def __init__(self, store_dir=ASSET_STORE_DIR, max_workers=ASSET_FETCH_WORKERS):
+        self.store_dir = store_dir
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.futures = {}   # url --> Future of path in asset store
+
+    def get_store_path(self, url):
+        return get_asset_store_path(url, self.store_dir)
+
+    def fetch(self, url):
+        """
+        Returns a Future for the path of `url` in the asset store.
+        """
+        return self._submit(url, self._download, url)
+
+    def fetch_media(self, url, expected_length=None):
+        """
+        Returns a Future for the path of the audio or PDF file at `url` in the
+        asset store, downloaded with tessa_media.download_resumable so memory
+        use stays bounded and dropped connections resume where they stopped.
+        """
+        return self._submit(url, self._download_media, url, expected_length)
+
+    def _submit(self, url, download_fn, *args):
+        with self.lock:
+            future = self.futures.get(url)
+            is_new = future is None
+            if is_new:
+                future = self.executor.submit(download_fn, *args)
+                self.futures[url] = future
+        if is_new:   # outside the lock, the callback runs right away if the download is done
+            future.add_done_callback(lambda done: self._evict_failed(url, done))
+        return future
+
+    def _evict_failed(self, url, future):
+        if future.exception() is not None:
+            with self.lock:
+                if self.futures.get(url) is future:
+                    del self.futures[url]
+
+    def _download_media(self, url, expected_length):
+        store_path = self.get_store_path(url)
+        if os.path.exists(store_path):
+            return store_path
+        os.makedirs(self.store_dir, exist_ok=True)
+        return download_resumable(get_media_session(), url, store_path, expected_length=expected_length)
+
+    def _download(self, url):
+        from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, Timeout
+        store_path = self.get_store_path(url)
+        if os.path.exists(store_path):
+            return store_path
+        os.makedirs(self.store_dir, exist_ok=True)
+        attempt = 0
+        while True:
+            try:
+                return self._download_once(url, store_path)
+            except HTTPError as e:
+                if e.response.status_code not in self.TRANSIENT_STATUSES or attempt >= self.MAX_RETRIES:
+                    raise
+                error = e
+            except (ConnectionError, Timeout, ChunkedEncodingError) as e:
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                error = e
+            attempt += 1
+            ASSET_LOGGER.debug('Retrying %s (attempt %d) after: %s', url, attempt, error)
+            time.sleep(self.RETRY_DELAY * attempt)
+
+    def _download_once(self, url, store_path):
+        tmp_path = store_path + '.part'
+        response = get_session().get(url, stream=True)
+        try:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+        os.replace(tmp_path, store_path)
+        return store_path
+
+
+ASSET_FETCHER = None
+
+def get_asset_fetcher():
+    global ASSET_FETCHER
+    if ASSET_FETCHER is None:
+        ASSET_FETCHER = AssetFetcher()
+    return ASSET_FETCHER
+
+
+def fetch_assets(doc, selector, attr, destination, middleware=None):
+    """
+    Find all assets in `attr` for DOM elements that match `selector` within doc,
+    rewrite `attr` to the local filename and start downloading them.
+    Returns a list of pending downloads to pass to `finish_assets`.
+    """
+    pending = []
     nodes = doc.select(selector)
     for i, node in enumerate(nodes):
         url = make_fully_qualified_url(node[attr])
         filename = "%s_%s" % (i, os.path.basename(url))
         node[attr] = filename
-        download_file(url, destination, request_fn=make_request, filename=filename, middleware_callbacks=middleware)
+        future = get_asset_fetcher().fetch(url)
+        count_job_requests(url, asset=True)
+        pending.append((url, filename, future, middleware))
+    return pending
+
+
+def finish_assets(pending, destination):
+    """
+    Wait for the downloads in `pending` and copy them from the asset store to
+    `destination` dir, applying middleware to their contents if needed.
+    Assets that could not be downloaded are left out (and logged).
+    """
+    for url, filename, future, middleware in pending:
+        try:
+            store_path = future.result()
+        except OSError as e:   # includes requests exceptions
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            ASSET_LOGGER.warning('Could not download %s: %s', url, e, extra=dict(url=url, status=status))
+            continue
+        dest = os.path.join(destination, filename)
+        if middleware:
+            with open(store_path, 'rb') as f:
+                content = f.read().decode('utf-8', 'surrogateescape')
+            content = middleware(content, url=url)
+            with open(dest, 'wb') as f:
+                f.write(content.encode('utf-8', 'surrogateescape'))
+        else:
+            shutil.copyfile(store_path, dest)
+
+
+def download_assets(doc, selector, attr, destination, middleware=None):
+    """
+    Find all assets in `attr` for DOM elements that match `selector` within doc
+    and download them to `destination` dir.
+    """
+    finish_assets(fetch_assets(doc, selector, attr, destination, middleware=middleware), destination)
 
 
 def js_middleware(content, url, **kwargs):
-    return content
+    """
+    Remove source map comments (the maps are not packaged) from kept scripts.
+    """
+    return SOURCE_MAP_RE.sub('', content)
+
+
+
+
+# SCRIPT POLICY
+################################################################################
+# Scripts in the main region are mostly the Moodle/YUI runtime, which is large and
+# does nothing offline. Only scripts matching SCRIPT_ALLOW_PATTERNS are packaged
+# (once per module), the others are replaced by a small stub (scripts=stub) or
+# removed together with the inline code that needs them (scripts=drop).
+
+SCRIPT_ALLOW_PATTERNS = [    # regexps for the URLs of scripts used by interactive content
+    r'mathjax',
+    r'/mod/hvp/',
+    r'/h5p/',
+]
+SCRIPT_ALLOW_RE = re.compile('|'.join(SCRIPT_ALLOW_PATTERNS), re.IGNORECASE)
+MOODLE_INLINE_SCRIPT_RE = re.compile(r'\bM\.(util|cfg|str|yui)\b|\bYUI\(|\bY\.use\(|\brequire\(\[')
+MOODLE_STUB_JS = os.path.join(DATA_DIR, 'templates', 'moodle_stub.js')
+MOODLE_STUB_FILENAME = 'moodle_stub.js'
+SOURCE_MAP_RE = re.compile(r'^[ \t]*//[#@] sourceMappingURL=.*$', re.MULTILINE)
+
+SCRIPT_STATS_LOCK = threading.Lock()
+STRIPPED_SCRIPTS = Counter()   # url --> script tags removed or stubbed
+DEDUPED_SCRIPTS = Counter()    # url --> copies not packaged because the module already has it
+SCRIPT_STATS = Counter()       # inline=inline scripts removed
+
+
+def get_script_filename(url):
+    """
+    Filename for a kept script, the same for all pages of a module.
+    """
+    basename = os.path.basename(urlparse(url).path) or 'script.js'
+    return 'js_' + hashlib.sha1(url.encode('utf-8')).hexdigest()[:10] + '_' + basename
+
+
+def fetch_scripts(section, destination):
+    """
+    Apply the script policy in SCRAPE_SETTINGS['scripts'] to the scripts in
+    `section` and start downloading the ones that are kept.
+    Returns a list of pending downloads to pass to `finish_assets`.
+    """
+    policy = SCRAPE_SETTINGS['scripts']
+    if policy == 'keep':
+        return fetch_assets(section, "script[src]", "src", destination, middleware=js_middleware)
+    pending = []
+    stub_added = False
+    for script in section.find_all('script'):
+        if not script.get('src'):
+            if policy == 'drop' and MOODLE_INLINE_SCRIPT_RE.search(script.string or ''):
+                script.extract()
+                with SCRIPT_STATS_LOCK:
+                    SCRIPT_STATS['inline'] += 1
+            continue
+        url = make_fully_qualified_url(script['src'])
+        if SCRIPT_ALLOW_RE.search(url):
+            filename = get_script_filename(url)
+            script['src'] = filename
+            if os.path.exists(os.path.join(destination, filename)) or any(p[1] == filename for p in pending):
+                with SCRIPT_STATS_LOCK:
+                    DEDUPED_SCRIPTS[url] += 1
+                continue
+            pending.append((url, filename, get_asset_fetcher().fetch(url), js_middleware))
+            count_job_requests(url, asset=True)
+            continue
+        with SCRIPT_STATS_LOCK:
+            STRIPPED_SCRIPTS[url] += 1
+        if policy == 'stub' and not stub_added:
+            shutil.copyfile(MOODLE_STUB_JS, os.path.join(destination, MOODLE_STUB_FILENAME))
+            script['src'] = MOODLE_STUB_FILENAME
+            stub_added = True
+        else:
+            script.extract()
+    return pending
 
 
-def download_section(page_url, destination, filename, lang):
-    LOGGER.debug('Scrapring section/subsectino...' + filename)
-    doc = get_parsed_html_from_url(page_url)
-    source_id = parse_qs(urlparse(page_url).query)['id'][0] + '/' + filename   # or should I use &section=1.6 ?
+def get_script_size(url):
+    """
+    Size of the script at `url` from the asset store, or from a HEAD request.
+    Returns None if unknown.
+    """
+    store_path = get_asset_fetcher().get_store_path(url)
+    if os.path.exists(store_path):
+        return os.path.getsize(store_path)
+    try:
+        response = get_session().head(url, allow_redirects=True)
+        return int(response.headers['content-length'])
+    except Exception as e:
+        ASSET_LOGGER.debug('No size for script %s: %s', url, e)
+        return None
+
+
+def report_script_policy():
+    """
+    Log the script tags removed by the script policy and the bytes saved in zips.
+    """
+    with SCRIPT_STATS_LOCK:
+        stripped = dict(STRIPPED_SCRIPTS)
+        deduped = dict(DEDUPED_SCRIPTS)
+        inline = SCRIPT_STATS['inline']
+    if not stripped and not deduped and not inline:
+        return
+    saved_bytes = 0
+    unknown = 0
+    for url in set(stripped) | set(deduped):
+        size = get_script_size(url)
+        if size is None:
+            unknown += 1
+            continue
+        saved_bytes += size * (stripped.get(url, 0) + deduped.get(url, 0))
+    CHEF_LOGGER.info('Script policy %s: removed %d script tags (%d distinct scripts) and %d inline scripts, '
+                     'skipped %d duplicate copies, saved %.1f KB (%d script sizes unknown)',
+                     SCRAPE_SETTINGS['scripts'], sum(stripped.values()), len(stripped), inline,
+                     sum(deduped.values()), saved_bytes / 1024.0, unknown)
+
+
+
+
+# LOW-END RENDERING
+################################################################################
+# render=lowend rewrites section pages for the low-memory tablets used in schools
+
+PIXELS_RE = re.compile(r'^\s*(\d+)(px)?\s*$')
+SRCSET_IMAGE_FORMATS = ['JPEG', 'PNG']
+
+
+def get_critical_css():
+    """
+    CSS to inline in section pages while styles/main.css loads, or None when
+    pages link main.css as a blocking stylesheet (render=default).
+    """
+    if SCRAPE_SETTINGS['render'] != 'lowend':
+        return None
+    with open(LOWEND_CRITICAL_CSS) as f:
+        return f.read()
+
+
+def get_image_info(path):
+    """
+    Returns (width, height, format, is_animated) of the image at `path`, or None.
+    """
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            return image.width, image.height, image.format, getattr(image, 'is_animated', False)
+    except (OSError, ValueError):
+        return None
+
+
+def make_image_variant(path, width):
+    """
+    Resized copy of the image at `path`, cached in the asset store by content hash.
+    Returns the path of the variant in the asset store.
+    """
+    from PIL import Image
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    variant_path = os.path.join(ASSET_STORE_DIR, 'variants', digest + '-' + str(width) + 'w' + os.path.splitext(path)[1])
+    if os.path.exists(variant_path):
+        return variant_path
+    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+    with Image.open(path) as image:
+        image_format = image.format
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+    tmp_path = variant_path + '.' + str(threading.get_ident()) + '.part'
+    if image_format == 'JPEG':
+        resized.save(tmp_path, format=image_format, quality=80, optimize=True)
+    else:
+        resized.save(tmp_path, format=image_format, optimize=True)
+    os.replace(tmp_path, variant_path)
+    return variant_path
+
+
+def add_image_srcset(img, path, destination, width, display_width):
+    """
+    Add `srcset` and `sizes` to `img` with variants for the SRCSET_WIDTHS narrower
+    than the image. For browsers that ignore srcset, `src` points at the smallest
+    candidate that covers the display width (capped at the largest variant).
+    """
+    candidates = []
+    stem, ext = os.path.splitext(img['src'])
+    for variant_width in SRCSET_WIDTHS:
+        if variant_width >= width:
+            break
+        variant_filename = stem + '-' + str(variant_width) + 'w' + ext
+        shutil.copyfile(make_image_variant(path, variant_width), os.path.join(destination, variant_filename))
+        candidates.append((variant_filename, variant_width))
+    if not candidates:
+        return
+    candidates.append((img['src'], width))
+    img['srcset'] = ', '.join(filename + ' ' + str(w) + 'w' for filename, w in candidates)
+    if display_width:
+        img['sizes'] = '(max-width: %dpx) 100vw, %dpx' % (display_width, display_width)
+    else:
+        img['sizes'] = '100vw'
+    target_width = min(display_width or width, SRCSET_WIDTHS[-1])
+    img['src'] = next(filename for filename, w in candidates if w >= target_width)
+
+
+def apply_lowend_rendering(section, destination):
+    """
+    Rewrite `section` (after its assets are in `destination`) for low-end devices:
+      - images get loading=lazy (except the first), explicit width and height,
+        and srcset variants made here from the downloaded files
+      - iframes get loading=lazy
+      - stylesheet links load without blocking rendering (print media swap)
+      - script[src] get defer, unless there are inline scripts that may use them
+    """
+    for i, img in enumerate(section.find_all('img', src=True)):
+        if i > 0:   # the first image is usually above the fold
+            img['loading'] = 'lazy'
+        img['decoding'] = 'async'
+        path = os.path.join(destination, img['src'])
+        info = get_image_info(path) if os.path.isfile(path) else None
+        if info is None:
+            continue
+        width, height, image_format, is_animated = info
+        attr_width = PIXELS_RE.match(img.get('width', ''))
+        attr_height = PIXELS_RE.match(img.get('height', ''))
+        if not img.get('width') and not img.get('height'):
+            img['width'], img['height'] = str(width), str(height)
+        elif attr_width and not img.get('height'):
+            img['height'] = str(round(height * int(attr_width.group(1)) / width))
+        elif attr_height and not img.get('width'):
+            img['width'] = str(round(width * int(attr_height.group(1)) / height))
+        display_width = PIXELS_RE.match(img.get('width', ''))
+        if image_format in SRCSET_IMAGE_FORMATS and not is_animated:
+            add_image_srcset(img, path, destination, width, int(display_width.group(1)) if display_width else None)
+
+    for iframe in section.find_all('iframe'):
+        iframe['loading'] = 'lazy'
+
+    for link in section.find_all('link', rel='stylesheet', href=True):
+        fallback = bs4.BeautifulSoup('<noscript>' + str(link) + '</noscript>', 'html.parser').noscript
+        link['onload'] = "this.media='" + link.get('media', 'all') + "'"
+        link['media'] = 'print'
+        link.insert_after(fallback)
+
+    scripts = section.find_all('script')
+    if all(script.get('src') for script in scripts):
+        for script in scripts:
+            script['defer'] = 'defer'
+
+
+def download_section(page_url, destination, filename, lang):
+    SECTION_LOGGER.debug('Scrapring section/subsectino... %s', filename)
+    doc = get_parsed_html_from_url(page_url)
+
+    # We're only interested in the main content inside the section#region-main
+    main_region = dict(
+        args=['section'],
+        kwargs={'id': 'region-main'},
+    )
+    section = doc.find(*main_region['args'], **main_region['kwargs'])
+
+    raw_title = doc.select_one("head title").text
+    section_title = raw_title.replace('OLCreate:', '')\
+            .replace('TESSA_ARABIC', '')\
+            .replace('TESSA_Eng', '')\
+            .replace('TESSA_Fr', '')\
+            .strip()
+
+    write_section(section, section_title, destination, filename, lang)
 
-    # We're only interested in the main content inside the section#region-main
-    main_region = dict(
-        args=['section'],
-        kwargs={'id': 'region-main'},
-    )
-    section = doc.find(*main_region['args'], **main_region['kwargs'])
 
+def write_section(section, section_title, destination, filename, lang):
+    """
+    Clean up the main content `section`, download its assets and render it
+    using the section_index.html template to `filename` in `destination`.
+    """
     # CLEANUP
     course_details_header_div = section.find('div', class_='course-details-content-header')
     if course_details_header_div:
@@ -524,21 +1441,18 @@ def download_section(page_url, destination, filename, lang):
         copyright_info_div.extract()
 
     # Download all static assets
-    download_assets(section, "img[src]", "src", destination)     # Images
-    download_assets(section, "link[href]", "href", destination)  # CSS
-    download_assets(section, "script[src]", "src", destination, middleware=js_middleware) # JS
-
-    raw_title = doc.select_one("head title").text
-    section_title = raw_title.replace('OLCreate:', '')\
-            .replace('TESSA_ARABIC', '')\
-            .replace('TESSA_Eng', '')\
-            .replace('TESSA_Fr', '')\
-            .strip()
+    pending = fetch_assets(section, "img[src]", "src", destination)     # Images
+    pending += fetch_assets(section, "link[href]", "href", destination)  # CSS
+    pending += fetch_scripts(section, destination)                       # JS
+    finish_assets(pending, destination)
+    if SCRAPE_SETTINGS['render'] == 'lowend':
+        apply_lowend_rendering(section, destination)
 
     section_dict = dict(
         title=section_title,
         lang=lang,
         main_content=str(section),
+        critical_css=get_critical_css(),
     )
 
     section_index_tmpl = jinja2.Template(open('chefdata/templates/section_index.html').read())
@@ -552,9 +1466,8 @@ def download_section(page_url, destination, filename, lang):
 
 
 def download_page(page_url, destination, filename, lang):
-    LOGGER.debug('Scrapring page...' + page_url)
+    SECTION_LOGGER.debug('Scrapring page... %s', page_url)
     doc = get_parsed_html_from_url(page_url)
-    source_id = parse_qs(urlparse(page_url).query)['id'][0] + '/' + filename   # or should I use &section=1.6 ?
 
     # We're only interested in the main content inside the section#region-main
     main_region = dict(
@@ -563,6 +1476,20 @@ def download_page(page_url, destination, filename, lang):
     )
     section = doc.find(*main_region['args'], **main_region['kwargs'])
 
+    raw_title = doc.select_one("head title").text
+    page_title = raw_title.replace('OLCreate:', '')\
+            .replace('TESSA_ARABIC', '')\
+            .replace('TESSA_Eng', '')\
+            .replace('TESSA_Fr', '')\
+            .strip()
+
+    write_page(section, page_title, destination, filename, lang)
+
+
+def write_page(section, page_title, destination, filename, lang):
+    """
+    Same as `write_section` but renders using the content_page_index.html template.
+    """
     # CLEANUP
     course_details_header_div = section.find('div', class_='course-details-content-header')
     if course_details_header_div:
@@ -577,21 +1504,18 @@ def download_page(page_url, destination, filename, lang):
         copyright_info_div.extract()
 
     # Download all static assets
-    download_assets(section, "img[src]", "src", destination)     # Images
-    download_assets(section, "link[href]", "href", destination)  # CSS
-    download_assets(section, "script[src]", "src", destination, middleware=js_middleware) # JS
-
-    raw_title = doc.select_one("head title").text
-    page_title = raw_title.replace('OLCreate:', '')\
-            .replace('TESSA_ARABIC', '')\
-            .replace('TESSA_Eng', '')\
-            .replace('TESSA_Fr', '')\
-            .strip()
+    pending = fetch_assets(section, "img[src]", "src", destination)     # Images
+    pending += fetch_assets(section, "link[href]", "href", destination)  # CSS
+    pending += fetch_scripts(section, destination)                       # JS
+    finish_assets(pending, destination)
+    if SCRAPE_SETTINGS['render'] == 'lowend':
+        apply_lowend_rendering(section, destination)
 
     page_dict = dict(
         title=page_title,
         lang=lang,
         main_content=str(section),
+        critical_css=get_critical_css(),
     )
     page_index_tmpl = jinja2.Template(open('chefdata/templates/content_page_index.html').read())
     index_contents = page_index_tmpl.render(
@@ -603,11 +1527,614 @@ def download_page(page_url, destination, filename, lang):
 
 
 
+# STRUCTURED XML (SCXML) MODULE INGESTION
+################################################################################
+
+# OU structured content elements --> HTML tags (unknown elements become div)
+SCXML_HTML_TAGS = {
+    'Paragraph': 'p', 'Heading': 'h4', 'SubHeading': 'h5', 'Title': 'h4',
+    'BulletedList': 'ul', 'BulletedSubsidiaryList': 'ul', 'UnNumberedList': 'ul',
+    'NumberedList': 'ol', 'NumberedSubsidiaryList': 'ol',
+    'ListItem': 'li', 'SubListItem': 'li',
+    'Quote': 'blockquote', 'Figure': 'figure', 'Caption': 'figcaption',
+    'Table': 'table', 'TableHead': 'caption', 'thead': 'thead', 'tbody': 'tbody',
+    'tr': 'tr', 'th': 'th', 'td': 'td',
+    'b': 'b', 'i': 'i', 'u': 'u', 'sup': 'sup', 'sub': 'sub', 'br': 'br', 'a': 'a',
+}
+SCXML_INLINE_TAGS = ['InlineFigure', 'InlineEquation', 'GlossaryTerm', 'CrossRef', 'olink',
+                     'SmallCaps', 'language', 'footnote']
+SCXML_SKIP_TAGS = ['Description', 'Alternative', 'SourceReference']
+SCXML_ATTRS = ['href', 'alt', 'colspan', 'rowspan']
+
+
+def get_scxml_url(module_url):
+    return module_url + ('&' if '?' in module_url else '?') + 'content=scxml'
+
+
+def scxml_to_html(element, base_url):
+    """
+    Render the children of the OU structured content `element` as HTML.
+    """
+    parts = [html_escape(element.text or '')]
+    for child in element:
+        parts.append(_scxml_element_to_html(child, base_url))
+        parts.append(html_escape(child.tail or ''))
+    return ''.join(parts)
+
+
+def _scxml_element_to_html(element, base_url):
+    tag = element.tag
+    if tag in SCXML_SKIP_TAGS:
+        return ''
+    if tag in ['Image', 'MediaContent']:
+        src = urljoin(base_url, element.get('src', ''))
+        if tag == 'Image' or element.get('type') == 'image':
+            alt = element.get('alt') or ''
+            return '<img src="%s" alt="%s"/>' % (html_escape(src), html_escape(alt))
+        if element.get('type') in ['audio', 'video']:
+            return '<%s controls="controls" src="%s"></%s>' % (element.get('type'), html_escape(src), element.get('type'))
+        return '<a href="%s">%s</a>' % (html_escape(src), html_escape(os.path.basename(src)))
+    html_tag = SCXML_HTML_TAGS.get(tag, 'span' if tag in SCXML_INLINE_TAGS else 'div')
+    attrs = ''
+    if html_tag == 'div' or html_tag == 'span':
+        attrs += ' class="oucontent-%s"' % tag.lower()
+    for attr in SCXML_ATTRS:
+        if element.get(attr):
+            value = element.get(attr)
+            if attr == 'href':
+                value = urljoin(base_url, value)
+            attrs += ' %s="%s"' % (attr, html_escape(value))
+    if html_tag == 'br':
+        return '<br/>'
+    return '<%s%s>%s</%s>' % (html_tag, attrs, scxml_to_html(element, base_url), html_tag)
+
+
+def _scxml_title(element, number):
+    title_el = element.find('Title')
+    title = ' '.join(''.join(title_el.itertext()).split()) if title_el is not None else ''
+    if not title[:1].isdigit():
+        title = (number + ' ' + title).strip()
+    return title
+
+
+def parse_scxml_module(xml_content, module_url, lang=None):
+    """
+    Build the `module_contents_dict` for the module and the HTML content of each
+    of its sections and subsections from the OU structured content document.
+    Sessions become sections (section-N.html) and their Sections become
+    subsections (section-N_M.html), same as the oucontent &section=N.M numbering.
+    Returns (module_contents_dict, {filename: html}) or None if the document
+    does not contain any sessions with content.
+    """
+    root = ElementTree.fromstring(xml_content)
+    for element in root.iter():
+        if isinstance(element.tag, str):
+            element.tag = element.tag.split('}')[-1]   # drop XML namespaces
+    sessions = list(root.iter('Session'))
+    if not any(child.tag != 'Title' for session in sessions for child in session):
+        return None   # no sessions, or only empty ones (e.g. an access-denied stub document)
+
+    title_el = root.find('ItemTitle')
+    if title_el is None:
+        title_el = root.find('CourseTitle')
+    module_title = ' '.join(''.join(title_el.itertext()).split()) if title_el is not None else ''
+    module_contents_dict = dict(
+        kind='TessaModuleContentsDict',
+        lang=lang,
+        source_id=parse_qs(urlparse(module_url).query)['id'][0],
+        title=module_title,
+        is_simple_module=len(sessions) == 1 and sessions[0].find('Section') is None,
+        children=[],
+    )
+    contents = {}
+    for i, session in enumerate(sessions, start=1):
+        section_title = _scxml_title(session, str(i))
+        section_dict = dict(
+            kind='TessaModuleContentsSection',
+            title=section_title,
+            href=module_url + '&section=' + str(i),
+            filename='section-%d.html' % i,
+            children=[],
+        )
+        module_contents_dict['children'].append(section_dict)
+        session_html = ['<h2>' + html_escape(section_title) + '</h2>']
+        j = 0
+        for child in session:
+            if child.tag == 'Title':
+                continue
+            if child.tag != 'Section':
+                session_html.append(_scxml_element_to_html(child, module_url))
+                continue
+            j += 1
+            subsection_title = _scxml_title(child, '%d.%d' % (i, j))
+            subsection_dict = dict(
+                kind='TessaModuleContentsSubsection',
+                title=subsection_title,
+                href=module_url + '&section=%d.%d' % (i, j),
+                filename='section-%d_%d.html' % (i, j),
+            )
+            section_dict['children'].append(subsection_dict)
+            contents[subsection_dict['filename']] = '<h3>' + html_escape(subsection_title) + '</h3>' \
+                + ''.join(_scxml_element_to_html(el, module_url) for el in child if el.tag != 'Title')
+        contents[section_dict['filename']] = ''.join(session_html)
+    return module_contents_dict, contents
+
+
+def download_module_scxml(module_url, lang=None):
+    """
+    Download a whole module as a single OU structured content document
+    (`&content=scxml`) and render its sections through the same templates.
+    Falls back to `download_module` if the document can't be used.
+    """
+    SECTION_LOGGER.debug('Scrapring scxml module @ url = %s', module_url)
+    response = make_request(get_scxml_url(module_url))
+    parsed = None
+    if response.status_code == 200:
+        try:
+            parsed = parse_scxml_module(response.content, module_url, lang=lang)
+        except ElementTree.ParseError as e:
+            SECTION_LOGGER.warning('Could not parse scxml for %s: %s', module_url, e)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # well-formed XML that doesn't have the structure parse_scxml_module expects
+            SECTION_LOGGER.warning('Unexpected scxml structure for %s: %r', module_url, e)
+    if parsed is None:
+        SECTION_LOGGER.warning('No usable scxml for %s so downloading HTML sections', module_url)
+        return download_module(module_url, lang=lang)
+    module_contents_dict, contents = parsed
+
+    destination = make_module_destination()
+    if module_contents_dict['is_simple_module']:
+        section_html = contents['section-1.html']
+        section = bs4.BeautifulSoup('<section id="region-main">' + section_html + '</section>', "html.parser").section
+        write_page(section, module_contents_dict['title'], destination, 'index.html', lang)
+    else:
+        for section_dict in module_contents_dict['children']:
+            for entry in [section_dict] + section_dict['children']:
+                section_html = contents[entry['filename']]
+                section = bs4.BeautifulSoup('<section id="region-main">' + section_html + '</section>', "html.parser").section
+                section_title = module_contents_dict['title'] + ': ' + entry['title']
+                write_section(section, section_title, destination, entry['filename'], lang)
+        write_module_index(module_contents_dict, destination)
+
+    zip_path = package_zip(destination, module_url)
+    return zip_path
+
+
+
+
+
+# MODULE INGESTION MODE
+################################################################################
+
+SCRAPE_SETTINGS = dict(
+    ingest='sections',   # one of MODULE_INGEST_MODES
+    render='default',    # one of RENDER_MODES
+    scripts='stub',      # one of SCRIPT_POLICIES
+    minify=True,         # minify HTML when packaging, use minify=off on command line to disable
+    zip_level=ZIP_COMPRESSION_LEVEL,   # use zip_level=9 on command line for smaller zips (0 stores all files)
+    audio='original',    # one of AUDIO_MODES
+    pdf='original',      # one of PDF_MODES
+)
+# use audio_bitrate=48k and audio_channels=2 on command line to change
+AUDIO_TRANSCODE_SETTINGS = dict(AUDIO_TRANSCODE_DEFAULTS)
+# use pdf_dpi=200 and pdf_images=off on command line to change
+PDF_OPTIMIZE_SETTINGS = dict(PDF_OPTIMIZE_DEFAULTS)
+
+def scrape_module(module_url, lang=None):
+    """
+    Download the module at `module_url` using the ingestion mode selected in
+    `SCRAPE_SETTINGS['ingest']` and return the path to the module zip.
+    """
+    if SCRAPE_SETTINGS['ingest'] == 'printable':
+        return download_module_printable(module_url, lang=lang)
+    if SCRAPE_SETTINGS['ingest'] == 'scxml':
+        return download_module_scxml(module_url, lang=lang)
+    return download_module(module_url, lang=lang)
+
+
+
+
+# MODULE MEMO
+################################################################################
+
+# settings that change module zips --> value for entries stored before the setting existed
+MEMO_SETTINGS = dict(
+    ingest='sections',
+    render='default',
+    scripts='keep',
+    minify=False,
+    zip_level=6,
+)
+
+
+def canonical_module_url(module_url):
+    """
+    Same module is linked from openlearncreate and openlearnworks URLs, with
+    or without &section=N, so we identify modules by their oucontent id only.
+    """
+    module_id = parse_qs(urlparse(module_url).query)['id'][0]
+    return 'http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=' + module_id
+
+
+def relang_zip(zip_path, from_lang, to_lang):
+    """
+    Make a copy of the module zip at `zip_path` with the lang attributes of all
+    HTML pages changed from `from_lang` to `to_lang`, and its search index and
+    search box labels redone for `to_lang`.
+    """
+    lang_attr_re = re.compile(r'(?<=lang=")' + re.escape(str(from_lang)) + '(?=")')
+    destination = tempfile.mkdtemp()
+    with zipfile.ZipFile(zip_path) as zf:
+        zf.extractall(destination)
+    for root, dirs, filenames in os.walk(destination):
+        for filename in filenames:
+            if filename.endswith('.html'):
+                html_path = os.path.join(root, filename)
+                with open(html_path) as f:
+                    html = f.read()
+                head, sep, rest = html.partition('<head')   # only change the <html> tag
+                with open(html_path, 'w') as f:
+                    f.write(lang_attr_re.sub(str(to_lang), head) + sep + rest)
+    relang_module_search(destination, from_lang, to_lang)
+    new_zip_path = create_predictable_zip(destination, level=SCRAPE_SETTINGS['zip_level'])
+    shutil.rmtree(destination)
+    return new_zip_path
+
+
+class ModuleMemo(object):
+    """
+    Run-wide memo of module zips keyed by canonical module URL and lang, so
+    modules that appear under several subpages (or in several language trees)
+    are only scraped once. Concurrent requests for the same module wait for the
+    first one to finish. Zips are kept in `MODULE_MEMO_DIR` and reused across
+    chef runs for `MODULE_MEMO_MAX_AGE` seconds.
+    """
+
+    def __init__(self, memo_dir=MODULE_MEMO_DIR, max_age=MODULE_MEMO_MAX_AGE):
+        self.memo_dir = memo_dir
+        self.index_path = os.path.join(memo_dir, 'index.json')
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.inflight = {}   # (module_url, lang) --> Future
+        self.forgotten = set()   # (module_url, lang) to scrape again this run, see forget
+        self.hits = 0
+        self.index = {}      # module_url --> {lang: {zip_path:, time:}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as json_file:
+                self.index = json.load(json_file)
+
+    def _lookup(self, module_url, lang):
+        entry = self.index.get(module_url, {}).get(lang)
+        if entry and time.time() - entry['time'] < self.max_age and os.path.exists(entry['zip_path']) \
+                and all(entry.get(key, default) == SCRAPE_SETTINGS[key] for key, default in MEMO_SETTINGS.items()):
+            return entry['zip_path']
+        return None
+
+    def _lookup_other_lang(self, module_url, lang):
+        if (module_url, lang) in self.forgotten:
+            return None
+        for other_lang in self.index.get(module_url, {}):
+            if other_lang != lang and self._lookup(module_url, other_lang):
+                return other_lang
+        return None
+
+    def _store(self, module_url, lang, zip_path):
+        os.makedirs(self.memo_dir, exist_ok=True)
+        module_id = parse_qs(urlparse(module_url).query)['id'][0]
+        memo_zip_path = os.path.join(self.memo_dir, module_id + '_' + str(lang) + '.zip')
+        shutil.copyfile(zip_path, memo_zip_path)
+        entry = dict(zip_path=memo_zip_path, time=time.time())
+        entry.update((key, SCRAPE_SETTINGS[key]) for key in MEMO_SETTINGS)
+        with self.lock:
+            self.index.setdefault(module_url, {})[lang] = entry
+            with open(self.index_path, 'w') as json_file:
+                json.dump(self.index, json_file, indent=2, sort_keys=True)
+        return memo_zip_path
+
+    def lookup(self, module_url, lang):
+        """
+        Returns (zip_path, zip_lang) of the memoized zip that `get_or_build` would
+        reuse for the module at `module_url`: the `lang` zip, or a zip in another
+        lang to copy with relang_zip. Returns (None, None) if the module needs
+        to be scraped.
+        """
+        module_url = canonical_module_url(module_url)
+        zip_path = self._lookup(module_url, lang)
+        if zip_path:
+            return zip_path, lang
+        other_lang = self._lookup_other_lang(module_url, lang)
+        if other_lang:
+            return self._lookup(module_url, other_lang), other_lang
+        return None, None
+
+    def forget(self, module_url, lang):
+        """
+        Drop the memoized `lang` zip of the module at `module_url`, so it is
+        scraped again (not copied from another lang) by this run. Zips of the
+        module in other langs are kept.
+        """
+        module_url = canonical_module_url(module_url)
+        with self.lock:
+            self.forgotten.add((module_url, lang))
+            entries = self.index.get(module_url, {})
+            if entries.pop(lang, None) is not None:
+                if not entries:
+                    del self.index[module_url]
+                with open(self.index_path, 'w') as json_file:
+                    json.dump(self.index, json_file, indent=2, sort_keys=True)
+
+    def get_or_build(self, module_url, lang, build_fn):
+        """
+        Return the zip path for the module at `module_url`, calling `build_fn()`
+        only if no other occurrence of the module has been (or is being) built.
+        """
+        module_url = canonical_module_url(module_url)
+        key = (module_url, lang)
+        with self.lock:
+            zip_path = self._lookup(module_url, lang)
+            if zip_path:
+                self.hits += 1
+                return zip_path
+            future = self.inflight.get(key)
+            is_builder = future is None
+            if is_builder:
+                future = Future()
+                self.inflight[key] = future
+        if not is_builder:
+            self.hits += 1
+            return future.result()
+
+        try:
+            other_lang = self._lookup_other_lang(module_url, lang)
+            if other_lang:
+                SECTION_LOGGER.debug('Reusing %s zip for module %s', other_lang, module_url)
+                zip_path = relang_zip(self._lookup(module_url, other_lang), other_lang, lang)
+                zip_path = self._store(module_url, lang, zip_path)
+            else:
+                zip_path = self._store(module_url, lang, build_fn())
+            future.set_result(zip_path)
+            return zip_path
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+
+
+MODULE_MEMO = None
+
+def get_module_memo():
+    global MODULE_MEMO
+    if MODULE_MEMO is None:
+        MODULE_MEMO = ModuleMemo()
+    return MODULE_MEMO
+
+
+
+
+# SCRAPE SCHEDULING
+################################################################################
+
+JOB_STATS = threading.local()
+
+def count_job_requests(url, response=None, asset=False):
+    """
+    Count a request for `url` made on behalf of the scrape job running in this
+    thread. Page URLs (with the size of their `response`) and asset URLs are
+    kept for the scrape history, so --estimate can tell which of them are not
+    in the webcache or asset store.
+    """
+    counter = getattr(JOB_STATS, 'counter', None)
+    if counter is None:
+        return
+    counter['requests'] += 1
+    if asset:
+        JOB_STATS.assets.add(url)
+    elif response is not None:
+        content_length = response.headers.get('content-length', '')
+        JOB_STATS.pages[url] = int(content_length) if content_length.isdigit() else len(response.content)
+
+
+class ScrapeHistory(object):
+    """
+    Persisted per-source_id record of the last scrape of each node: duration,
+    number of requests, output (zip) bytes, and the pages and assets it
+    downloaded with their sizes.
+    """
+
+    def __init__(self, path=SCRAPE_HISTORY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}   # source_id --> dict(seconds=, requests=, bytes=, time=, pages=, assets=)
+        if os.path.exists(path):
+            with open(path) as json_file:
+                self.entries = json.load(json_file)
+
+    def get(self, source_id):
+        return self.entries.get(source_id)
+
+    def record(self, source_id, seconds, requests, output_bytes, pages=None, assets=None):
+        with self.lock:
+            self.entries[source_id] = dict(seconds=seconds, requests=requests,
+                                           bytes=output_bytes, time=time.time(),
+                                           pages=pages or {}, assets=assets or {})
+
+    def seconds_per_request(self):
+        entries = [e for e in self.entries.values() if e.get('requests')]
+        if not entries:
+            return None
+        return sum(e['seconds'] for e in entries) / sum(e['requests'] for e in entries)
+
+    def save(self):
+        with self.lock:
+            parent_dir = os.path.dirname(self.path)
+            if parent_dir:
+                os.makedirs(parent_dir, exist_ok=True)
+            with open(self.path, 'w') as json_file:
+                json.dump(self.entries, json_file, indent=2, sort_keys=True)
+
+
+SCRAPE_HISTORY = None
+
+def get_scrape_history():
+    global SCRAPE_HISTORY
+    if SCRAPE_HISTORY is None:
+        SCRAPE_HISTORY = ScrapeHistory()
+    return SCRAPE_HISTORY
+
+
+def record_scrape(source_id, build_fn):
+    """
+    Call `build_fn()` and record its duration, requests, and output size in the
+    scrape history. `build_fn` returns a zip path or a dict with a `zip_path`.
+    """
+    JOB_STATS.counter = Counter()
+    JOB_STATS.pages = {}
+    JOB_STATS.assets = set()
+    start = time.time()
+    try:
+        result = build_fn()
+    finally:
+        counter = JOB_STATS.counter
+        JOB_STATS.counter = None
+    zip_path = result['zip_path'] if isinstance(result, dict) else result
+    assets = {}
+    for url in JOB_STATS.assets:
+        store_path = get_asset_store_path(url)
+        if os.path.exists(store_path):
+            assets[url] = os.path.getsize(store_path)
+    get_scrape_history().record(source_id, time.time() - start, counter['requests'],
+                                os.path.getsize(zip_path), pages=JOB_STATS.pages, assets=assets)
+    return result
+
+
+def _scrape_module_files(source_node, child_node):
+    zip_path = get_module_memo().get_or_build(
+        source_node['url'], source_node['lang'],
+        lambda: record_scrape(source_node['source_id'],
+                              lambda: scrape_module(source_node['url'], lang=source_node['lang'])),
+    )
+    module_html_file = dict(
+        file_type=file_types.HTML5,
+        path=zip_path,
+        language=source_node['lang'],
+    )
+    child_node['files'] = [module_html_file]
+
+
+def _scrape_content_page_files(source_node, child_node, lang=None):
+    page_info = record_scrape(source_node['source_id'],
+                              lambda: scrape_content_page(source_node['url'], lang))
+    module_html_file = dict(
+        file_type=file_types.HTML5,
+        path=page_info['zip_path'],
+        language=source_node['lang'],
+    )
+    child_node['files'] = [module_html_file]
+
+
+def _download_media_files(source_node, child_node):
+    media_file = child_node['files'][0]
+    media_file['path'] = record_scrape(source_node['source_id'],
+                                       lambda: get_downloaded_media(source_node['url'], source_node.get('content-length')))
+
+
+def _transcode_audio_files(source_node, child_node):
+    mp3_file = child_node['files'][0]
+    mp3_file['path'] = record_scrape(source_node['source_id'],
+                                     lambda: get_transcoded_audio(source_node['url'], source_node.get('content-length')))
+
+
+def _optimize_pdf_files(source_node, child_node):
+    pdf_file = child_node['files'][0]
+    pdf_file['path'] = record_scrape(source_node['source_id'],
+                                     lambda: get_optimized_pdf(source_node['url'], source_node.get('content-length')))
+
+
+class ScrapeJob(object):
+    """
+    Deferred scrape of `source_node` that fills in the files of `child_node`.
+    """
+    def __init__(self, source_node, child_node, scrape_fn, **kwargs):
+        self.source_node = source_node
+        self.child_node = child_node
+        self.scrape_fn = scrape_fn
+        self.kwargs = kwargs
+        self.expected_seconds = None
+
+    def run(self):
+        self.scrape_fn(self.source_node, self.child_node, **self.kwargs)
+
+
+def run_scrape_job(scheduler, job):
+    if scheduler is None:
+        job.run()
+    else:
+        scheduler.add(job)
+
+
+class ScrapeScheduler(object):
+    """
+    Runs the scrape jobs collected by `_build_json_tree` on `workers` threads,
+    longest expected job first (LPT) so no big module is left for the end.
+    Expected durations come from the scrape history; jobs never run before are
+    estimated from the crawl data (content-length of media, section_count of
+    modules) and ESTIMATE_DEFAULTS, without making any requests.
+    """
+
+    def __init__(self, workers=1, history=None):
+        self.workers = workers
+        self.history = history or get_scrape_history()
+        self.jobs = []
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def expected_seconds(self, job):
+        source_node = job.source_node
+        if source_node['kind'] == 'TessaModule':
+            zip_path, zip_lang = get_module_memo().lookup(source_node['url'], source_node['lang'])
+            if zip_path:
+                return 0.0
+        stats = self.history.get(source_node['source_id'])
+        if stats:
+            return stats['seconds']
+        if source_node['kind'] in ['TessaAudioResouce', 'TessaPDFDocument']:
+            size = int(source_node.get('content-length') or 0)
+            return ESTIMATE_DEFAULTS['request_seconds'] + size / ESTIMATE_DEFAULTS['bandwidth']
+        seconds_per_page = self.history.seconds_per_request() or SCRAPE_SECONDS_PER_PAGE
+        if source_node['kind'] == 'TessaModule':
+            return (source_node.get('section_count') or ESTIMATE_DEFAULTS['module_pages']) * seconds_per_page
+        return seconds_per_page
+
+    def run(self):
+        expected = [self.expected_seconds(job) for job in self.jobs]
+        for job, seconds in zip(self.jobs, expected):
+            job.expected_seconds = seconds
+        ordered = sorted(self.jobs, key=lambda job: job.expected_seconds, reverse=True)
+        CHEF_LOGGER.info('Scheduling %d scrape jobs on %d workers, expected %.0fs of work',
+                         len(ordered), self.workers, sum(expected))
+        try:
+            if self.workers > 1:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for future in [executor.submit(job.run) for job in ordered]:
+                        future.result()
+            else:
+                for job in ordered:
+                    job.run()
+        finally:
+            self.history.save()
+
+
 
-def _build_json_tree(parent_node, sourcetree, lang=None):
-    # type: (dict, List[dict], str) -> None
+
+def _build_json_tree(parent_node, sourcetree, lang=None, scheduler=None):
+    # type: (dict, List[dict], str, ScrapeScheduler) -> None
     """
     Parse the web resource nodes given in `sourcetree` and add as children of `parent_node`.
+    Modules and content pages are scraped right away, or added to `scheduler`
+    to be scraped later in parallel (their `files` get filled in then).
     """
     # EXPECTED_NODE_TYPES = ['TessaLangWebRessourceTree', 'TessaCategory', 'TessaSubpage',
     #                        'TessaModule']
@@ -622,7 +2149,7 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
         if kind == 'TessaLangWebRessourceTree':
             # this is the root of the tree, no special attributes, just process children
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(parent_node, source_tree_children, lang=lang)
+            _build_json_tree(parent_node, source_tree_children, lang=lang, scheduler=scheduler)
 
         elif kind == 'TessaSubpage':
             child_node = dict(
@@ -635,9 +2162,9 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 children=[],
             )
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created new TopicNode for TessaSubpage titled ' + child_node['title'])
+            CHEF_LOGGER.debug('Created new TopicNode for TessaSubpage titled %s', child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, lang=lang)
+            _build_json_tree(child_node, source_tree_children, lang=lang, scheduler=scheduler)
 
         elif kind == 'TessaAudioResourcesSubpage':
             child_node = dict(
@@ -650,9 +2177,9 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 children=[],
             )
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created new TopicNode for TessaAudioResourcesSubpage titled ' + child_node['title'])
+            CHEF_LOGGER.debug('Created new TopicNode for TessaAudioResourcesSubpage titled %s', child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, lang=lang)
+            _build_json_tree(child_node, source_tree_children, lang=lang, scheduler=scheduler)
 
         elif kind == 'TessaAudioResourceTopicSubpage':
             child_node = dict(
@@ -665,9 +2192,9 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 children=[],
             )
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created new TopicNode for TessaAudioResourceTopicSubpage titled ' + child_node['title'])
+            CHEF_LOGGER.debug('Created new TopicNode for TessaAudioResourceTopicSubpage titled %s', child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, lang=lang)
+            _build_json_tree(child_node, source_tree_children, lang=lang, scheduler=scheduler)
 
         elif kind == 'TessaAudioResourceSection':
             child_node = dict(
@@ -680,9 +2207,9 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 children=[],
             )
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created new TopicNode for TessaAudioResourceSection titled ' + child_node['title'])
+            CHEF_LOGGER.debug('Created new TopicNode for TessaAudioResourceSection titled %s', child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, lang=lang)
+            _build_json_tree(child_node, source_tree_children, lang=lang, scheduler=scheduler)
 
         elif kind == 'TessaModule':
             child_node = dict(
@@ -691,38 +2218,26 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 language=source_node['lang'],
                 title=source_node['title'],
                 description='', # 'fake descri', # TODO source_node['description']
-                license=TESSA_LICENSE,
+                license=get_tessa_license(),
                 files=[],
             )
-            zip_path = download_module(source_node['url'], lang=source_node['lang'])
-            module_html_file = dict(
-                file_type=file_types.HTML5,
-                path=zip_path,
-                language=source_node['lang'],
-            )
-            child_node['files'] = [module_html_file]
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created HTML5AppNode for TessaModule titled ' + child_node['title'])
+            run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _scrape_module_files))
+            CHEF_LOGGER.debug('Created HTML5AppNode for TessaModule titled %s', child_node['title'])
 
         elif kind == 'TessaContentPage':
-            page_info = scrape_content_page(source_node['url'], lang)
             child_node = dict(
                 kind=content_kinds.HTML5,
                 source_id=source_node['source_id'],
                 language=source_node['lang'],
                 title=source_node['title'],
                 description=source_node.get('description', ''),
-                license=TESSA_LICENSE,
+                license=get_tessa_license(),
                 files=[],
             )
-            module_html_file = dict(
-                file_type=file_types.HTML5,
-                path=page_info['zip_path'],
-                language=source_node['lang'],
-            )
-            child_node['files'] = [module_html_file]
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created HTML5AppNode for TessaContentPage titled ' + child_node['title'])
+            run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _scrape_content_page_files, lang=lang))
+            CHEF_LOGGER.debug('Created HTML5AppNode for TessaContentPage titled %s', child_node['title'])
 
         elif kind == 'TessaAudioResouce':
             child_node = dict(
@@ -731,7 +2246,7 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 language=source_node['lang'],
                 title=source_node.get('title', 'NOTITLE'),
                 description='', # 'fake descri', # TODO source_node['description']
-                license=TESSA_LICENSE,
+                license=get_tessa_license(),
                 files=[],
             )
             mp3_file = dict(
@@ -741,7 +2256,11 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
             )
             child_node['files'] = [mp3_file]
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created AudioNode from file url ' + source_node['url'])
+            if SCRAPE_SETTINGS['audio'] == 'transcode':
+                run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _transcode_audio_files))
+            elif SCRAPE_SETTINGS['audio'] == 'download':
+                run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _download_media_files))
+            CHEF_LOGGER.debug('Created AudioNode from file url %s', source_node['url'])
 
         elif kind == 'TessaPDFDocument':
             child_node = dict(
@@ -750,7 +2269,7 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
                 language=source_node['lang'],
                 title=source_node.get('title', 'NOTITLE'),
                 description='', # 'fake descri', # TODO source_node['description']
-                license=TESSA_LICENSE,
+                license=get_tessa_license(),
                 files=[],
             )
             pdf_file = dict(
@@ -760,7 +2279,11 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
             )
             child_node['files'] = [pdf_file]
             parent_node['children'].append(child_node)
-            LOGGER.debug('Created PDF Document Node from url ' + source_node['url'])
+            if SCRAPE_SETTINGS['pdf'] == 'optimize':
+                run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _optimize_pdf_files))
+            elif SCRAPE_SETTINGS['pdf'] == 'download':
+                run_scrape_job(scheduler, ScrapeJob(source_node, child_node, _download_media_files))
+            CHEF_LOGGER.debug('Created PDF Document Node from url %s', source_node['url'])
 
         else:
             # LOGGER.critical("Encountered an unknown content node format.")
@@ -771,15 +2294,269 @@ def _build_json_tree(parent_node, sourcetree, lang=None):
 
 
 
+# MEDIA DOWNLOADS
+################################################################################
+
+def get_downloaded_media(url, expected_length=None):
+    """
+    Download the audio or PDF file at `url` into the asset store (resumable, see
+    AssetFetcher.fetch_media) and return its local path. Falls back to `url`,
+    for ricecooker to download, if the download fails.
+    """
+    count_job_requests(url, asset=True)
+    try:
+        return get_asset_fetcher().fetch_media(url, expected_length).result()
+    except (OSError, RuntimeError) as e:
+        ASSET_LOGGER.warning('Could not download %s so ricecooker will fetch it: %s', url, e)
+        return url
+
+
+
+
+# AUDIO TRANSCODING
+################################################################################
+
+AUDIO_STATS_LOCK = threading.Lock()
+AUDIO_STATS = Counter()   # files, cached, failed, before, after
+
+
+def get_transcoded_audio(url, expected_length=None):
+    """
+    Download the audio file at `url` into the asset store and transcode it with
+    AUDIO_TRANSCODE_SETTINGS in the packaging process pool (see tessa_media).
+    Returns the local path to use in the audio node: the transcoded file, or
+    the original if transcoding failed or didn't make it smaller.
+    """
+    src_path = get_downloaded_media(url, expected_length)
+    if src_path == url:
+        return url
+    try:
+        dest_path, before, after, was_cached = get_process_pool().submit(
+            transcode_audio_cached, src_path, AUDIO_STORE_DIR, **AUDIO_TRANSCODE_SETTINGS).result()
+    except (OSError, RuntimeError) as e:
+        ASSET_LOGGER.warning('Could not transcode %s so using the original file: %s', url, e)
+        with AUDIO_STATS_LOCK:
+            AUDIO_STATS['failed'] += 1
+        return src_path
+    if after >= before:
+        dest_path, after = src_path, before
+    with AUDIO_STATS_LOCK:
+        AUDIO_STATS.update(files=1, cached=int(was_cached), before=before, after=after)
+    ASSET_LOGGER.debug('Transcoded %s: %d -> %d bytes', url, before, after)
+    return dest_path
+
+
+def report_audio():
+    with AUDIO_STATS_LOCK:
+        stats = dict(AUDIO_STATS)
+    if stats.get('files') or stats.get('failed'):
+        CHEF_LOGGER.info('Transcoded %d audio files (%d from cache, %d failed): %.1f -> %.1f MB (-%.1f%%)',
+                         stats.get('files', 0), stats.get('cached', 0), stats.get('failed', 0),
+                         stats.get('before', 0) / 1048576.0, stats.get('after', 0) / 1048576.0,
+                         100.0 * (stats.get('before', 0) - stats.get('after', 0)) / max(stats.get('before', 0), 1))
+
+
+
+
+# PDF OPTIMIZATION
+################################################################################
+
+PDF_STATS_LOCK = threading.Lock()
+PDF_STATS = Counter()   # files, cached, failed, before, after
+PDF_RESULTS = []        # (url, before, after) for the per-file report
+
+
+def get_optimized_pdf(url, expected_length=None):
+    """
+    Download the PDF at `url` into the asset store and optimize it with
+    PDF_OPTIMIZE_SETTINGS in the packaging process pool (see tessa_media).
+    Returns the local path to use in the document node: the optimized file, or
+    the original if optimizing failed or didn't make it smaller.
+    """
+    src_path = get_downloaded_media(url, expected_length)
+    if src_path == url:
+        return url
+    try:
+        dest_path, before, after, was_cached = get_process_pool().submit(
+            optimize_pdf_cached, src_path, PDF_STORE_DIR, **PDF_OPTIMIZE_SETTINGS).result()
+    except (OSError, RuntimeError) as e:
+        ASSET_LOGGER.warning('Could not optimize %s so using the original file: %s', url, e)
+        with PDF_STATS_LOCK:
+            PDF_STATS['failed'] += 1
+        return src_path
+    if after >= before:
+        dest_path, after = src_path, before
+    with PDF_STATS_LOCK:
+        PDF_STATS.update(files=1, cached=int(was_cached), before=before, after=after)
+        PDF_RESULTS.append((url, before, after))
+    return dest_path
+
+
+def report_pdf():
+    """
+    Log the before/after size of each optimized PDF (biggest savings first) and the total.
+    """
+    with PDF_STATS_LOCK:
+        stats = dict(PDF_STATS)
+        results = sorted(PDF_RESULTS, key=lambda result: result[2] - result[1])
+    for url, before, after in results:
+        CHEF_LOGGER.info('PDF %.1f -> %.1f KB (-%.1f%%) %s', before / 1024.0, after / 1024.0,
+                         100.0 * (before - after) / max(before, 1), url)
+    if stats.get('files') or stats.get('failed'):
+        CHEF_LOGGER.info('Optimized %d PDF files (%d from cache, %d failed): %.1f -> %.1f MB (-%.1f%%)',
+                         stats.get('files', 0), stats.get('cached', 0), stats.get('failed', 0),
+                         stats.get('before', 0) / 1048576.0, stats.get('after', 0) / 1048576.0,
+                         100.0 * (stats.get('before', 0) - stats.get('after', 0)) / max(stats.get('before', 0), 1))
+
+
+
+
+def write_ricecooker_json_tree(ricecooker_json_tree, lang):
+    """
+    Write out ricecooker_json_tree_{{lang}}.json (and its binary snapshot).
+    """
+    json_file_name = os.path.join(TREES_DATA_DIR, SCRAPING_STAGE_OUTPUT_TPL.format(lang))
+    ricecooker_tree = Node.from_dict(ricecooker_json_tree)
+    save_tree(ricecooker_tree, json_file_name, indent=2)
+    save_tree(ricecooker_tree, json_file_name.replace('.json', BINARY_EXT))
+    LOGGER.info('Intermediate result stored in ' + json_file_name)
+
+
+def find_nodes(tree, source_ids):
+    """
+    Returns (parent, index, node) for all nodes in `tree` with a source_id in `source_ids`.
+    """
+    found = []
+    def _recursive_find(parent):
+        for i, child in enumerate(parent.get('children') or []):
+            if child.get('source_id') in source_ids:
+                found.append((parent, i, child))
+            _recursive_find(child)
+    _recursive_find(tree)
+    return found
+
+
+def partial_scraping_part(options):
+    """
+    Rebuild only the nodes given as `only=<source_id,...>` (nodes themselves, a
+    topic keeps its current children) or `subtree=<source_id>` (node and all its
+    descendants) and splice them into the existing ricecooker json tree.
+    Rebuilt modules are scraped again instead of reused from the module memo.
+    """
+    lang = options['lang']
+    json_file_name = os.path.join(TREES_DATA_DIR, SCRAPING_STAGE_OUTPUT_TPL.format(lang))
+    if not os.path.exists(json_file_name):
+        raise ValueError('No ' + json_file_name + ' to update. Run a full scrape first.')
+    with open(json_file_name) as json_file:
+        ricecooker_json_tree = json.load(json_file)
+    web_resource_tree = load_tree(os.path.join(TREES_DATA_DIR, CRAWLING_STAGE_OUTPUT_TPL.format(lang)))
+
+    keep_children = 'only' in options
+    source_ids = [source_id.strip() for source_id in options.get('only', options.get('subtree', '')).split(',')
+                  if source_id.strip()]
+    scheduler = ScrapeScheduler(workers=int(options.get('scrape_workers', 1)))
+    rebuilt = {}
+    for source_id in source_ids:
+        matches = find_nodes(web_resource_tree, set([source_id]))
+        if not matches:
+            raise ValueError('source_id ' + source_id + ' not found in the web resource tree for lang=' + lang)
+        source_node = matches[0][2]
+        if keep_children and source_node.get('children'):
+            source_node = Node.from_dict(dict(source_node.to_dict(), children=[]))
+        def _forget_modules(node):
+            if node.get('kind') == 'TessaModule':
+                get_module_memo().forget(node['url'], lang)
+            for child in node.get('children') or []:
+                _forget_modules(child)
+        _forget_modules(source_node)
+        new_parent = dict(children=[])
+        _build_json_tree(new_parent, [source_node], lang=lang, scheduler=scheduler)
+        if not new_parent['children']:
+            raise ValueError('source_id ' + source_id + ' of kind ' + str(source_node.get('kind'))
+                             + ' does not produce a node in the ricecooker json tree for lang=' + lang)
+        rebuilt[source_id] = new_parent['children']
+    scheduler.run()
+
+    for source_id, new_nodes in rebuilt.items():
+        old_matches = find_nodes(ricecooker_json_tree, set([source_id]))
+        if not old_matches:
+            raise ValueError('source_id ' + source_id + ' not found in ' + json_file_name + '. Run a full scrape first.')
+        for parent, index, old_node in old_matches:
+            new_node = json.loads(json.dumps(new_nodes[0]))   # separate copy for each occurrence
+            if keep_children and 'children' in old_node:
+                new_node['children'] = old_node['children']
+            parent['children'][index] = new_node
+        LOGGER.info('Rebuilt ' + source_id + ' (' + str(len(old_matches)) + ' occurrences)')
+
+    # other nodes are reused as they are, so check their files are still around
+    missing = []
+    def _check_files(node):
+        for file_dict in node.get('files', []):
+            path = file_dict.get('path', '')
+            if not path.startswith('http') and not os.path.exists(path):
+                missing.append(node['source_id'])
+        for child in node.get('children', []):
+            _check_files(child)
+    _check_files(ricecooker_json_tree)
+    if missing:
+        LOGGER.warning('Files missing for ' + str(len(missing)) + ' reused nodes (rebuild them with only=...): '
+                       + ','.join(missing[:20]))
+    write_ricecooker_json_tree(ricecooker_json_tree, lang)
+
+
 def scraping_part(args, options):
     """
     Download all categories, subpages, modules, and resources from open.edu.
+    Use only=<source_id,...> or subtree=<source_id> to rebuild part of the tree.
     """
     lang = options['lang']
+    ingest = options.get('ingest', SCRAPE_SETTINGS['ingest'])
+    if ingest not in MODULE_INGEST_MODES:
+        raise ValueError('Unknown ingest=' + ingest + ' option. Supported modes are ' + ', '.join(MODULE_INGEST_MODES))
+    SCRAPE_SETTINGS['ingest'] = ingest
+    render = options.get('render', SCRAPE_SETTINGS['render'])
+    if render not in RENDER_MODES:
+        raise ValueError('Unknown render=' + render + ' option. Supported modes are ' + ', '.join(RENDER_MODES))
+    SCRAPE_SETTINGS['render'] = render
+    scripts = options.get('scripts', SCRAPE_SETTINGS['scripts'])
+    if scripts not in SCRIPT_POLICIES:
+        raise ValueError('Unknown scripts=' + scripts + ' option. Supported policies are ' + ', '.join(SCRIPT_POLICIES))
+    SCRAPE_SETTINGS['scripts'] = scripts
+    SCRAPE_SETTINGS['minify'] = options.get('minify', 'on') != 'off'
+    zip_level = int(options.get('zip_level', SCRAPE_SETTINGS['zip_level']))
+    if not 0 <= zip_level <= 9:
+        raise ValueError('Unknown zip_level=' + str(zip_level) + ' option. Use a compression level from 0 to 9')
+    SCRAPE_SETTINGS['zip_level'] = zip_level
+    audio = options.get('audio', SCRAPE_SETTINGS['audio'])
+    if audio not in AUDIO_MODES:
+        raise ValueError('Unknown audio=' + audio + ' option. Supported modes are ' + ', '.join(AUDIO_MODES))
+    if audio == 'transcode' and not get_ffmpeg():
+        raise ValueError('audio=transcode needs ffmpeg, which was not found on the PATH')
+    SCRAPE_SETTINGS['audio'] = audio
+    AUDIO_TRANSCODE_SETTINGS['bitrate'] = options.get('audio_bitrate', AUDIO_TRANSCODE_SETTINGS['bitrate'])
+    AUDIO_TRANSCODE_SETTINGS['channels'] = int(options.get('audio_channels', AUDIO_TRANSCODE_SETTINGS['channels']))
+    pdf = options.get('pdf', SCRAPE_SETTINGS['pdf'])
+    if pdf not in PDF_MODES:
+        raise ValueError('Unknown pdf=' + pdf + ' option. Supported modes are ' + ', '.join(PDF_MODES))
+    if pdf == 'optimize' and not get_qpdf():
+        raise ValueError('pdf=optimize needs qpdf, which was not found on the PATH')
+    SCRAPE_SETTINGS['pdf'] = pdf
+    PDF_OPTIMIZE_SETTINGS['image_dpi'] = int(options.get('pdf_dpi', PDF_OPTIMIZE_SETTINGS['image_dpi']))
+    PDF_OPTIMIZE_SETTINGS['recompress_images'] = options.get('pdf_images', 'on') != 'off'
+    if pdf == 'optimize' and PDF_OPTIMIZE_SETTINGS['recompress_images'] and not get_ghostscript():
+        CHEF_LOGGER.warning('Ghostscript (gs) not found so PDF images will not be recompressed')
+    if 'only' in options or 'subtree' in options:
+        partial_scraping_part(options)
+        report_script_policy()
+        report_minify()
+        report_audio()
+        report_pdf()
+        LOGGER.info('Scraping part finished.\n')
+        return
+
     # Read web_resource_tree_{{lang}}.json
-    with open(os.path.join(TREES_DATA_DIR, CRAWLING_STAGE_OUTPUT_TPL.format(lang))) as json_file:
-        web_resource_tree = json.load(json_file)
-        assert web_resource_tree['kind'] == 'TessaLangWebRessourceTree'
+    web_resource_tree = load_tree(os.path.join(TREES_DATA_DIR, CRAWLING_STAGE_OUTPUT_TPL.format(lang)))
+    assert web_resource_tree['kind'] == 'TessaLangWebRessourceTree'
 
     # Ricecooker tree
     ricecooker_json_tree = dict(
@@ -795,14 +2572,17 @@ def scraping_part(args, options):
         # other non-essential attributes for
         url=web_resource_tree['url'],
     )
-    _build_json_tree(ricecooker_json_tree, web_resource_tree['children'], lang=options['lang'])
+    # use scrape_workers=N on the command line to scrape N modules in parallel
+    scheduler = ScrapeScheduler(workers=int(options.get('scrape_workers', 1)))
+    _build_json_tree(ricecooker_json_tree, web_resource_tree['children'], lang=options['lang'], scheduler=scheduler)
+    scheduler.run()
     print('finished building ricecooker_json_tree')
-
-    # Write out ricecooker_json_tree_{{lang}}.json
-    json_file_name = os.path.join(TREES_DATA_DIR, SCRAPING_STAGE_OUTPUT_TPL.format(lang))
-    with open(json_file_name, 'w') as json_file:
-        json.dump(ricecooker_json_tree, json_file, indent=2)
-        LOGGER.info('Intermediate result stored in ' + json_file_name)
+    LOGGER.info('Reused ' + str(get_module_memo().hits) + ' previously built module zips')
+    report_script_policy()
+    report_minify()
+    report_audio()
+    report_pdf()
+    write_ricecooker_json_tree(ricecooker_json_tree, lang)
     LOGGER.info('Scraping part finished.\n')
 
 
@@ -812,14 +2592,176 @@ def scraping_part(args, options):
 
 
 
+# SCRAPE ESTIMATE
+################################################################################
+
+def estimate_scrape(lang, concurrency=1, bandwidth=None):
+    """
+    Dry run of the scraping part for `lang`: walk the web resource tree and use
+    the webcache, asset store, module memo, scrape history, and `content-length`
+    of media nodes to estimate requests, uncached bytes (pages, assets, and media
+    that would be downloaded), zip output size, and wall time with `concurrency`
+    parallel module builds.
+    """
+    from cachecontrol.caches.file_cache import FileCache, url_to_file_path
+    defaults = dict(ESTIMATE_DEFAULTS)
+    if bandwidth:
+        defaults['bandwidth'] = bandwidth
+    webcache = FileCache('.webcache')
+    def _is_cached(url):
+        return os.path.exists(url_to_file_path(url, webcache))
+    def _uncached_downloads(stats):
+        # (requests, bytes) of the pages and assets of a recorded job that
+        # are no longer in the webcache or asset store
+        uncached = [size for url, size in stats['pages'].items() if not _is_cached(url)]
+        uncached += [size for url, size in stats['assets'].items()
+                     if not os.path.exists(get_asset_store_path(url))]
+        return len(uncached), sum(uncached)
+
+    tree = load_tree(os.path.join(TREES_DATA_DIR, CRAWLING_STAGE_OUTPUT_TPL.format(lang)))
+    memo = ModuleMemo()
+    history = ScrapeHistory()
+    def _module_nodes(node):
+        if node.get('kind') == 'TessaModule':
+            yield node
+        for child in node.get('children') or []:
+            yield from _module_nodes(child)
+    module_stats = [history.get(node['source_id']) for node in _module_nodes(tree)]
+    module_stats = [stats for stats in module_stats if stats]
+    if module_stats:   # averages of recorded builds are better defaults than constants
+        for key, default_key in [('seconds', 'module_seconds'), ('requests', 'module_pages'), ('bytes', 'module_zip_bytes')]:
+            values = [stats[key] for stats in module_stats if stats.get(key)]
+            if values:
+                defaults[default_key] = sum(values) / len(values)
+        page_sizes = [size for stats in module_stats for size in stats.get('pages', {}).values()]
+        if page_sizes:
+            defaults['page_bytes'] = sum(page_sizes) / len(page_sizes)
+        asset_bytes = [sum(stats['assets'].values()) for stats in module_stats if stats.get('assets')]
+        if asset_bytes:
+            defaults['module_asset_bytes'] = sum(asset_bytes) / len(asset_bytes)
+
+    estimate = dict(lang=lang, concurrency=concurrency, modules=0, modules_memo=0, modules_relang=0,
+                    modules_with_history=0, content_pages=0, requests=0, uncached_requests=0,
+                    uncached_bytes=0, zip_bytes=0, media_files=0, media_bytes=0, media_unknown_size=0,
+                    media_seconds=0.0)
+    job_seconds = []
+    seen_modules = set()
+
+    def _estimate_node(node):
+        kind = node.get('kind')
+        if kind == 'TessaModule':
+            module_url = canonical_module_url(node['url'])
+            if module_url in seen_modules:
+                return
+            seen_modules.add(module_url)
+            estimate['modules'] += 1
+            zip_path, zip_lang = memo.lookup(module_url, lang)
+            if zip_path:
+                estimate['modules_memo' if zip_lang == lang else 'modules_relang'] += 1
+                estimate['zip_bytes'] += os.path.getsize(zip_path)
+                if zip_lang != lang:
+                    job_seconds.append(1.0)
+                return
+            stats = history.get(node['source_id'])
+            if stats:
+                estimate['modules_with_history'] += 1
+            else:
+                stats = {}
+            pages = len(stats['pages']) if stats.get('pages') else \
+                stats.get('requests') or node.get('section_count') or defaults['module_pages']
+            zip_bytes = stats.get('bytes') or defaults['module_zip_bytes']
+            estimate['requests'] += pages
+            estimate['zip_bytes'] += zip_bytes
+            if 'pages' in stats:
+                uncached_requests, uncached_bytes = _uncached_downloads(stats)
+            elif _is_cached(node['url']):
+                uncached_requests, uncached_bytes = 0, 0
+            else:
+                uncached_requests = pages
+                uncached_bytes = pages * defaults['page_bytes'] + defaults['module_asset_bytes']
+            estimate['uncached_requests'] += uncached_requests
+            estimate['uncached_bytes'] += uncached_bytes
+            if uncached_requests:
+                seconds = stats.get('seconds') or defaults['module_seconds']
+            else:
+                seconds = stats.get('seconds') or pages * 0.05
+            job_seconds.append(seconds)
+
+        elif kind == 'TessaContentPage':
+            estimate['content_pages'] += 1
+            estimate['requests'] += 1
+            estimate['zip_bytes'] += defaults['page_bytes']
+            stats = history.get(node['source_id']) or {}
+            if 'pages' in stats:
+                uncached_requests, uncached_bytes = _uncached_downloads(stats)
+            elif _is_cached(node['url']):
+                uncached_requests, uncached_bytes = 0, 0
+            else:
+                uncached_requests, uncached_bytes = 1, defaults['page_bytes']
+            estimate['uncached_requests'] += uncached_requests
+            estimate['uncached_bytes'] += uncached_bytes
+            if uncached_requests:
+                job_seconds.append(uncached_requests * defaults['request_seconds'] + uncached_bytes / defaults['bandwidth'])
+            else:
+                job_seconds.append(0.05)
+
+        elif kind in ['TessaAudioResouce', 'TessaPDFDocument']:
+            # downloaded into the asset store (audio=download, pdf=download, ...)
+            # or by ricecooker in the upload step
+            estimate['media_files'] += 1
+            size = node.get('content-length')
+            if size is None:
+                estimate['media_unknown_size'] += 1
+                size = 0
+            estimate['media_bytes'] += int(size)
+            if not os.path.exists(get_asset_store_path(node['url'])):
+                estimate['uncached_requests'] += 1
+                estimate['uncached_bytes'] += int(size)
+                estimate['media_seconds'] += defaults['request_seconds'] + int(size) / defaults['bandwidth']
+
+        for child in node.get('children') or []:
+            _estimate_node(child)
+
+    _estimate_node(tree)
+    scrape_seconds = sum(job_seconds) / max(concurrency, 1)
+    if job_seconds:
+        scrape_seconds = max(scrape_seconds, max(job_seconds))
+    estimate['scrape_seconds'] = scrape_seconds
+    estimate['wall_seconds'] = scrape_seconds + estimate['media_seconds']
+    return estimate
+
+
+def print_estimate(estimate):
+    def _mb(num_bytes):
+        return '%.1f MB' % (num_bytes / 1024.0 / 1024.0)
+    def _hms(seconds):
+        return '%dh%02dm' % (seconds // 3600, (seconds % 3600) // 60)
+    print('Scrape estimate for lang=%s at concurrency=%d' % (estimate['lang'], estimate['concurrency']))
+    print('  modules:          %d (%d reused from memo, %d relang copies, %d with build history)'
+          % (estimate['modules'], estimate['modules_memo'], estimate['modules_relang'], estimate['modules_with_history']))
+    print('  content pages:    %d' % estimate['content_pages'])
+    print('  page requests:    %d' % estimate['requests'])
+    print('  downloads:        %d, %s (pages, assets, and media not in webcache or asset store)'
+          % (estimate['uncached_requests'], _mb(estimate['uncached_bytes'])))
+    print('  zip output:       %s' % _mb(estimate['zip_bytes']))
+    print('  media files:      %d, %s (%d without content-length)'
+          % (estimate['media_files'], _mb(estimate['media_bytes']), estimate['media_unknown_size']))
+    print('  wall time:        %s scraping + %s media downloads = %s'
+          % (_hms(estimate['scrape_seconds']), _hms(estimate['media_seconds']), _hms(estimate['wall_seconds'])))
+
+
+
+
 # CHEF
 ################################################################################
 
-class TessaChef(JsonTreeChef):
+class TessaChefBase(object):
     """
     This class takes care of downloading content from tessafrica.net and uplaoding
     it to the Kolibri content curation server.
     This chef depends on the option `lang` being passed on the command line.
+    The actual chef class `TessaChef` adds ricecooker's JsonTreeChef as base
+    class, see `get_chef_class`.
     """
     language_url_map = {
         'en': 'http://www.open.edu/openlearncreate/course/view.php?id=2042',
@@ -829,6 +2771,17 @@ class TessaChef(JsonTreeChef):
     }
 
 
+    def config_logger(self, args, options):
+        """
+        Extend ricecooker's logging setup so records are written by a background
+        thread, with per-component levels (log_levels=sections:DEBUG,assets:DEBUG)
+        and optional JSON-lines output (log_json=chefdata/scrape_log.jsonl).
+        """
+        super().config_logger(args, options)
+        setup_logging(levels=parse_log_levels(options.get('log_levels')),
+                      json_lines_path=options.get('log_json'))
+
+
     def crawl(self, args, options):
         """
         PART 1: CRAWLING
@@ -842,12 +2795,39 @@ class TessaChef(JsonTreeChef):
         else:
             langs_to_crawl = [lang]
 
+        from tessa_cralwer import CrawlBudget, TessaCrawler
+        from tessa_moodle_api import MoodleApiCrawler
+
+        # use crawl_workers=N on the command line to crawl with N threads
+        workers = int(options.get('crawl_workers', 1))
+
+        # partial crawls: crawl_max_requests=N, crawl_max_bytes=N, crawl_max_seconds=N
+        budget = None
+        if any(key in options for key in ['crawl_max_requests', 'crawl_max_bytes', 'crawl_max_seconds']):
+            budget = CrawlBudget(
+                max_requests=int(options['crawl_max_requests']) if 'crawl_max_requests' in options else None,
+                max_bytes=int(options['crawl_max_bytes']) if 'crawl_max_bytes' in options else None,
+                max_seconds=float(options['crawl_max_seconds']) if 'crawl_max_seconds' in options else None,
+            )
+        prioritize = budget is not None or 'crawl_prioritize' in options
+
+        # use discovery=api to get the course structure from the Moodle web service
+        # (token from moodle_ws_token=... or the MOODLE_WS_TOKEN env variable)
+        discovery = options.get('discovery', 'crawl')
+        if discovery not in ['crawl', 'api']:
+            raise ValueError('Unsupported discovery=' + discovery + ' Use discovery=crawl or discovery=api.')
+
         for lang in langs_to_crawl:
             # 1. crawl
             print('\n\n\n')
             print('crawling lang=', lang)
-            crawler = TessaCrawler(lang=lang)
-            web_resource_tree = crawler.crawl(devmode=True, limit=10000)
+            if discovery == 'api':
+                crawler = MoodleApiCrawler(lang=lang, ws_url=options.get('moodle_ws_url'),
+                                           ws_token=options.get('moodle_ws_token'))
+            else:
+                crawler = TessaCrawler(lang=lang)
+            web_resource_tree = crawler.crawl(devmode=True, limit=10000, workers=workers,
+                                              budget=budget, prioritize=prioritize)
 
             # optional debug print...
             crawler.print_tree(web_resource_tree)
@@ -872,7 +2852,8 @@ class TessaChef(JsonTreeChef):
             of the channel (see result in `chefdata/ricecooker_json_tree_{{lang}}.json`)
           - perform manual content fixes for video lessons with non-standard markup
         """
-        self.crawl(args, options)
+        if 'only' not in options and 'subtree' not in options:   # partial rebuilds reuse the crawl
+            self.crawl(args, options)
         self.scrape(args, options)
 
     # def run(self, args, options):
@@ -897,9 +2878,76 @@ class TessaChef(JsonTreeChef):
 
 
 
+TESSA_CHEF_CLASS = None
+
+def get_chef_class():
+    """
+    Returns the `TessaChef` class, importing ricecooker's chef machinery only
+    when a chef is actually run.
+    """
+    global TESSA_CHEF_CLASS
+    if TESSA_CHEF_CLASS is None:
+        from ricecooker.chefs import JsonTreeChef
+
+        class TessaChef(TessaChefBase, JsonTreeChef):
+            """
+            The TESSA chef: the TessaChefBase methods on top of JsonTreeChef.
+            """
+
+        TESSA_CHEF_CLASS = TessaChef
+    return TESSA_CHEF_CLASS
+
+
+
+# BENCHMARKS
+################################################################################
+
+def benchmark_startup(number=5, budget=STARTUP_TIME_BUDGET):
+    """
+    Time `import tessa_chef` in fresh interpreters and check that none of the
+    STARTUP_LAZY_MODULES get loaded by the import. Returns True if the import
+    took less than `budget` seconds (best of `number` runs) and stayed lazy.
+    """
+    import subprocess
+    check_code = (
+        "import sys, time\n"
+        "start = time.time()\n"
+        "import tessa_chef\n"
+        "elapsed = time.time() - start\n"
+        "loaded = [m for m in " + repr(STARTUP_LAZY_MODULES) + " if m in sys.modules]\n"
+        "print(elapsed, ','.join(loaded))\n"
+    )
+    timings = []
+    loaded = ''
+    here = os.path.dirname(os.path.abspath(__file__))
+    for i in range(number):
+        output = subprocess.check_output([sys.executable, '-c', check_code], cwd=here)
+        elapsed, _, loaded = output.decode('utf-8').strip().partition(' ')
+        timings.append(float(elapsed))
+    best = min(timings)
+    print('import tessa_chef: best %.3fs, worst %.3fs (budget %.2fs)' % (best, max(timings), budget))
+    if loaded:
+        print('Modules loaded at import time that should be lazy:', loaded)
+    return best < budget and not loaded
+
+
+
 
 if __name__ == '__main__':
-    tessa_chef = TessaChef()
+    # quick operations that don't need ricecooker
+    if '--benchmark-startup' in sys.argv:
+        sys.exit(0 if benchmark_startup() else 1)
+    if '--estimate' in sys.argv:
+        # e.g. ./tessa_chef.py --estimate lang=fr concurrency=4 bandwidth=500000
+        options = dict(arg.split('=', 1) for arg in sys.argv[1:] if '=' in arg)
+        if 'lang' not in options:
+            raise ValueError('Need to specify command line option `lang=XY`, where XY in en, fr, ar, sw.')
+        estimate = estimate_scrape(options['lang'], concurrency=int(options.get('concurrency', 1)),
+                                   bandwidth=float(options['bandwidth']) if 'bandwidth' in options else None)
+        print_estimate(estimate)
+        sys.exit(0)
+
+    tessa_chef = get_chef_class()()
     args, options = tessa_chef.parse_args_and_options()
     if 'lang' not in options:
         raise ValueError('Need to specify command line option `lang=XY`, where XY in en, fr, ar, sw.')
@@ -1,11 +1,26 @@
 #!/usr/bin/env python
 
 import argparse
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import heapq
+import itertools
+import json
+import os
+import queue
 import re
+import threading
+import time
+import timeit
 from urllib.parse import urljoin, urldefrag, urlparse, parse_qs, quote_plus
 
+from requests.structures import CaseInsensitiveDict
 
-from basiccrawler.crawler import BasicCrawler, LOGGER, logging
+
+from basiccrawler.crawler import BasicCrawler, LOGGER, logging, Pattern
+
+from tessa_nodes import BINARY_EXT, Node, save_tree
 LOGGER.setLevel(logging.INFO)
 
 
@@ -22,6 +37,14 @@ MOD_CONTENT_RE = re.compile('.*mod/oucontent/.*')
 MOD_RESOURCE_RE = re.compile('.*mod/resource/.*')
 MOD_URL_RE = re.compile('.*mod/url/.*')
 TESSA_AUDIO_RESOURCES_SUBPAGES = ['66697', '81259', '66858']  # special handling for pages with audio resouces
+# links that can be classified from the URL alone, without a HEAD request
+# (media files still get one, since their nodes need its content-length)
+KNOWN_URL_CONTENT_TYPES = [
+    (re.compile(r'.*mod/(subpage|oucontent)/view\.php.*'), 'text/html'),
+]
+MEDIA_URL_RE = re.compile(r'.*/pluginfile\.php/.*\.(mp3|pdf)$', re.IGNORECASE)   # crawl frontier priority
+HEAD_CACHE_PATH = 'chefdata/head_cache.json'
+HEAD_CACHE_TTL = 14 * 24 * 3600   # seconds
 REJECT_SECTION_STINGS = {
     'en': 'Section',
     'fr': 'Section',
@@ -80,6 +103,23 @@ def get_resource_info(activity_li):
     return resource_info
 
 
+def get_section_count(page):
+    """
+    Number of pages (sections and subsections) in the TOC sidebar of the module
+    `page`, same as the section pages tessa_chef.get_module_toc finds. Returns
+    None for modules with no TOC in the sidebar.
+    """
+    current_li = page.find('li', class_='oucontent-tree-current')
+    module_li = current_li.find_parent('li', class_='item-section') if current_li else None
+    contents_div = module_li.find('div', class_='oucontent-contents') if module_li else None
+    contents_ul = contents_div.find('ul', recursive=False) if contents_div else None
+    if contents_ul is None:
+        return None
+    if len(contents_ul.find_all('li', recursive=False)) == 1:
+        return 1    # simple module, a single page
+    return len(contents_ul.find_all('li'))
+
+
 def url_to_id(url):
     """
     Used for nodes that correspond to a single page (topics, sections).
@@ -93,6 +133,142 @@ def url_to_id(url):
 
 
 
+# URL POLICY
+################################################################################
+
+class UrlPolicy(object):
+    """
+    Precompiled version of the URL canonicalization and ignore rules: exact-match
+    URLs go in a set, all regular expressions are combined into a single regex,
+    and the query string params are removed in a single `re.sub` pass.
+    """
+    # query string params that falsely make URLs look distinct
+    STRIP_PARAMS_RE = re.compile(r'&section=\d+(?:\.\d+)?|&printable=1|&content=scxml'
+                                 r'|&notifyeditingon=1|[?&]forcedownload=1')
+
+    def __init__(self, ignore_patterns, source_domains):
+        self.ignore_urls = set()
+        self.ignore_fns = []
+        regexes = []
+        for pattern in ignore_patterns:
+            if isinstance(pattern, str):
+                self.ignore_urls.add(pattern)
+            elif isinstance(pattern, Pattern) and pattern.flags == re.UNICODE:
+                regexes.append('(?:' + pattern.pattern + ')')
+            elif isinstance(pattern, Pattern):
+                self.ignore_fns.append(pattern.match)   # can't combine with different flags
+            elif callable(pattern):
+                self.ignore_fns.append(pattern)
+            else:
+                raise ValueError('Unrecognized pattern in IGNORE_URLS. Use strings, REs, or callables.')
+        self.ignore_re = re.compile('|'.join(regexes)) if regexes else None
+        self.source_domains = tuple(source_domains)
+
+    def cleanup_url(self, url):
+        if '#' in url:
+            defragged = url.partition('#')[0]
+            if defragged.endswith(('?', ';')):
+                defragged = urldefrag(url)[0]   # urlunparse also drops empty query and params
+            url = defragged
+        return self.STRIP_PARAMS_RE.sub('', url)
+
+    def should_ignore_url(self, url):
+        url = self.cleanup_url(url)
+        if url in self.ignore_urls:
+            return True
+        if self.ignore_re is not None and self.ignore_re.match(url):
+            return True
+        for ignore_fn in self.ignore_fns:
+            if ignore_fn(url):
+                return True
+        return not url.startswith(self.source_domains)
+
+
+
+
+# HEAD RESOLUTION CACHE
+################################################################################
+
+class ResolvedHead(object):
+    """
+    Stand-in for the HEAD `requests.Response` of a URL, with the final URL after
+    redirects and the response headers that the crawler uses.
+    """
+    CACHED_HEADERS = ['content-type', 'content-length', 'content-disposition',
+                      'etag', 'last-modified']
+
+    def __init__(self, url, headers):
+        self.url = url
+        self.headers = CaseInsensitiveDict(headers)
+
+    @classmethod
+    def from_response(cls, response):
+        headers = {}
+        for header in cls.CACHED_HEADERS:
+            if header in response.headers:
+                headers[header] = response.headers[header]
+        return cls(response.url, headers)
+
+
+def classify_url(url):
+    """
+    Returns a `ResolvedHead` for URLs whose content type is known from the URL
+    pattern (see `KNOWN_URL_CONTENT_TYPES`), otherwise returns None.
+    """
+    for pattern, content_type in KNOWN_URL_CONTENT_TYPES:
+        if pattern.match(url):
+            return ResolvedHead(url, {'content-type': content_type})
+    return None
+
+
+class HeadCache(object):
+    """
+    Persistent cache of HEAD request results (URL -> final URL and headers).
+    Entries older than `ttl` seconds are treated as missing.
+    """
+
+    def __init__(self, path=HEAD_CACHE_PATH, ttl=HEAD_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as json_file:
+                self.entries = json.load(json_file)
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry is None or time.time() - entry['time'] > self.ttl:
+            return None
+        return ResolvedHead(entry['url'], entry['headers'])
+
+    def put(self, url, response):
+        resolved = ResolvedHead.from_response(response)
+        with self.lock:
+            self.entries[url] = dict(
+                url=resolved.url,
+                headers=dict(resolved.headers),
+                time=time.time(),
+            )
+            self.dirty = True
+        return resolved
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            parent_dir = os.path.dirname(self.path)
+            if parent_dir:
+                os.makedirs(parent_dir, exist_ok=True)
+            with open(self.path, 'w') as json_file:
+                json.dump(self.entries, json_file, indent=2, sort_keys=True)
+            self.dirty = False
+
+
+
+
 # POST-CRAWLING CLANUP
 ################################################################################
 
@@ -173,13 +349,105 @@ def restructure_web_resource_tree(raw_tree):
     _recursive_restrucutre_walk(raw_tree, 1)
 
 
-def remove_sections(web_resource_tree):
+def get_channel_metadata(lang):
+    """
+    Channel info stored at the root of the web resource tree for `lang`.
+    """
+    return dict(
+        source_domain = 'tessafrica.net',
+        source_id = 'TESSA_%s-testing' % lang,       # TODO: remove -testing
+        title = 'TESSA (%s)-testing' % lang,         # TODO: remove -testing
+        thumbnail = 'http://www.tessafrica.net/sites/all/themes/tessafricav2/images/logotype_02.png',
+        description = 'Teacher Education in Sub-Saharan Africa, TESSA, is a collaborative network to help you improve your practice as a teacher or teacher educator. We provide free, quality resources that support your national curriculum and can help you plan lessons that engage, involve and inspire.',
+        language = lang,
+    )
+
+
+def prune_incomplete_nodes(web_resource_tree):
+    """
+    Remove nodes left incomplete by a crawl cut short by a `CrawlBudget`:
+    resource pages whose media file was not reached and container pages
+    (subpages, audio topics and sections) that ended up with no children.
+    Must be called before `restructure_web_resource_tree`.
+    """
+    container_kinds = ['subpage', 'audio_resources_subpage', 'audio_resource_topic_subpage',
+                       'TessaAudioResourceSection', 'resource']
+    pruned = Counter()
+
+    def _recursive_prune(subtree):
+        new_children = []
+        for child in subtree['children']:
+            _recursive_prune(child)
+            if child.get('kind') in container_kinds and not child['children']:
+                pruned[child['kind']] += 1
+            else:
+                new_children.append(child)
+        subtree['children'] = new_children
+
+    _recursive_prune(web_resource_tree)
+    return pruned
+
+
+class SectionRules(object):
+    """
+    Rules for links we don't want in the tree: links to individual module
+    sections (titles that start with `REJECT_SECTION_STINGS[lang]`) and back-links
+    to ancestor pages. The same rules are applied at crawl time, so that these
+    pages are never requested, and in the post-crawl `remove_sections` step.
+    """
+    # enqueued kinds whose handlers don't enqueue any links of their own, so
+    # skipping them can't change which URLs are seen elsewhere in the crawl
+    LEAF_KINDS = ['oucontent']
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.section_str = REJECT_SECTION_STINGS[lang]
+        self.pruned = Counter()   # number of links pruned at crawl time by reason
+
+    def is_section_title(self, title):
+        if title.startswith(self.section_str):
+            return True
+        if self.lang == 'sw' and title.startswith('Section'):
+            return True  # special case since certain SW modules are in English
+        return False
+
+    def is_back_link(self, url, breadcrumbs):
+        return url in breadcrumbs
+
+    def should_prune(self, url, context):
+        """
+        Crawl-time check if the link to `url` with `context` would be removed
+        by `remove_sections` after the crawl.
+        """
+        breadcrumbs = []
+        parent = context.get('parent')
+        while parent is not None:
+            if parent.get('kind') != 'resource':   # url changes in restructure step
+                breadcrumbs.append(parent['url'])
+                if 'original_url' in parent:
+                    breadcrumbs.append(parent['original_url'])
+            parent = parent.get('parent')
+        if self.is_back_link(url, breadcrumbs):
+            self.pruned['back-link'] += 1
+            return True
+        if context.get('kind') in self.LEAF_KINDS and self.is_section_title(context.get('title', '')):
+            self.pruned['section'] += 1
+            return True
+        return False
+
+    @property
+    def requests_saved(self):
+        # each crawled link costs a HEAD (media check) and a GET request
+        return 2 * sum(self.pruned.values())
+
+
+def remove_sections(web_resource_tree, rules=None):
     """
     TESSA website lists individual module sections, but we want use only the whole
     modeules, so this step removes all links that start with word "Section".
     """
-    lang = web_resource_tree['lang']
-    section_str = REJECT_SECTION_STINGS[lang]
+    if rules is None:
+        rules = SectionRules(web_resource_tree['lang'])
 
     breadcrumbs = []  # keep track of parent urls, so can skip Back and Return links
 
@@ -193,18 +461,13 @@ def remove_sections(web_resource_tree):
             for child in subtree['children']:
 
                 # remove back-links
-                if child['url'] in breadcrumbs:
+                if rules.is_back_link(child['url'], breadcrumbs):
                     LOGGER.warning('Found a back-link ' + child['url'])
                     continue
 
                 # filter sections
                 if 'title' in child:
-                    title = child['title']
-                    if title.startswith(section_str):
-                        pass
-                    elif lang=='sw' and title.startswith('Section'):
-                        pass  # special case since certain SW modules are in English
-                    else:
+                    if not rules.is_section_title(child['title']):
                         new_children.append(child)
                 else:
                     LOGGER.warning('FOUND a title less child ' + child['url'])
@@ -223,6 +486,81 @@ def remove_sections(web_resource_tree):
 
 
 
+# CRAWL FRONTIER
+################################################################################
+
+class CrawlBudget(object):
+    """
+    Limits for a partial or time-boxed crawl. Any of the limits can be None.
+    """
+    def __init__(self, max_requests=None, max_bytes=None, max_seconds=None):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+    def exhausted(self, request_stats, elapsed):
+        """
+        Returns the name of the first limit reached, or None.
+        """
+        if self.max_requests is not None and request_stats['requests'] >= self.max_requests:
+            return 'requests'
+        if self.max_bytes is not None and request_stats['bytes'] >= self.max_bytes:
+            return 'bytes'
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return 'seconds'
+        return None
+
+
+class PriorityFrontier(object):
+    """
+    Crawl queue that hands out URLs in order of `KIND_PRIORITIES` (lower first)
+    and in FIFO order within the same priority. Subpages that list modules and
+    media files are expanded first, auxiliary links (no kind) last.
+    Implements the `put/get/empty/qsize` subset of `queue.Queue` used by the crawler.
+    """
+    KIND_PRIORITIES = {
+        'TessaLangWebRessourceTree': 0,
+        'subpage': 0,
+        'audio_resources_subpage': 0,
+        'audio_resource_topic_subpage': 1,
+        'resource': 1,
+        'oucontent': 2,
+    }
+    MEDIA_PRIORITY = 1
+    DEFAULT_PRIORITY = 3
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.enqueue_order = {}   # id(context) --> order in which it was enqueued
+
+    def get_priority(self, url, context):
+        kind = context.get('kind')
+        if kind in self.KIND_PRIORITIES:
+            return self.KIND_PRIORITIES[kind]
+        if MEDIA_URL_RE.match(url):
+            return self.MEDIA_PRIORITY
+        return self.DEFAULT_PRIORITY
+
+    def put(self, item):
+        url, context = item
+        order = next(self.counter)
+        self.enqueue_order[id(context)] = order
+        heapq.heappush(self.heap, (self.get_priority(url, context), order, url, context))
+
+    def get(self):
+        _, _, url, context = heapq.heappop(self.heap)
+        return (url, context)
+
+    def empty(self):
+        return not self.heap
+
+    def qsize(self):
+        return len(self.heap)
+
+
+
+
 # CRAWLER
 ################################################################################
 
@@ -262,19 +600,25 @@ class TessaCrawler(BasicCrawler):
 
     CRAWLING_STAGE_OUTPUT = 'chefdata/trees/web_resource_tree.json'
 
+    # concurrent crawling settings (see `crawl_concurrent`)
+    PER_HOST_LIMIT = 4          # max simultaneous requests to any one host
+    HEAD_WORKERS = 8            # threads used to resolve the links on a page
+    LOOKAHEAD_PER_WORKER = 8    # how far ahead of the handlers workers may fetch
 
 
 
     def __init__(self, *args, lang='en', **kwargs):
         super().__init__(*args, **kwargs)
         self.START_PAGE = TESSA_LANG_URL_MAP[lang]
-        self.START_PAGE_CONTEXT['lang'] = lang
+        self.START_PAGE_CONTEXT = dict(self.START_PAGE_CONTEXT, lang=lang)
 
         # save output for specific lang
         self.CRAWLING_STAGE_OUTPUT = self.CRAWLING_STAGE_OUTPUT.replace('.json', '_'+lang+'.json')
 
-        # ignore main page links for other languages
-        self.IGNORE_URLS.extend(TESSA_LANG_URL_MAP.values())
+        # ignore main page links for other languages (per instance, so the
+        # class-level list doesn't grow when crawling several languages)
+        self.IGNORE_URLS = self.IGNORE_URLS + list(TESSA_LANG_URL_MAP.values())
+        self.url_policy = UrlPolicy(self.BASE_IGNORE_URLS + self.IGNORE_URLS, self.SOURCE_DOMAINS)
 
         self.kind_handlers = {  # mapping from web resource kinds (user defined) and handlers
             'TessaLangWebRessourceTree': self.on_tessa_language_page,
@@ -285,19 +629,147 @@ class TessaCrawler(BasicCrawler):
             'audio_resource_topic_subpage': self.on_audio_resource_topic_subpage,
         }
 
+        # links to sections and back-links are pruned before being enqueued
+        self.section_rules = SectionRules(lang)
+
+        # persistent cache of HEAD requests (redirects and content types)
+        self.head_cache = HeadCache()
+
+        # number of requests and bytes downloaded, used for `CrawlBudget` checks
+        self.request_stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        # per-host semaphores used by worker threads in `crawl_concurrent`
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
 
     def cleanup_url(self, url):
         """
         Remove fragment and query string params that falsely make URLs look distinct.
         """
-        url = urldefrag(url)[0]
-        url = re.sub('&section=\d+(\.\d+)?', '', url)
-        url = re.sub('&printable=1', '', url)
-        url = re.sub('&content=scxml', '', url)
-        url = re.sub('&notifyeditingon=1', '', url)
-        url = re.sub(r'\?forcedownload=1', '', url)
-        url = re.sub('&forcedownload=1', '', url)
-        return url
+        return self.url_policy.cleanup_url(url)
+
+
+    def should_ignore_url(self, url):
+        """
+        Returns True if `url` matches any of the IGNORE_URLS or is not on one of
+        the SOURCE_DOMAINS.
+        """
+        return self.url_policy.should_ignore_url(url)
+
+
+
+
+    # REQUESTS
+    ############################################################################
+
+    def make_request(self, url, *args, method='GET', **kwargs):
+        """
+        Extend base class method to keep count of requests and bytes downloaded.
+        Bytes come from the `content-length` header when there is one, otherwise
+        from the body (counted as it is read for `stream=True` requests).
+        """
+        response = super().make_request(url, *args, method=method, **kwargs)
+        with self._stats_lock:
+            self.request_stats['requests'] += 1
+        if response is not None and method == 'GET':
+            length = response.headers.get('content-length', '')
+            if length.isdigit():
+                self._count_bytes(int(length))
+            elif kwargs.get('stream'):
+                self._count_streamed_bytes(response)
+            else:
+                self._count_bytes(len(response.content))   # already read by requests
+        return response
+
+
+    def _count_bytes(self, num_bytes):
+        with self._stats_lock:
+            self.request_stats['bytes'] += num_bytes
+
+
+    def _count_streamed_bytes(self, response):
+        iter_content = response.iter_content   # also used by .content and .iter_lines
+        def counting_iter_content(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                self._count_bytes(len(chunk))
+                yield chunk
+        response.iter_content = counting_iter_content
+
+
+
+    def resolve_head(self, url):
+        """
+        Returns the `ResolvedHead` for `url`, using the URL pattern or the HEAD
+        cache when possible and making a HEAD request otherwise.
+        Returns None if the HEAD request failed.
+        """
+        resolved = self.head_cache.get(url) or classify_url(url)
+        if resolved:
+            return resolved
+        head_response = self.make_request(url, method='HEAD')
+        if not head_response:
+            return None
+        return self.head_cache.put(url, head_response)
+
+
+    def resolve_heads(self, urls):
+        """
+        Resolve the HEAD for all `urls` not known yet, in parallel.
+        """
+        todo = []
+        for url in urls:
+            if url not in todo and not classify_url(url) and not self.head_cache.get(url):
+                todo.append(url)
+        if not todo:
+            return
+        LOGGER.debug('Resolving ' + str(len(todo)) + ' links')
+
+        def _resolve_head(url):
+            with self._host_slot(url):
+                return self.resolve_head(url)
+        with ThreadPoolExecutor(max_workers=self.HEAD_WORKERS) as executor:
+            list(executor.map(_resolve_head, todo))
+
+
+    def resolve_page_links(self, url, activity_lis):
+        """
+        Resolve HEADs for links in `activity_lis` that are going to be visited,
+        so handlers don't have to wait for them one by one.
+        """
+        link_urls = []
+        for activity_li in activity_lis:
+            link = activity_li.find('a')
+            if link and link.has_attr('href'):
+                link_url = urljoin(url, link['href'])
+                if self.should_ignore_url(link_url):
+                    continue
+                if self.cleanup_url(link_url) in self.global_urls_seen_count:
+                    continue
+                link_urls.append(link_url)
+        self.resolve_heads(link_urls)
+
+
+    def is_media_file(self, url):
+        """
+        Same as `BasicCrawler.is_media_file` but uses `resolve_head`.
+        """
+        head_response = self.resolve_head(url)
+        if head_response:
+            content_type = head_response.headers.get('content-type', None)
+            if not content_type:
+                LOGGER.warning('HEAD response does not have `content-type` header. url = ' + url)
+                return (False, None)
+            return (content_type in self.MEDIA_CONTENT_TYPES, head_response)
+        else:
+            LOGGER.warning('HEAD request failed for url ' + url)
+            if url in self.ALLOW_BROKEN_HEAD_URLS:
+                return (False, None)
+            for media_ext in self.MEDIA_FILE_FORMATS:
+                if url.endswith('.' + media_ext):
+                    return (True, None)
+            return (False, None)
 
 
 
@@ -305,6 +777,21 @@ class TessaCrawler(BasicCrawler):
     # PAGE HANDLERS
     ############################################################################
 
+    def enqueue_url_and_context(self, url, context, force=False):
+        """
+        Skip links that `remove_sections` would drop after the crawl anyway.
+        Pruned URLs are still marked as seen so the rest of the crawl proceeds
+        exactly as it would without pruning.
+        """
+        url = self.cleanup_url(url)
+        if url not in self.global_urls_seen_count or force:
+            if self.section_rules.should_prune(url, context):
+                LOGGER.debug('Pruning link ' + url)
+                self.global_urls_seen_count[url] += 1
+                return
+        super().enqueue_url_and_context(url, context, force=force)
+
+
     def enqueue_based_on_url_re(self, rsrc_info, link_url, context):
         """
         Handler helper method used to call `enqueue_url_and_context` with the
@@ -327,7 +814,7 @@ class TessaCrawler(BasicCrawler):
 
         elif MOD_URL_RE.match(link_url):
             # mod/url. links are resolved before being processed (usually oucontent)
-            head_response = self.make_request(link_url, method='HEAD')
+            head_response = self.resolve_head(link_url)
             if not head_response:
                 LOGGER.warning('HEAD request failed for link_url ' + link_url)
                 return
@@ -357,6 +844,7 @@ class TessaCrawler(BasicCrawler):
 
         course_content_div = page.find(class_="course-content")
         activity_lis = course_content_div.find_all("li", class_="activity")
+        self.resolve_page_links(url, activity_lis)
         for i, activity_li in enumerate(activity_lis):
             link = activity_li.find('a')
             if link:
@@ -388,6 +876,7 @@ class TessaCrawler(BasicCrawler):
 
         course_content_div = page.find(class_="pagecontent-content")
         activity_lis = course_content_div.find_all("li", class_="activity")
+        self.resolve_page_links(url, activity_lis)
         for i, activity_li in enumerate(activity_lis):
             link = activity_li.find('a')
             if link:
@@ -466,6 +955,9 @@ class TessaCrawler(BasicCrawler):
 
         course_content_div = page.find('div', class_="course-content")
         section_lis = course_content_div.find_all('li', class_="section")
+        resource_lis = [li for li in course_content_div.find_all('li', class_="activity")
+                        if get_modtype(li) == 'resource']
+        self.resolve_page_links(url, resource_lis)
 
         for section_li in section_lis:
             section_name = section_li.find(class_="sectionname")
@@ -525,6 +1017,9 @@ class TessaCrawler(BasicCrawler):
             children=[],
         )
         oucontent_dict.update(context)
+        section_count = get_section_count(page)
+        if section_count is not None:
+            oucontent_dict['section_count'] = section_count   # for scrape time estimates
 
         # attach this page as another child in parent page
         context['parent']['children'].append(oucontent_dict)
@@ -560,29 +1055,284 @@ class TessaCrawler(BasicCrawler):
 
 
 
+    # CONCURRENT CRAWLING
+    ############################################################################
+
+    def _host_slot(self, url):
+        """
+        Return the semaphore that limits the number of concurrent requests to
+        the host of `url` to `PER_HOST_LIMIT`.
+        """
+        netloc = urlparse(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(netloc)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.PER_HOST_LIMIT)
+                self._host_slots[netloc] = slot
+        return slot
+
+
+    def fetch_for_crawl(self, url):
+        """
+        Worker task that performs the network part of visiting `url`: the media
+        file HEAD check followed by the page GET when `url` is not a media file.
+        Returns (verdict, head_response, final_url, page).
+        """
+        with self._host_slot(url):
+            verdict, head_response = self.is_media_file(url)
+            if verdict == True:
+                return (verdict, head_response, None, None)
+            final_url, page = self.download_page(url)
+        return (verdict, head_response, final_url, page)
+
+
+    def process_fetched(self, original_url, context, verdict, head_response, url, page):
+        """
+        Attach the result of `fetch_for_crawl` to the tree and dispatch the page
+        to its kind handler. This is the body of the `BasicCrawler.crawl` loop.
+        Returns True if a page handler was called (i.e. counts towards `limit`).
+        """
+        # Media files (PDF/ZIP/MP3) and broken link check
+        if verdict == True:
+            media_rsrc_dict = self.create_media_url_dict(original_url, head_response)
+            media_rsrc_dict['parent'] = context['parent']
+            context['parent']['children'].append(media_rsrc_dict)
+            return False
+        if page is None:
+            LOGGER.warning('GET ' + original_url + ' did not return page.')
+            broken_link_dict = self.create_broken_link_url_dict(original_url)
+            broken_link_dict['parent'] = context['parent']
+            context['parent']['children'].append(broken_link_dict)
+            return False
+
+        # record page URL as visited
+        self.urls_visited[original_url] = 'visited'
+        if url != original_url:
+            context['original_url'] = original_url
+
+        kind = context.get('kind')
+        handler = self.kind_handlers.get(kind)
+        if handler is None:
+            if kind is not None:
+                LOGGER.info('No handler registered for kind ' + str(kind)
+                            + ' so falling back to on_page handler.')
+            handler = self.on_page
+        elif isinstance(handler, str):
+            handler = getattr(self, handler)
+        handler(url, page, context)
+        return True
+
+
+    def crawl_concurrent(self, limit=1000, save_web_resource_tree=True, devmode=True,
+                         workers=4, budget=None, prioritize=False):
+        """
+        Same as `BasicCrawler.crawl` but the network requests are performed by a
+        pool of `workers` threads, with at most `PER_HOST_LIMIT` requests per host.
+        Handlers still run on the calling thread in the order URLs were enqueued,
+        so children are attached to their parent's `children` in the order they
+        appear on the page and the output tree matches the sequential crawl.
+
+        If `prioritize` is set, URLs are taken from a `PriorityFrontier` instead
+        of a FIFO queue, and children are re-sorted in page order after the crawl.
+        If a `budget` is given, the crawl stops as soon as one of its limits is
+        reached and `self.skipped` records what was left in the frontier.
+        """
+        # initialize or reset crawler state
+        self.queue = PriorityFrontier() if prioritize else queue.Queue()
+        self.global_urls_seen_count = defaultdict(int)
+        self.urls_visited = {}
+        self.request_stats.clear()
+        self.skipped = Counter()
+        self.budget_exhausted = None
+        start_time = time.time()
+
+        channel_dict = dict(
+            url='This is a temp. outer container for the crawler channel tree.'
+                'Its unique child node is the web root.',
+            kind='WEB_RESOURCE_TREE_CONTAINER',
+            children=[],
+        )
+        root_context = {'parent': channel_dict}
+        if self.START_PAGE_CONTEXT:
+            root_context.update(self.START_PAGE_CONTEXT)
+        self.enqueue_url_and_context(self.START_PAGE, root_context)
+
+        # in-flight (url, context, future) tuples in the order they were enqueued
+        pending = deque()
+        max_pending = workers * self.LOOKAHEAD_PER_WORKER
+        attach_order = {}   # id(node) --> enqueue order of the URL that created it
+        counter = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                if budget and counter > 0:
+                    self.budget_exhausted = budget.exhausted(self.request_stats, time.time() - start_time)
+                    if self.budget_exhausted:
+                        LOGGER.warning('Crawl budget exhausted (' + self.budget_exhausted + ')')
+                        break
+                while len(pending) < max_pending and not self.queue_is_empty():
+                    url, context = self.get_url_and_context()
+                    future = executor.submit(self.fetch_for_crawl, url)
+                    pending.append((url, context, future))
+                if not pending:
+                    break
+
+                original_url, context, future = pending.popleft()
+                verdict, head_response, url, page = future.result()
+                siblings = context['parent']['children']
+                num_siblings = len(siblings)
+                if self.process_fetched(original_url, context, verdict, head_response, url, page):
+                    counter += 1
+                if prioritize:
+                    for node in siblings[num_siblings:]:
+                        attach_order[id(node)] = self.queue.enqueue_order[id(context)]
+                if limit and counter > limit:
+                    break
+
+            # drop lookahead fetches that will not be used
+            for _, context, future in pending:
+                future.cancel()
+                self.skipped[context.get('kind', 'link')] += 1
+            while not self.queue_is_empty():
+                _, context = self.get_url_and_context()
+                self.skipped[context.get('kind', 'link')] += 1
+
+        # restore page order of children (nodes appended directly by handlers go first)
+        if prioritize:
+            def _recursive_sort_children(subtree):
+                subtree['children'].sort(key=lambda child: attach_order.get(id(child), -1))
+                for child in subtree['children']:
+                    _recursive_sort_children(child)
+            _recursive_sort_children(channel_dict)
+
+        # remove parent links and hoist tree one level up (same as sequential crawl)
+        self.cleanup_web_resource_tree(channel_dict)
+        channel_dict = channel_dict['children'][0]
+        if self.budget_exhausted:
+            self.skipped.update(prune_incomplete_nodes(channel_dict))
+        if save_web_resource_tree:
+            self.write_web_resource_tree_json(channel_dict)
+        if devmode:
+            self.print_crawler_devmode(channel_dict)
+        return channel_dict
+
+
+
+
     # CRALWING
     ############################################################################
 
-    def crawl(self, *args, **kwargs):
+    def crawl(self, *args, workers=1, budget=None, prioritize=False, **kwargs):
         """
         Extend base class crawl method with special tree post-processing step.
+        Use `workers` > 1 to fetch pages concurrently, and `budget`/`prioritize`
+        for partial crawls (see `crawl_concurrent`).
         """
-        web_resource_tree = super().crawl(*args, **kwargs)
-        lang = web_resource_tree['lang']
-        channel_metadata = dict(
-            source_domain = 'tessafrica.net',
-            source_id = 'TESSA_%s-testing' % lang,       # TODO: remove -testing
-            title = 'TESSA (%s)-testing' % lang,         # TODO: remove -testing
-            thumbnail = 'http://www.tessafrica.net/sites/all/themes/tessafricav2/images/logotype_02.png',
-            description = 'Teacher Education in Sub-Saharan Africa, TESSA, is a collaborative network to help you improve your practice as a teacher or teacher educator. We provide free, quality resources that support your national curriculum and can help you plan lessons that engage, involve and inspire.',
-            language = lang,
-        )
-        web_resource_tree.update(channel_metadata)
+        self.section_rules.pruned.clear()
+        if workers > 1 or budget or prioritize:
+            web_resource_tree = self.crawl_concurrent(*args, workers=workers, budget=budget,
+                                                      prioritize=prioritize, **kwargs)
+        else:
+            web_resource_tree = super().crawl(*args, **kwargs)
+        web_resource_tree.update(get_channel_metadata(web_resource_tree['lang']))
+        if budget:
+            web_resource_tree['crawl_budget'] = dict(
+                exhausted=self.budget_exhausted,
+                requests=self.request_stats['requests'],
+                bytes=self.request_stats['bytes'],
+                skipped=dict(self.skipped),
+            )
+
+        self.finish_web_resource_tree(web_resource_tree)
+        LOGGER.info('Crawl-time pruning skipped ' + str(dict(self.section_rules.pruned))
+                    + ' links, saving ' + str(self.section_rules.requests_saved) + ' requests')
+        if budget:
+            LOGGER.info('Crawl budget stats: ' + str(web_resource_tree['crawl_budget']))
+        return web_resource_tree
+
+
+    def write_web_resource_tree_json(self, channel_dict):
+        """
+        Save the tree as JSON (same format as before) and as a binary snapshot
+        next to it, both through the shared `tessa_nodes.Node` model.
+        """
+        tree = Node.from_dict(channel_dict)
+        save_tree(tree, self.CRAWLING_STAGE_OUTPUT, indent=2, sort_keys=True)
+        save_tree(tree, self.CRAWLING_STAGE_OUTPUT.replace('.json', BINARY_EXT))
+
 
-        # convert tree format expected by scraping functions
+    def finish_web_resource_tree(self, web_resource_tree):
+        """
+        Convert `web_resource_tree` to the format expected by scraping functions
+        and save it to CRAWLING_STAGE_OUTPUT.
+        """
         restructure_web_resource_tree(web_resource_tree)
-        remove_sections(web_resource_tree)
+        remove_sections(web_resource_tree, rules=self.section_rules)
         self.write_web_resource_tree_json(web_resource_tree)
+        self.head_cache.save()
+        return web_resource_tree
+
+
+
+# BENCHMARKS
+################################################################################
+
+def benchmark_url_policy(tree_globs=('chefdata/trees/*.json', 'chefdata/vader/trees/*.json'), number=20):
+    """
+    Micro-benchmark of `UrlPolicy` against the previous implementation (six
+    `re.sub` calls and a linear scan of IGNORE_URLS) over all URLs found in the
+    stored trees. Also checks both implementations agree on every URL.
+    """
+    urls = []
+    def _collect_urls(node):
+        for key in ['url', 'original_url']:
+            if isinstance(node.get(key), str):
+                urls.append(node[key])
+        for child in node.get('children', []):
+            _collect_urls(child)
+    for tree_glob in tree_globs:
+        for tree_path in sorted(glob.glob(tree_glob)):
+            with open(tree_path) as json_file:
+                _collect_urls(json.load(json_file))
+    # add fragment and query string variants that need cleanup
+    urls += [url + '&section=1.2#fragment' for url in urls if '?' in url]
+
+    ignore_patterns = TessaCrawler.BASE_IGNORE_URLS + TessaCrawler.IGNORE_URLS \
+                      + list(TESSA_LANG_URL_MAP.values())
+    source_domains = TessaCrawler.SOURCE_DOMAINS
+    policy = UrlPolicy(ignore_patterns, source_domains)
+
+    def _old_cleanup_url(url):
+        url = urldefrag(url)[0]
+        url = re.sub('&section=\d+(\.\d+)?', '', url)
+        url = re.sub('&printable=1', '', url)
+        url = re.sub('&content=scxml', '', url)
+        url = re.sub('&notifyeditingon=1', '', url)
+        url = re.sub(r'\?forcedownload=1', '', url)
+        url = re.sub('&forcedownload=1', '', url)
+        return url
+
+    def _old_should_ignore_url(url):
+        url = _old_cleanup_url(url)
+        for pattern in ignore_patterns:
+            if isinstance(pattern, str):
+                if url == pattern:
+                    return True
+            elif pattern.match(url):
+                return True
+        return not any(url.startswith(domain) for domain in source_domains)
+
+    for url in urls:
+        assert policy.cleanup_url(url) == _old_cleanup_url(url), url
+        assert policy.should_ignore_url(url) == _old_should_ignore_url(url), url
+
+    results = {}
+    for name, fn in [('old', _old_should_ignore_url), ('UrlPolicy', policy.should_ignore_url)]:
+        seconds = timeit.timeit(lambda: [fn(url) for url in urls], number=number)
+        results[name] = seconds / (number * len(urls)) * 1e6
+        print('%-10s %8.2f us/url  (%d urls)' % (name, results[name], len(urls)))
+    print('speedup    %8.1fx' % (results['old'] / results['UrlPolicy']))
+    return results
+
 
 
 
@@ -591,9 +1341,26 @@ class TessaCrawler(BasicCrawler):
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='This is the TESSA crawler')
-    parser.add_argument('--lang', required=True, help='Which TESSA language to crawl')
+    parser.add_argument('--lang', help='Which TESSA language to crawl')
+    parser.add_argument('--workers', type=int, default=1, help='Number of concurrent crawler threads')
+    parser.add_argument('--prioritize', action='store_true', help='Crawl module subpages and media first')
+    parser.add_argument('--max-requests', type=int, help='Stop crawling after this many requests')
+    parser.add_argument('--max-bytes', type=int, help='Stop crawling after downloading this many bytes')
+    parser.add_argument('--max-seconds', type=float, help='Stop crawling after this many seconds')
+    parser.add_argument('--benchmark-urls', action='store_true', help='Run the URL policy micro-benchmark and exit')
     args = parser.parse_args()
 
+    if args.benchmark_urls:
+        benchmark_url_policy()
+        raise SystemExit(0)
+    if not args.lang:
+        parser.error('the following arguments are required: --lang')
+
+    budget = None
+    if args.max_requests or args.max_bytes or args.max_seconds:
+        budget = CrawlBudget(args.max_requests, args.max_bytes, args.max_seconds)
+
     crawler = TessaCrawler(lang=args.lang)
-    channel_tree = crawler.crawl(devmode=True, limit=10000)
+    channel_tree = crawler.crawl(devmode=True, limit=10000, workers=args.workers,
+                                 budget=budget, prioritize=args.prioritize or budget is not None)
     crawler.print_tree(channel_tree)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+import atexit
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+
+
+# component name --> logger name
+LOG_COMPONENTS = {
+    'chef': 'tessa.chef',           # tree building and per-lang steps
+    'sections': 'tessa.sections',   # per-module and per-section scraping
+    'assets': 'tessa.assets',       # per-asset downloads and request caching
+    'crawler': 'crawler',           # basiccrawler and tessa_cralwer
+    'cache': 'cachecontrol',
+}
+DEFAULT_LOG_LEVELS = {
+    'chef': 'INFO',
+    'sections': 'INFO',
+    'assets': 'WARNING',
+    'crawler': 'INFO',
+    'cache': 'WARNING',
+}
+# attributes of every LogRecord, anything else was passed in `extra=`
+RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__.keys()) | {'message', 'asctime'}
+
+LOG_LISTENER = None
+LOG_HANDLER_LEVELS = {}   # handler --> its level before setup_logging, restored by stop_logging
+
+
+
+
+
+# LOGGING SETUP
+################################################################################
+
+def get_logger(component):
+    return logging.getLogger(LOG_COMPONENTS.get(component, component))
+
+
+def parse_log_levels(levels_str):
+    """
+    Parse the `log_levels` command line option, e.g. 'assets:DEBUG,crawler:WARNING'.
+    """
+    levels = {}
+    for item in (levels_str or '').split(','):
+        if not item.strip():
+            continue
+        component, sep, level = item.partition(':')
+        if not sep or component.strip() not in LOG_COMPONENTS:
+            raise ValueError('Bad log_levels item ' + item + ' Expected component:LEVEL with component in '
+                             + ', '.join(sorted(LOG_COMPONENTS.keys())))
+        levels[component.strip()] = level.strip().upper()
+    return levels
+
+
+def set_log_levels(levels):
+    for component, level in levels.items():
+        get_logger(component).setLevel(level)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record, including any fields passed as `extra=`.
+    """
+    def format(self, record):
+        entry = dict(
+            time=record.created,
+            level=record.levelname,
+            logger=record.name,
+            thread=record.threadName,
+            message=record.getMessage(),
+        )
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Puts records on the queue without formatting them, so the message is built
+    by the writer thread (records never leave the process).
+    """
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(levels=None, json_lines_path=None):
+    """
+    Move the handlers of the root logger behind a queue so that log records are
+    written by a background thread instead of the scraping threads, set the
+    per-component `levels` (see LOG_COMPONENTS), and optionally write all records
+    as JSON lines to `json_lines_path`. The moved handlers pass everything they
+    get, so filtering is done by the logger levels only: components can be set
+    below the root logger's level (e.g. sections:DEBUG with ricecooker's INFO).
+    """
+    global LOG_LISTENER
+    stop_logging()
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    if not handlers:
+        handlers = [logging.StreamHandler()]
+    if json_lines_path:
+        json_handler = logging.FileHandler(json_lines_path)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+    log_queue = queue.SimpleQueue()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    for handler in handlers:
+        LOG_HANDLER_LEVELS[handler] = handler.level
+        handler.setLevel(logging.NOTSET)
+    root_logger.addHandler(LazyQueueHandler(log_queue))
+    LOG_LISTENER = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    LOG_LISTENER.start()
+    atexit.register(stop_logging)
+
+    set_log_levels(dict(DEFAULT_LOG_LEVELS, **(levels or {})))
+    return LOG_LISTENER
+
+
+def stop_logging():
+    """
+    Flush queued records, stop the writer thread and put the handlers back on
+    the root logger.
+    """
+    global LOG_LISTENER
+    if LOG_LISTENER is not None:
+        LOG_LISTENER.stop()
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            if isinstance(handler, LazyQueueHandler):
+                root_logger.removeHandler(handler)
+        for handler in LOG_LISTENER.handlers:
+            handler.setLevel(LOG_HANDLER_LEVELS.pop(handler, handler.level))
+            root_logger.addHandler(handler)
+        LOG_LISTENER = None
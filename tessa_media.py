@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+
+FFMPEG = 'ffmpeg'
+# speech: mono 22 kHz at 32 kbps, loudness normalized (EBU R128, single pass)
+AUDIO_TRANSCODE_DEFAULTS = dict(
+    bitrate='32k',
+    channels=1,
+    sample_rate=22050,
+    loudnorm=True,
+)
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+
+QPDF = 'qpdf'
+GHOSTSCRIPT = 'gs'
+# images downsampled to 150 dpi (300 dpi for black and white scans) and recompressed
+PDF_OPTIMIZE_DEFAULTS = dict(
+    image_dpi=150,
+    recompress_images=True,
+)
+QPDF_WARNINGS_EXIT_CODE = 3   # output was written but qpdf found problems in the input
+HASH_CHUNK_SIZE = 1024 * 1024
+
+MEDIA_CHUNK_SIZE = 256 * 1024   # memory used per download, whatever the file size
+MEDIA_MAX_RETRIES = 5           # attempts in a row that make no progress
+MEDIA_RETRY_DELAY = 1.0         # seconds, times the number of failed attempts
+MEDIA_TIMEOUT = 60              # seconds without data before the connection counts as dropped
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+
+
+
+# HELPERS
+################################################################################
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def run_tool(command, ok_codes=(0,)):
+    """
+    Run the external tool `command`. Raises RuntimeError if it fails.
+    """
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode not in ok_codes:
+        stderr = result.stderr.decode('utf-8', 'replace').strip()
+        raise RuntimeError(os.path.basename(command[0]) + ' failed with exit code ' + str(result.returncode)
+                           + ': ' + stderr[-500:])
+
+
+
+
+# RESUMABLE DOWNLOADS
+################################################################################
+
+def _read_part_meta(meta_path, url):
+    if os.path.exists(meta_path):
+        with open(meta_path) as json_file:
+            meta = json.load(json_file)
+        if meta.get('url') == url:
+            return meta
+    return dict(url=url)
+
+
+def download_resumable(session, url, dest_path, expected_length=None, chunk_size=MEDIA_CHUNK_SIZE,
+                       max_retries=MEDIA_MAX_RETRIES, timeout=MEDIA_TIMEOUT):
+    """
+    Stream `url` to `dest_path` in `chunk_size` chunks. Data goes to a `.part`
+    file first. When the connection drops, the download continues from the end
+    of that file with an HTTP Range request, and so does a later call after a
+    crash. If-Range (ETag or Last-Modified) ensures a changed file is downloaded
+    again from the start. The result is checked against the length the server
+    declares, or else `expected_length` (e.g. the content-length in the web
+    resource tree). Raises RuntimeError after `max_retries` attempts in a row
+    without progress.
+    """
+    from requests.exceptions import RequestException
+    part_path = dest_path + '.part'
+    meta_path = part_path + '.json'
+    meta = _read_part_meta(meta_path, url)
+    failures = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        total = meta.get('total')
+        if total is not None and offset == total:
+            break
+        headers = {'Accept-Encoding': 'identity'}   # lengths and ranges are for the raw bytes
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+            if meta.get('validator'):
+                headers['If-Range'] = meta['validator']
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=timeout)
+            try:
+                content_range = CONTENT_RANGE_RE.match(response.headers.get('content-range', ''))
+                if response.status_code in (206, 416) and offset and \
+                        (not content_range or int(content_range.group(1)) != offset):
+                    os.remove(part_path)   # unusable partial file or range, start over
+                    meta = dict(url=url)
+                    continue
+                if response.status_code >= 500:
+                    raise RequestException('Server error ' + str(response.status_code))
+                if response.status_code >= 400:
+                    raise RuntimeError('Download of ' + url + ' failed with status ' + str(response.status_code))
+                if response.status_code == 206:
+                    mode = 'ab'
+                    if content_range.group(3) != '*':
+                        meta['total'] = int(content_range.group(3))
+                else:   # whole file, from the start
+                    offset = 0
+                    mode = 'wb'
+                    length = response.headers.get('content-length')
+                    meta['total'] = int(length) if length else None
+                    meta['validator'] = response.headers.get('etag') or response.headers.get('last-modified')
+                with open(meta_path, 'w') as json_file:
+                    json.dump(meta, json_file)
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+            finally:
+                response.close()
+        except (RequestException, OSError) as e:
+            error = e
+        else:
+            error = None
+            if meta.get('total') is None:
+                break   # no declared length, so the end of the stream is the end of the file
+        size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if meta.get('total') is not None and size == meta['total']:
+            break
+        if meta.get('total') is not None and size > meta['total']:
+            os.remove(part_path)
+            size = 0
+        failures = 0 if size > offset else failures + 1
+        if failures > max_retries:
+            raise RuntimeError('Download of ' + url + ' made no progress in ' + str(max_retries)
+                               + ' attempts: ' + str(error or 'incomplete response'))
+        time.sleep(MEDIA_RETRY_DELAY * failures)
+
+    size = os.path.getsize(part_path)
+    known_length = meta.get('total') if meta.get('total') is not None else expected_length
+    if known_length is not None and size != int(known_length):
+        raise RuntimeError('Download of ' + url + ' has ' + str(size) + ' bytes, expected ' + str(known_length))
+    os.replace(part_path, dest_path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return dest_path
+
+
+
+
+# AUDIO TRANSCODING
+################################################################################
+
+def get_ffmpeg():
+    """
+    Path of the ffmpeg executable, or None if it is not installed.
+    """
+    return shutil.which(FFMPEG)
+
+
+def get_audio_settings_key(bitrate, channels, sample_rate, loudnorm):
+    return '%s-%dch-%dhz%s' % (bitrate, channels, sample_rate, '-loudnorm' if loudnorm else '')
+
+
+def get_transcode_command(src_path, dest_path, bitrate, channels, sample_rate, loudnorm):
+    command = [get_ffmpeg() or FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+               '-i', src_path,
+               '-map', '0:a:0',   # first audio stream only, drops embedded cover art
+               '-ac', str(channels), '-ar', str(sample_rate)]
+    if loudnorm:
+        command += ['-af', LOUDNORM_FILTER]
+    command += ['-c:a', 'libmp3lame', '-b:a', bitrate, '-id3v2_version', '3', '-f', 'mp3', dest_path]
+    return command
+
+
+def transcode_audio(src_path, dest_path, bitrate, channels, sample_rate, loudnorm):
+    """
+    Transcode the audio file `src_path` to mp3 at `dest_path` with ffmpeg.
+    Raises RuntimeError if ffmpeg fails.
+    """
+    tmp_path = dest_path + '.' + str(os.getpid()) + '.part'
+    try:
+        run_tool(get_transcode_command(src_path, tmp_path, bitrate, channels, sample_rate, loudnorm))
+    except RuntimeError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dest_path)
+
+
+def transcode_audio_cached(src_path, cache_dir, bitrate, channels, sample_rate, loudnorm):
+    """
+    Transcode `src_path` into `cache_dir` unless it was already transcoded with
+    the same settings. The cache is keyed by the hash of the source file, so the
+    same recording linked from several URLs is transcoded once.
+    Returns (dest_path, src_bytes, dest_bytes, was_cached). Runs in the
+    packaging process pool.
+    """
+    settings_key = get_audio_settings_key(bitrate, channels, sample_rate, loudnorm)
+    dest_path = os.path.join(cache_dir, file_sha1(src_path) + '-' + settings_key + '.mp3')
+    was_cached = os.path.exists(dest_path)
+    if not was_cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        transcode_audio(src_path, dest_path, bitrate, channels, sample_rate, loudnorm)
+    return dest_path, os.path.getsize(src_path), os.path.getsize(dest_path), was_cached
+
+
+
+
+# PDF OPTIMIZATION
+################################################################################
+
+def get_qpdf():
+    return shutil.which(QPDF)
+
+
+def get_ghostscript():
+    return shutil.which(GHOSTSCRIPT)
+
+
+def get_pdf_settings_key(image_dpi, recompress_images):
+    if recompress_images and get_ghostscript():
+        return 'images%ddpi-linearized' % image_dpi
+    return 'linearized'
+
+
+def get_recompress_images_command(src_path, dest_path, image_dpi):
+    return [get_ghostscript() or GHOSTSCRIPT, '-q', '-dNOPAUSE', '-dBATCH', '-dSAFER',
+            '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.5', '-dPDFSETTINGS=/ebook',
+            '-dDetectDuplicateImages=true',
+            '-dDownsampleColorImages=true', '-dColorImageResolution=%d' % image_dpi,
+            '-dDownsampleGrayImages=true', '-dGrayImageResolution=%d' % image_dpi,
+            '-dDownsampleMonoImages=true', '-dMonoImageResolution=%d' % (image_dpi * 2),
+            '-sOutputFile=' + dest_path, src_path]
+
+
+def get_linearize_command(src_path, dest_path):
+    # qpdf only writes objects reachable from the document, so unused objects are dropped
+    return [get_qpdf() or QPDF, '--linearize', '--object-streams=generate',
+            '--compress-streams=y', '--recompress-flate', '--compression-level=9',
+            '--remove-unreferenced-resources=yes', src_path, dest_path]
+
+
+def optimize_pdf(src_path, dest_path, image_dpi, recompress_images):
+    """
+    Recompress the images of the PDF `src_path` with Ghostscript (if enabled and
+    installed and it makes the file smaller), then drop unused objects and
+    linearize it for fast first page display with qpdf, writing `dest_path`.
+    Raises RuntimeError if qpdf fails.
+    """
+    tmp_prefix = dest_path + '.' + str(os.getpid())
+    images_path = tmp_prefix + '.images.pdf'
+    linearized_path = tmp_prefix + '.part'
+    try:
+        qpdf_input = src_path
+        if recompress_images and get_ghostscript():
+            try:
+                run_tool(get_recompress_images_command(src_path, images_path, image_dpi))
+                if os.path.getsize(images_path) < os.path.getsize(src_path):
+                    qpdf_input = images_path
+            except RuntimeError:
+                pass   # keep the original images, still linearize
+        run_tool(get_linearize_command(qpdf_input, linearized_path), ok_codes=(0, QPDF_WARNINGS_EXIT_CODE))
+        os.replace(linearized_path, dest_path)
+    finally:
+        for tmp_path in [images_path, linearized_path]:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def optimize_pdf_cached(src_path, cache_dir, image_dpi, recompress_images):
+    """
+    Optimize `src_path` into `cache_dir` unless it was already optimized with
+    the same settings (keyed by the hash of the source file, like audio).
+    Returns (dest_path, src_bytes, dest_bytes, was_cached). Runs in the
+    packaging process pool.
+    """
+    settings_key = get_pdf_settings_key(image_dpi, recompress_images)
+    dest_path = os.path.join(cache_dir, file_sha1(src_path) + '-' + settings_key + '.pdf')
+    was_cached = os.path.exists(dest_path)
+    if not was_cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        optimize_pdf(src_path, dest_path, image_dpi, recompress_images)
+    return dest_path, os.path.getsize(src_path), os.path.getsize(dest_path), was_cached
+
+
+
+
+# CLI
+################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transcode TESSA audio and PDF files for low-bandwidth delivery')
+    parser.add_argument('--audio', nargs='+', metavar='MP3', help='Audio files to transcode')
+    parser.add_argument('--pdf', nargs='+', metavar='PDF', help='PDF files to optimize')
+    parser.add_argument('--dest', default='chefdata/assetstore/media', help='Output (cache) dir')
+    parser.add_argument('--bitrate', default=AUDIO_TRANSCODE_DEFAULTS['bitrate'])
+    parser.add_argument('--channels', type=int, default=AUDIO_TRANSCODE_DEFAULTS['channels'])
+    parser.add_argument('--sample-rate', type=int, default=AUDIO_TRANSCODE_DEFAULTS['sample_rate'])
+    parser.add_argument('--no-loudnorm', action='store_true', help='Skip loudness normalization')
+    parser.add_argument('--image-dpi', type=int, default=PDF_OPTIMIZE_DEFAULTS['image_dpi'])
+    parser.add_argument('--keep-images', action='store_true', help='Only linearize PDFs')
+    args = parser.parse_args()
+
+    results = []
+    if args.audio:
+        if not get_ffmpeg():
+            parser.error('ffmpeg is not installed')
+        for src_path in args.audio:
+            results.append((src_path, transcode_audio_cached(src_path, args.dest, args.bitrate, args.channels,
+                                                             args.sample_rate, not args.no_loudnorm)))
+    if args.pdf:
+        if not get_qpdf():
+            parser.error('qpdf is not installed')
+        for src_path in args.pdf:
+            results.append((src_path, optimize_pdf_cached(src_path, args.dest, args.image_dpi, not args.keep_images)))
+    if not results:
+        parser.print_help()
+    for src_path, (dest_path, src_bytes, dest_bytes, was_cached) in results:
+        print('%s -> %s: %d -> %d bytes%s' % (src_path, dest_path, src_bytes, dest_bytes,
+                                              ' (cached)' if was_cached else ''))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+import argparse
+from collections import defaultdict, deque
+import os
+from urllib.parse import quote_plus
+
+from bs4 import BeautifulSoup
+
+from tessa_cralwer import LOGGER, MOD_CONTENT_RE, MOD_SUBPAGE_RE, TESSA_AUDIO_RESOURCES_SUBPAGES
+from tessa_cralwer import TessaCrawler, get_channel_metadata, url_to_id
+
+
+MOODLE_WS_URL = 'http://www.open.edu/openlearncreate/webservice/rest/server.php'
+MOODLE_WS_TOKEN_ENV = 'MOODLE_WS_TOKEN'
+# Moodle mimetypes that differ from the content-type names used in web resource trees
+MOODLE_MIMETYPES = {
+    'audio/mpeg': 'audio/mp3',
+}
+
+
+
+
+
+# MOODLE WEB SERVICE DISCOVERY
+################################################################################
+
+def get_module_file(module):
+    """
+    Returns the first entry in the `contents` of a Moodle course module (the
+    file of a resource, or the external link of a url module), or None.
+    """
+    contents = module.get('contents') or []
+    if contents:
+        return contents[0]
+    return None
+
+
+class MoodleApiCrawler(TessaCrawler):
+    """
+    Builds the same web resource tree as `TessaCrawler` from the course contents
+    returned by the Moodle web service (`core_course_get_contents`), so course
+    structure discovery takes a single JSON request instead of one GET or HEAD
+    per page and link.
+    Subpage contents are read from the course sections delegated to the subpage,
+    i.e. sections with `component` == SUBPAGE_COMPONENT and `itemid` equal to the
+    subpage instance id.
+    """
+    WS_URL = MOODLE_WS_URL
+    SUBPAGE_COMPONENT = 'mod_subpage'
+
+
+    def __init__(self, *args, lang='en', ws_url=None, ws_token=None, **kwargs):
+        super().__init__(*args, lang=lang, **kwargs)
+        self.ws_url = ws_url or self.WS_URL
+        self.ws_token = ws_token or os.environ.get(MOODLE_WS_TOKEN_ENV)
+        if not self.ws_token:
+            raise ValueError('Moodle web service discovery needs a token: pass ws_token or set ' + MOODLE_WS_TOKEN_ENV)
+        self.course_id = url_to_id(self.START_PAGE)
+        self.modules_by_id = {}
+        self.subpage_sections = defaultdict(list)
+
+
+    def call_ws(self, wsfunction, **params):
+        """
+        Call the Moodle REST web service function `wsfunction` and return the decoded JSON.
+        """
+        data = dict(params, wstoken=self.ws_token, wsfunction=wsfunction, moodlewsrestformat='json')
+        response = self.make_request(self.ws_url, method='POST', data=data)
+        if response is None:
+            raise ValueError('Moodle web service call ' + wsfunction + ' failed')
+        result = response.json()
+        if isinstance(result, dict) and 'exception' in result:
+            raise ValueError('Moodle web service call ' + wsfunction + ' returned error '
+                             + str(result.get('errorcode')) + ': ' + str(result.get('message')))
+        return result
+
+
+    def get_course_sections(self):
+        """
+        Fetch the course contents and index subpage sections and modules.
+        Returns the list of top-level course sections.
+        """
+        sections = self.call_ws('core_course_get_contents', courseid=self.course_id)
+        self.modules_by_id = {}
+        self.subpage_sections = defaultdict(list)
+        top_sections = []
+        for section in sections:
+            for module in section.get('modules', []):
+                self.modules_by_id[str(module['id'])] = module
+            if section.get('component') == self.SUBPAGE_COMPONENT:
+                self.subpage_sections[str(section['itemid'])].append(section)
+            elif not section.get('component'):
+                top_sections.append(section)
+        return top_sections
+
+
+    def get_section_modules(self, module):
+        """
+        Modules listed on the subpage `module`, in page order.
+        """
+        modules = []
+        for section in self.subpage_sections.get(str(module.get('instance')), []):
+            modules.extend(section.get('modules', []))
+        return modules
+
+
+    def resolve_module(self, module):
+        """
+        Follow mod/url links to the course module they point to (usually oucontent).
+        Returns (modname, url, module) or (None, url, None) for links to skip.
+        """
+        url = module.get('url')
+        if module['modname'] != 'url':
+            return module['modname'], url, module
+        link = get_module_file(module)
+        if not link or not link.get('fileurl'):
+            return None, url, None
+        url = link['fileurl']
+        if MOD_SUBPAGE_RE.match(url) or MOD_CONTENT_RE.match(url):
+            target = self.modules_by_id.get(url_to_id(url))
+            if target:
+                return target['modname'], url, target
+            if MOD_CONTENT_RE.match(url):
+                return 'oucontent', url, module
+        return None, url, None
+
+
+    def create_media_dict(self, module, title):
+        """
+        Create a `MediaWebResource` dict for the file of a resource `module`
+        from the file metadata in the web service response (no HEAD request).
+        """
+        module_file = get_module_file(module)
+        if not module_file or module_file.get('type') != 'file':
+            return None
+        content_type = module_file.get('mimetype')
+        content_type = MOODLE_MIMETYPES.get(content_type, content_type)
+        if content_type not in self.MEDIA_CONTENT_TYPES:
+            LOGGER.warning('Unsupported format ' + str(content_type) + ' url=' + module['url'])
+            return None
+        file_url = module_file['fileurl'].replace('/webservice/pluginfile.php', '/pluginfile.php')
+        media_rsrc_dict = dict(
+            kind='MediaWebResource',
+            url=self.cleanup_url(file_url),
+            original_url=module['url'],
+            title=title,
+            children=[],
+        )
+        media_rsrc_dict['content-type'] = content_type
+        if module_file.get('filesize') is not None:
+            media_rsrc_dict['content-length'] = str(module_file['filesize'])
+        return media_rsrc_dict
+
+
+    def add_module(self, module, parent, seen):
+        """
+        Append a node for `module` to `parent` using the same kinds the page
+        handlers in `TessaCrawler` produce. Returns (node, module) for subpages
+        whose contents need to be added, otherwise (None, None).
+        """
+        if not module.get('uservisible', True) or not module.get('url'):
+            return None, None
+        title = module['name']
+        modname, url, module = self.resolve_module(module)
+        if modname is None:
+            LOGGER.debug('____ Skipping link ' + str(url))
+            return None, None
+        url = self.cleanup_url(url)
+        if url in seen or self.should_ignore_url(url):
+            LOGGER.debug('Ignoring link ' + url)
+            return None, None
+        seen.add(url)
+
+        if parent['kind'] == 'audio_resources_subpage':
+            if modname != 'subpage':
+                LOGGER.debug(':::audio_resources_subpage::: Skipping link ' + url + ' ' + title)
+                return None, None
+            kind = 'audio_resource_topic_subpage'
+        elif modname == 'subpage':
+            if url_to_id(url) in TESSA_AUDIO_RESOURCES_SUBPAGES:
+                kind = 'audio_resources_subpage'
+            else:
+                kind = 'subpage'
+        elif modname == 'oucontent':
+            kind = 'oucontent'
+        elif modname == 'resource':
+            media_rsrc_dict = self.create_media_dict(module, title)
+            if media_rsrc_dict:
+                parent['children'].append(media_rsrc_dict)
+            return None, None
+        else:
+            LOGGER.debug('____ Skipping ' + modname + ' ' + url)
+            return None, None
+
+        node = dict(
+            kind=kind,
+            url=url,
+            title=title,
+            children=[],
+        )
+        parent['children'].append(node)
+        if kind == 'oucontent':
+            return None, None
+        return node, module
+
+
+    def add_audio_resource_sections(self, topic_subpage_dict, module):
+        """
+        Same as `on_audio_resource_topic_subpage`: one `TessaAudioResourceSection`
+        per section of the subpage, with labels as description and mp3 children.
+        """
+        url = topic_subpage_dict['url']
+        for section in self.subpage_sections.get(str(module.get('instance')), []):
+            section_title = (section.get('name') or '').strip()
+            if not section_title:
+                continue
+            subtopic_dict = dict(
+                kind='TessaAudioResourceSection',
+                url=url + '#' + quote_plus(section_title),
+                title=section_title,
+                children=[],
+            )
+            subtopic_dict['source_id'] = subtopic_dict['url']
+            subtopic_description = ''
+            for activity in section.get('modules', []):
+                if not activity.get('uservisible', True):
+                    continue
+                if activity['modname'] in ['label', 'heading']:
+                    description_html = activity.get('description') or activity.get('name', '')
+                    subtopic_description += BeautifulSoup(description_html, 'html.parser').get_text()
+                elif activity['modname'] == 'resource':
+                    media_rsrc_dict = self.create_media_dict(activity, activity['name'])
+                    if media_rsrc_dict:
+                        subtopic_dict['children'].append(media_rsrc_dict)
+            subtopic_dict['description'] = subtopic_description
+            topic_subpage_dict['children'].append(subtopic_dict)
+
+
+    def crawl(self, *args, **kwargs):
+        """
+        Build, post-process, and save the web resource tree from the course
+        contents JSON. Crawling options (limit, workers, budget) are ignored.
+        """
+        self.section_rules.pruned.clear()
+        top_sections = self.get_course_sections()
+        web_resource_tree = dict(
+            url=self.START_PAGE,
+            title='',
+            children=[],
+        )
+        web_resource_tree.update(self.START_PAGE_CONTEXT)
+
+        # breadth-first like the crawler, so links found on several pages end
+        # up in the same place in the tree
+        seen = set([self.START_PAGE])
+        pending = deque()
+        pending.append((web_resource_tree, [m for s in top_sections for m in s.get('modules', [])]))
+        while pending:
+            parent, modules = pending.popleft()
+            for module in modules:
+                node, subpage_module = self.add_module(module, parent, seen)
+                if node is None:
+                    continue
+                if node['kind'] == 'audio_resource_topic_subpage':
+                    self.add_audio_resource_sections(node, subpage_module)
+                else:
+                    pending.append((node, self.get_section_modules(subpage_module)))
+
+        web_resource_tree.update(get_channel_metadata(web_resource_tree['lang']))
+        self.finish_web_resource_tree(web_resource_tree)
+        LOGGER.info('Built web resource tree from Moodle web service using '
+                    + str(self.request_stats['requests']) + ' requests')
+        return web_resource_tree
+
+
+
+
+# CLI
+################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the TESSA web resource tree from the Moodle web service')
+    parser.add_argument('--lang', required=True, help='Which TESSA language to build the tree for')
+    parser.add_argument('--ws-url', default=MOODLE_WS_URL, help='Moodle REST web service endpoint')
+    parser.add_argument('--token', help='Moodle web service token (default: $' + MOODLE_WS_TOKEN_ENV + ')')
+    args = parser.parse_args()
+
+    crawler = MoodleApiCrawler(lang=args.lang, ws_url=args.ws_url, ws_token=args.token)
+    channel_tree = crawler.crawl()
+    crawler.print_tree(channel_tree)
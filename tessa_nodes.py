@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import json
+import marshal
+import os
+import sys
+import time
+import tracemalloc
+
+
+NODE_FIELDS = ('kind', 'source_id', 'url', 'title', 'lang', 'children')
+BINARY_MAGIC = b'TESSANODES1\n'
+BINARY_EXT = '.nodes'
+
+
+
+
+
+# NODE MODEL
+################################################################################
+
+class Node(object):
+    """
+    Compact tree node used for web resource trees and ricecooker json trees.
+    The common keys are stored in slots (`kind` and `lang` strings are interned),
+    all other keys in the `extra` dict. Supports the read-only dict access
+    (`node['title']`, `node.get('children', [])`, `'kind' in node`) used by the
+    scraping functions, so a Node tree can be used in place of the dict tree.
+    A key is "missing" when its slot is None; keys with None values go in `extra`.
+    """
+    __slots__ = NODE_FIELDS + ('extra',)
+
+    def __init__(self, kind=None, source_id=None, url=None, title=None, lang=None,
+                 children=None, extra=None):
+        self.kind = sys.intern(kind) if kind is not None else None
+        self.source_id = source_id
+        self.url = url
+        self.title = title
+        self.lang = sys.intern(lang) if lang is not None else None
+        self.children = children
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, node_dict):
+        """
+        Convert a dict tree to a Node tree (`parent` links are dropped).
+        """
+        node = cls()
+        extra = None
+        for key, value in node_dict.items():
+            if key in NODE_FIELDS and value is not None:
+                if key == 'children':
+                    value = [cls.from_dict(child) for child in value]
+                elif key in ('kind', 'lang'):
+                    value = sys.intern(value)
+                setattr(node, key, value)
+            elif key != 'parent':
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        node.extra = extra
+        return node
+
+    def to_dict(self):
+        node_dict = {}
+        for key in NODE_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                if key == 'children':
+                    value = [child.to_dict() for child in value]
+                node_dict[key] = value
+        if self.extra:
+            node_dict.update(self.extra)
+        return node_dict
+
+    # dict-style access
+    def __getitem__(self, key):
+        if key in NODE_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        if self.extra and key in self.extra:   # includes NODE_FIELDS keys with None values
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return '<Node ' + str(self.kind) + ' ' + str(self.source_id or self.url) + '>'
+
+    # compact tuple form used by the binary format
+    def to_tuple(self):
+        children = self.children
+        if children is not None:
+            children = tuple(child.to_tuple() for child in children)
+        return (self.kind, self.source_id, self.url, self.title, self.lang, children, self.extra)
+
+    @classmethod
+    def from_tuple(cls, node_tuple):
+        kind, source_id, url, title, lang, children, extra = node_tuple
+        if children is not None:
+            children = [cls.from_tuple(child) for child in children]
+        return cls(kind, source_id, url, title, lang, children, extra)
+
+
+
+
+# SERIALIZERS
+################################################################################
+
+def dumps_json(node, indent=None, sort_keys=False):
+    """
+    JSON text for the Node tree `node`; compact unless `indent` is given.
+    """
+    separators = (',', ':') if indent is None else None
+    return json.dumps(node.to_dict(), ensure_ascii=False, indent=indent,
+                      sort_keys=sort_keys, separators=separators)
+
+
+def loads_json(json_str):
+    return Node.from_dict(json.loads(json_str))
+
+
+def dumps_binary(node):
+    """
+    Binary form of the Node tree `node` (marshal-ed nested tuples). It is fast to
+    load but tied to the marshal format, so use it for local snapshots and keep
+    the JSON files as the interchange format.
+    """
+    return BINARY_MAGIC + marshal.dumps(node.to_tuple())
+
+
+def loads_binary(data):
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError('Not a binary node tree (bad header)')
+    return Node.from_tuple(marshal.loads(data[len(BINARY_MAGIC):]))
+
+
+def save_tree(node, path, indent=None, sort_keys=False):
+    """
+    Save the Node tree `node` to `path` in binary format if `path` ends with
+    BINARY_EXT, otherwise as JSON.
+    """
+    parent_dir = os.path.dirname(path)
+    if parent_dir:
+        os.makedirs(parent_dir, exist_ok=True)
+    if path.endswith(BINARY_EXT):
+        with open(path, 'wb') as binary_file:
+            binary_file.write(dumps_binary(node))
+    else:
+        with open(path, 'w') as json_file:
+            json_file.write(dumps_json(node, indent=indent, sort_keys=sort_keys))
+
+
+def load_tree(path):
+    """
+    Load a Node tree from a binary (BINARY_EXT) or JSON tree file.
+    """
+    if path.endswith(BINARY_EXT):
+        with open(path, 'rb') as binary_file:
+            return loads_binary(binary_file.read())
+    with open(path) as json_file:
+        return Node.from_dict(json.load(json_file))
+
+
+
+
+# BENCHMARKS
+################################################################################
+
+def benchmark_nodes(tree_globs=('chefdata/trees/*.json', 'chefdata/vader/trees/*.json'), number=5):
+    """
+    Load all stored tree files as dicts and as Nodes, check that both
+    serializers round-trip them, and compare load time and memory use.
+    """
+    paths = []
+    for tree_glob in tree_globs:
+        paths.extend(sorted(glob.glob(tree_glob)))
+    json_strs = []
+    for path in paths:
+        with open(path) as json_file:
+            json_strs.append(json_file.read())
+
+    nodes = [loads_json(json_str) for json_str in json_strs]
+    binaries = [dumps_binary(node) for node in nodes]
+    for path, json_str, node, binary in zip(paths, json_strs, nodes, binaries):
+        if loads_json(dumps_json(node)).to_dict() != json.loads(json_str):
+            raise ValueError('JSON round-trip failed for ' + path)
+        if loads_binary(binary) != node or node.to_dict() != json.loads(json_str):
+            raise ValueError('Binary round-trip failed for ' + path)
+
+    def _time(fn):
+        start = time.time()
+        for i in range(number):
+            fn()
+        return (time.time() - start) / number
+
+    def _memory(fn):
+        tracemalloc.start()
+        result = fn()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del result
+        return size
+
+    load_dicts = lambda: [json.loads(json_str) for json_str in json_strs]
+    load_json_nodes = lambda: [loads_json(json_str) for json_str in json_strs]
+    load_binary_nodes = lambda: [loads_binary(binary) for binary in binaries]
+    print('Loaded', len(paths), 'tree files; all round-trips OK')
+    print('json.loads -> dicts      %8.1f ms  %8.1f KB' % (_time(load_dicts) * 1000, _memory(load_dicts) / 1024))
+    print('loads_json -> Nodes      %8.1f ms  %8.1f KB' % (_time(load_json_nodes) * 1000, _memory(load_json_nodes) / 1024))
+    print('loads_binary -> Nodes    %8.1f ms  %8.1f KB' % (_time(load_binary_nodes) * 1000, _memory(load_binary_nodes) / 1024))
+    print('file sizes: json', sum(len(s.encode('utf-8')) for s in json_strs),
+          'bytes, binary', sum(len(b) for b in binaries), 'bytes')
+
+
+
+
+# CLI
+################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert and benchmark TESSA tree files')
+    parser.add_argument('--benchmark', action='store_true', help='Round-trip and benchmark all stored trees')
+    parser.add_argument('--convert', nargs=2, metavar=('SRC', 'DEST'),
+                        help='Convert tree file SRC to DEST (binary if DEST ends with ' + BINARY_EXT + ')')
+    args = parser.parse_args()
+
+    if args.convert:
+        src, dest = args.convert
+        save_tree(load_tree(src), dest, indent=2)
+    else:
+        benchmark_nodes()
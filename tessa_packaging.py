@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+
+
+PACKAGING_WORKERS = os.cpu_count() or 2
+
+# blocks kept verbatim: whitespace is significant in <pre> and <textarea>, and
+# <script>/<style> contents are not HTML
+PRESERVED_TAGS = ['pre', 'textarea', 'script', 'style']
+HTML_TOKEN_RE = re.compile(
+    r'(?P<comment><!--.*?-->)'
+    r'|(?P<preserved><(?P<tag>' + '|'.join(PRESERVED_TAGS) + r')\b.*?</(?P=tag)\s*>)'
+    r'|(?P<element></?[a-zA-Z!?](?:[^>"\']|"[^"]*"|\'[^\']*\')*>)',   # > inside quoted attribute values
+    re.IGNORECASE | re.DOTALL)
+CONDITIONAL_COMMENT_RE = re.compile(r'<!--\[if|<!\[endif\]', re.IGNORECASE)
+# ASCII whitespace only, so &nbsp;, zero-width joiners, and the RTL/LTR marks
+# used in Arabic text are never touched
+WHITESPACE_RE = re.compile(r'[ \t\n\r\f]+')
+EMPTY_WRAPPER_RE = re.compile(r'<(div|span)>([ \n]?)</\1>')
+
+ZIP_COMPRESSION_LEVEL = 6   # zlib level 1-9 for deflated entries, 0 stores everything
+# already-compressed formats are stored, deflating them gains nothing and makes
+# extraction on the device slower
+ZIP_STORED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.m4a', '.ogg', '.mp4', '.webm',
+                         '.woff', '.woff2', '.zip', '.gz']
+ZIP_DATE_TIME = (2015, 10, 21, 7, 28, 0)   # same neutral timestamp as ricecooker's create_predictable_zip
+
+
+
+
+
+# HTML MINIFICATION
+################################################################################
+
+def _collapse_whitespace(text):
+    return WHITESPACE_RE.sub(lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def _remove_empty_wrappers(html):
+    count = 1
+    while count:
+        html, count = EMPTY_WRAPPER_RE.subn(r'\2', html)   # keep the space between words
+    return html
+
+
+def minify_html(html):
+    """
+    Safe HTML minification for rendered pages:
+      - comments are removed (conditional comments are kept)
+      - whitespace runs in text are collapsed to one space or newline
+      - attribute-less empty <div> and <span> wrappers are removed (one
+        containing a single space or newline is replaced by it)
+    Tags, <pre>, <textarea>, <script>, and <style> blocks are kept as they are.
+    """
+    parts = []      # minified segments and preserved blocks
+    segment = []    # text and tags since the last preserved block
+    text = []       # text since the last tag (comments removed)
+    pos = 0
+    for match in HTML_TOKEN_RE.finditer(html):
+        text.append(html[pos:match.start()])
+        pos = match.end()
+        token = match.group(0)
+        if match.group('comment') and not CONDITIONAL_COMMENT_RE.match(token):
+            continue
+        segment.append(_collapse_whitespace(''.join(text)))
+        text = []
+        if match.group('preserved'):
+            parts.append(_remove_empty_wrappers(''.join(segment)))
+            parts.append(token)
+            segment = []
+        else:
+            segment.append(token)
+    text.append(html[pos:])
+    segment.append(_collapse_whitespace(''.join(text)))
+    parts.append(_remove_empty_wrappers(''.join(segment)))
+    return ''.join(parts)
+
+
+def minify_html_file(path):
+    """
+    Minify the HTML file at `path` in place. Returns (bytes_before, bytes_after).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    minified = minify_html(data.decode('utf-8', 'surrogateescape')).encode('utf-8', 'surrogateescape')
+    if len(minified) < len(data):
+        with open(path, 'wb') as f:
+            f.write(minified)
+        return len(data), len(minified)
+    return len(data), len(data)
+
+
+PROCESS_POOL = None
+PROCESS_POOL_LOCK = threading.Lock()
+
+def get_process_pool():
+    """
+    Process pool for CPU-bound packaging work. Uses spawn since the chef process
+    has worker threads (forking them with locks held can deadlock).
+    """
+    global PROCESS_POOL
+    with PROCESS_POOL_LOCK:
+        if PROCESS_POOL is None:
+            import multiprocessing
+            PROCESS_POOL = ProcessPoolExecutor(max_workers=PACKAGING_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+    return PROCESS_POOL
+
+
+def find_html_files(directory):
+    paths = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(('.html', '.htm')):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+
+def minify_html_files(directory, parallel=True):
+    """
+    Minify all HTML files in `directory`, in parallel in the packaging process
+    pool. Returns (num_files, bytes_before, bytes_after).
+    """
+    paths = find_html_files(directory)
+    if parallel and len(paths) > 1:
+        sizes = list(get_process_pool().map(minify_html_file, paths))
+    else:
+        sizes = [minify_html_file(path) for path in paths]
+    return len(paths), sum(before for before, after in sizes), sum(after for before, after in sizes)
+
+
+
+
+# ZIP PACKING
+################################################################################
+
+def find_zip_entries(directory):
+    """
+    Relative paths (with / separators) of all files in `directory`, in the sorted
+    order they are written to the zip.
+    """
+    entries = []
+    for root, dirs, filenames in os.walk(directory):
+        for filename in filenames:
+            entries.append(os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/'))
+    return sorted(entries)
+
+
+def compress_zip_entry(path, level=ZIP_COMPRESSION_LEVEL):
+    """
+    Read the file at `path` and compress it for the zip. Returns (method, crc,
+    size, data). Files in ZIP_STORED_EXTENSIONS, and files that deflate doesn't
+    make smaller, are stored. zlib releases the GIL so this runs in threads.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    crc = zlib.crc32(content)
+    if level and os.path.splitext(path)[1].lower() not in ZIP_STORED_EXTENSIONS:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)   # raw deflate stream
+        data = compressor.compress(content) + compressor.flush()
+        if len(data) < len(content):
+            return 8, crc, len(content), data
+    return 0, crc, len(content), content
+
+
+def _dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _compress_in_order(executor, paths, level, window):
+    """
+    Yield compress_zip_entry(path, level) for `paths` in order, with at most
+    `window` entries compressed or waiting to be written at any time, so memory
+    use doesn't grow with the size of the directory.
+    """
+    pending = deque()
+    for path in paths:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(compress_zip_entry, path, level))
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_predictable_zip(directory, zip_path, level=ZIP_COMPRESSION_LEVEL, workers=PACKAGING_WORKERS):
+    """
+    Zip all files in `directory` to `zip_path`. Entries are compressed in
+    parallel on `workers` threads and written in sorted order with fixed
+    metadata, so the same files always give the same bytes (for any `workers`).
+    Returns (num_entries, num_stored, bytes_before, bytes_after).
+    """
+    entries = find_zip_entries(directory)
+    if len(entries) >= 0xFFFF:
+        raise ValueError('Too many files in ' + directory + ' for a zip without zip64')
+    dos_date, dos_time = _dos_date_time(ZIP_DATE_TIME)
+    paths = [os.path.join(directory, *entry.split('/')) for entry in entries]
+    central_directory = []
+    num_stored, before, after = 0, 0, 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor, open(zip_path, 'wb') as zip_file:
+        # results come back in order, so the layout doesn't depend on thread timing
+        results = _compress_in_order(executor, paths, level, window=2 * max(workers, 1))
+        for entry, (method, crc, size, data) in zip(entries, results):
+            offset = zip_file.tell()
+            if max(size, len(data), offset) >= 0xFFFFFFFF:
+                raise ValueError('File ' + entry + ' in ' + directory + ' is too big for a zip without zip64')
+            name = entry.encode('utf-8')
+            flags = 0 if entry.isascii() else 0x800   # UTF-8 names
+            version = 20 if method == 8 else 10
+            fields = struct.pack('<HHHHHIIIH', version, flags, method, dos_time, dos_date,
+                                 crc, len(data), size, len(name))
+            zip_file.write(b'PK\x03\x04' + fields + struct.pack('<H', 0) + name)
+            zip_file.write(data)
+            central_directory.append(b'PK\x01\x02' + struct.pack('<H', 20) + fields
+                                     + struct.pack('<HHHHII', 0, 0, 0, 0, 0, offset) + name)
+            num_stored += method == 0
+            before += size
+            after += len(data)
+        cd_offset = zip_file.tell()
+        cd = b''.join(central_directory)
+        zip_file.write(cd)
+        zip_file.write(b'PK\x05\x06' + struct.pack('<HHHHIIH', 0, 0, len(entries), len(entries),
+                                                      len(cd), cd_offset, 0))
+    return len(entries), num_stored, before, after
+
+
+def create_predictable_zip(directory, level=ZIP_COMPRESSION_LEVEL, workers=PACKAGING_WORKERS):
+    """
+    Drop-in for ricecooker.utils.zip.create_predictable_zip (for directories):
+    zip `directory` with write_predictable_zip and return the temporary zip path.
+    """
+    fd, zip_path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    write_predictable_zip(directory, zip_path, level=level, workers=workers)
+    return zip_path
+
+
+
+
+# CLI
+################################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Packaging steps for TESSA module and content page dirs')
+    parser.add_argument('--minify', metavar='DIR', help='Minify all HTML files in DIR in place')
+    parser.add_argument('--zip', nargs=2, metavar=('DIR', 'ZIPFILE'), help='Zip DIR to ZIPFILE')
+    parser.add_argument('--level', type=int, default=ZIP_COMPRESSION_LEVEL, help='Compression level for --zip')
+    args = parser.parse_args()
+
+    if args.minify:
+        num_files, before, after = minify_html_files(args.minify)
+        print('Minified', num_files, 'HTML files: %d -> %d bytes (-%.1f%%)'
+              % (before, after, 100.0 * (before - after) / max(before, 1)))
+    elif args.zip:
+        num_entries, num_stored, before, after = write_predictable_zip(args.zip[0], args.zip[1], level=args.level)
+        print('Zipped', num_entries, 'files (%d stored): %d -> %d bytes' % (num_stored, before, after))
+    else:
+        parser.print_help()
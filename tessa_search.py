@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+import zipfile
+
+
+SEARCH_INDEX_FILENAME = 'search_index.js'
+SEARCH_INDEX_VAR = 'TESSA_SEARCH_INDEX'
+SEARCH_INDEX_VERSION = 1
+
+# Text normalization, shipped in the index so the search box in module_index.html
+# tokenizes queries exactly like the index was tokenized:
+#   lowercase -> NFD -> drop STRIP_PATTERN chars -> FOLD_CHARS -> split on SPLIT_PATTERN
+# STRIP_PATTERN removes latin accents (é -> e) and arabic harakat, hamza marks
+# (أ إ آ -> ا after NFD) and tatweel.
+STRIP_PATTERN = '[\u0300-\u036f\u0640\u064b-\u065f\u0670]'
+SPLIT_PATTERN = '[\\s!-/:-@\\[-`{-~\u00a0-\u00bf\u060c\u061b\u061f\u066a-\u066d\u2000-\u206f]+'
+FOLD_CHARS = {
+    'ة': 'ه',   # ta marbuta -> ha
+    'ى': 'ي',   # alef maqsura -> ya
+}
+# arabic article and conjunction + article, stripped from the start of terms
+ARABIC_PREFIXES = ['وال', 'بال', 'كال', 'فال',
+                   'لل', 'ال']
+MIN_TERM_LENGTH = 2
+TITLE_WEIGHT = 5        # title words count as this many occurrences
+MAX_RESULTS = 20
+
+STOPWORDS = {
+    'en': 'a an and are as at be been but by can do for from has have how in into is it its '
+          'of on or that the their them there these they this to was we were what when which '
+          'who will with you your',
+    'fr': 'au aux avec ce ces dans de des du elle elles en est et il ils je la le les leur leurs '
+          'mais ne nous ou par pas plus pour qu que qui sa se ses son sont sur un une vos votre vous',
+    'sw': 'au cha hii hiyo hizi huo ili ja kama katika kila kuhusu kuwa kwa la lakini na ni pia '
+          'sana tu vya wa wakati ya yake yao za',
+    'ar': 'في من على إلى عن مع '
+          'أن إن هذا هذه ذلك التي '
+          'الذي أو ما لا كان هو '
+          'هي قد ثم كل بعض عند',
+}
+
+STRIP_RE = re.compile(STRIP_PATTERN)
+SPLIT_RE = re.compile(SPLIT_PATTERN)
+FOLD_TABLE = str.maketrans(FOLD_CHARS)
+
+
+
+
+
+# TOKENIZATION
+################################################################################
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFD', text.lower())
+    return STRIP_RE.sub('', text).translate(FOLD_TABLE)
+
+
+def get_stopwords(lang):
+    return sorted(set(normalize_text(word) for word in STOPWORDS.get(lang, '').split()))
+
+
+def get_prefixes(lang):
+    return ARABIC_PREFIXES if lang == 'ar' else []
+
+
+def tokenize(text, lang=None, stopwords=None, prefixes=None):
+    """
+    Split `text` into normalized search terms for `lang`, in order.
+    """
+    stopwords = set(get_stopwords(lang)) if stopwords is None else stopwords
+    prefixes = get_prefixes(lang) if prefixes is None else prefixes
+    terms = []
+    for token in SPLIT_RE.split(normalize_text(text)):
+        if token in stopwords:
+            continue
+        for prefix in prefixes:
+            if token.startswith(prefix) and len(token) - len(prefix) >= MIN_TERM_LENGTH:
+                token = token[len(prefix):]
+                break
+        if len(token) >= MIN_TERM_LENGTH and token not in stopwords:
+            terms.append(token)
+    return terms
+
+
+
+
+# INDEX
+################################################################################
+
+def build_search_index(docs, lang=None):
+    """
+    Build the inverted index for `docs`, a list of (filename, title, text).
+    Terms are sorted so that prefix lookups are a binary search, and the
+    postings of terms[i] are the flat list [doc, weight, doc, weight, ...].
+    """
+    stopwords = get_stopwords(lang)
+    prefixes = get_prefixes(lang)
+    postings_by_term = {}
+    for doc_num, (filename, title, text) in enumerate(docs):
+        counts = {}
+        for term in tokenize(text, stopwords=set(stopwords), prefixes=prefixes):
+            counts[term] = counts.get(term, 0) + 1
+        for term in tokenize(title, stopwords=set(stopwords), prefixes=prefixes):
+            counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term, count in counts.items():
+            postings_by_term.setdefault(term, []).extend([doc_num, count])
+    terms = sorted(postings_by_term.keys())
+    return dict(
+        version=SEARCH_INDEX_VERSION,
+        lang=lang,
+        strip=STRIP_PATTERN,
+        split=SPLIT_PATTERN,
+        fold=FOLD_CHARS,
+        prefixes=prefixes,
+        min_length=MIN_TERM_LENGTH,
+        stopwords=stopwords,
+        docs=[[filename, title] for filename, title, text in docs],
+        terms=terms,
+        postings=[postings_by_term[term] for term in terms],
+    )
+
+
+def dumps_search_index(index):
+    """
+    The index as a script that sets window.TESSA_SEARCH_INDEX, so the module
+    index page can load it with a <script> tag (no XHR, works from file://).
+    """
+    json_str = json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+    return 'window.' + SEARCH_INDEX_VAR + '=' + json_str + ';\n'
+
+
+def loads_search_index(js_str):
+    return json.loads(js_str[js_str.index('=') + 1:].rstrip().rstrip(';'))
+
+
+def write_search_index(docs, destination, lang=None):
+    """
+    Write the search index for `docs` to SEARCH_INDEX_FILENAME in `destination`.
+    Returns the filename to reference from the index page.
+    """
+    index = build_search_index(docs, lang=lang)
+    with open(os.path.join(destination, SEARCH_INDEX_FILENAME), 'w') as f:
+        f.write(dumps_search_index(index))
+    return SEARCH_INDEX_FILENAME
+
+
+def search(index, query, limit=MAX_RESULTS):
+    """
+    Same lookup as the search box script in module_index.html: every query term
+    is a prefix, docs must match all terms, ranked by sum of weight * idf
+    (exact term matches count double). Returns [(score, filename, title)].
+    """
+    terms = index['terms']
+    query_terms = tokenize(query, stopwords=set(index['stopwords']), prefixes=index['prefixes'])
+    if not query_terms:
+        return []
+    num_docs = len(index['docs'])
+    scores = None
+    for query_term in query_terms:
+        term_scores = {}
+        i = bisect.bisect_left(terms, query_term)
+        while i < len(terms) and terms[i].startswith(query_term):
+            postings = index['postings'][i]
+            idf = math.log(1 + num_docs / (len(postings) / 2))
+            boost = 2 if terms[i] == query_term else 1
+            for j in range(0, len(postings), 2):
+                term_scores[postings[j]] = term_scores.get(postings[j], 0) + postings[j+1] * idf * boost
+            i += 1
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = dict((doc, score + term_scores[doc]) for doc, score in scores.items() if doc in term_scores)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [(score, index['docs'][doc][0], index['docs'][doc][1]) for doc, score in ranked]
+
+
+
+
+# CLI
+################################################################################
+
+def load_zip_search_index(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        return loads_search_index(zf.read(SEARCH_INDEX_FILENAME).decode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the search index of a TESSA module zip')
+    parser.add_argument('zip_path', help='Module zip file')
+    parser.add_argument('query', nargs='+', help='Search query')
+    args = parser.parse_args()
+
+    index = load_zip_search_index(args.zip_path)
+    query = ' '.join(args.query)
+    start = time.time()
+    results = search(index, query)
+    elapsed = time.time() - start
+    for score, filename, title in results:
+        print('%8.2f  %-20s %s' % (score, filename, title))
+    print(len(index['docs']), 'docs,', len(index['terms']), 'terms; lookup took %.2f ms' % (elapsed * 1000))
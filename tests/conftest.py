@@ -0,0 +1,29 @@
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def serve():
+    """
+    Start a local stand-in server with the given request handler class.
+    Returns its base URL; servers are shut down after the test.
+    """
+    servers = []
+
+    def _serve(handler_class):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:%d' % server.server_address[1]
+
+    yield _serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,62 @@
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tessa_logging import LOG_COMPONENTS, get_logger, setup_logging, stop_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def root_handler():
+    """
+    Root logger set up like ricecooker's config_logger: INFO level, and a
+    console handler at INFO.
+    """
+    root_logger = logging.getLogger()
+    saved_level, saved_handlers = root_logger.level, list(root_logger.handlers)
+    saved_levels = dict((name, logging.getLogger(name).level) for name in LOG_COMPONENTS.values())
+    for handler in saved_handlers:
+        root_logger.removeHandler(handler)
+    handler = ListHandler(logging.INFO)
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.INFO)
+    yield handler
+    stop_logging()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    for handler in saved_handlers:
+        root_logger.addHandler(handler)
+    root_logger.setLevel(saved_level)
+    for name, level in saved_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def test_component_debug_level(root_handler):
+    setup_logging(levels={'sections': 'DEBUG'})
+    get_logger('sections').debug('section %s', '1.2')
+    get_logger('chef').debug('hidden, chef stays at INFO')
+    get_logger('assets').info('hidden, assets default to WARNING')
+    logging.getLogger('some.library').debug('hidden, root stays at INFO')
+    get_logger('chef').info('chef info')
+    stop_logging()   # flushes the queue
+    assert [record.getMessage() for record in root_handler.records] == ['section 1.2', 'chef info']
+    assert root_handler.level == logging.INFO   # put back as it was
+
+
+def test_import_keeps_logging_state():
+    code = ('import logging, tessa_logging\n'
+            'print(logging.getLogger("tessa.assets").level, logging.getLogger("cachecontrol").level)\n')
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=repo_dir)
+    assert output.split() == [b'0', b'0']
@@ -0,0 +1,146 @@
+import http.server
+import json
+import os
+import socket
+
+import pytest
+import requests
+
+import tessa_media
+from tessa_media import download_resumable
+
+
+DATA = bytes(range(256)) * 1200 + b'tail'
+CHUNK_SIZE = 4096   # smaller than the cut-off responses, whose last partial chunk is lost
+
+
+class MediaHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for a pluginfile.php download. Subclasses set the class attributes
+    to make the server drop connections, ignore Range, or change the file.
+    """
+    protocol_version = 'HTTP/1.1'
+    data = DATA
+    etag = '"v1"'
+    drops = 0              # number of responses cut off after a third of the body
+    hang_up = False        # close every connection without a response
+    ignore_range = False
+    send_length = True
+    requests = None        # (Range, If-Range) of each request
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        range_header, if_range = self.headers.get('Range'), self.headers.get('If-Range')
+        cls.requests.append((range_header, if_range))
+        if cls.hang_up:
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+            return
+        start = 0
+        if range_header and not cls.ignore_range and if_range in (None, cls.etag):
+            start = int(range_header.split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(cls.data) - 1, len(cls.data)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', cls.etag)
+        if cls.send_length:
+            self.send_header('Content-Length', str(len(cls.data) - start))
+        else:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        body = memoryview(cls.data)[start:]
+        cut_off = cls.drops > 0
+        if cut_off:
+            cls.drops -= 1
+            body = body[:len(body) // 3]
+        self.wfile.write(body)
+        self.wfile.flush()
+        if cut_off or not cls.send_length:
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(tessa_media, 'MEDIA_RETRY_DELAY', 0.01)
+
+
+def start(serve, **attrs):
+    handler_class = type('Handler', (MediaHandler,), dict(attrs, requests=[]))
+    return handler_class, serve(handler_class) + '/pluginfile.php/1/mod_resource/content/1/song.mp3'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resumes_dropped_connection(serve, tmp_path):
+    handler_class, url = start(serve, drops=2)
+    dest = str(tmp_path / 'song.mp3')
+    assert download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE,
+                              expected_length=len(DATA)) == dest
+    assert read(dest) == DATA
+    assert len(handler_class.requests) == 3 and handler_class.requests[0] == (None, None)
+    offsets = [int(range_header[len('bytes='):-1]) for range_header, if_range in handler_class.requests[1:]]
+    assert 0 < offsets[0] <= len(DATA) // 3 < offsets[1]   # resumed where each response stopped
+    assert all(if_range == '"v1"' for range_header, if_range in handler_class.requests[1:])
+    assert not os.path.exists(dest + '.part') and not os.path.exists(dest + '.part.json')
+
+
+def test_server_ignores_range(serve, tmp_path):
+    handler_class, url = start(serve, drops=1, ignore_range=True)
+    dest = str(tmp_path / 'song.mp3')
+    download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE)
+    assert read(dest) == DATA   # the 200 response is written from the start, not appended
+    assert len(handler_class.requests) == 2 and handler_class.requests[1][0] is not None
+
+
+def test_leftover_part_file(serve, tmp_path):
+    handler_class, url = start(serve)
+    dest = str(tmp_path / 'song.mp3')
+    with open(dest + '.part', 'wb') as f:
+        f.write(DATA[:1000])
+    with open(dest + '.part.json', 'w') as json_file:
+        json.dump(dict(url=url, total=len(DATA), validator='"v1"'), json_file)
+    download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE)
+    assert read(dest) == DATA
+    assert handler_class.requests == [('bytes=1000-', '"v1"')]
+
+
+def test_changed_file_restarts(serve, tmp_path):
+    new_data = DATA[::-1]
+    handler_class, url = start(serve, data=new_data, etag='"v2"')
+    dest = str(tmp_path / 'song.mp3')
+    with open(dest + '.part', 'wb') as f:
+        f.write(DATA[:1000])
+    with open(dest + '.part.json', 'w') as json_file:
+        json.dump(dict(url=url, total=len(DATA), validator='"v1"'), json_file)
+    download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE)
+    assert read(dest) == new_data   # If-Range didn't match, so the server sent the new file
+    assert handler_class.requests == [('bytes=1000-', '"v1"')]
+
+
+def test_gives_up_after_max_retries(serve, tmp_path):
+    handler_class, url = start(serve, hang_up=True)
+    dest = str(tmp_path / 'song.mp3')
+    with pytest.raises(RuntimeError, match='no progress in 2 attempts'):
+        download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE, max_retries=2)
+    assert len(handler_class.requests) == 3
+    assert not os.path.exists(dest)
+
+
+def test_expected_length_mismatch(serve, tmp_path):
+    # no Content-Length and the connection closes early: only expected_length
+    # tells that the file is truncated
+    handler_class, url = start(serve, data=DATA[:5000], send_length=False)
+    dest = str(tmp_path / 'song.mp3')
+    with pytest.raises(RuntimeError, match='has 5000 bytes, expected %d' % len(DATA)):
+        download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE, expected_length=len(DATA))
+    assert not os.path.exists(dest)
+    download_resumable(requests.Session(), url, dest, chunk_size=CHUNK_SIZE, expected_length=5000)
+    assert read(dest) == DATA[:5000]
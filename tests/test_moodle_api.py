@@ -0,0 +1,198 @@
+import http.server
+import json
+from urllib.parse import parse_qs
+
+import pytest
+
+from tessa_moodle_api import MoodleApiCrawler
+
+
+COURSE_URL = 'http://www.open.edu/openlearncreate/'
+TOKEN = 'test-token'
+
+# core_course_get_contents for course 2042 (TESSA en): a subpage with a module
+# and a PDF, a mod/url link to that module, an external link, and the audio
+# resources subpage with one topic subpage
+COURSE_CONTENTS = [
+    dict(id=1, name='General', modules=[
+        dict(id=100, modname='subpage', instance=10, name='Literacy',
+             url=COURSE_URL + 'mod/subpage/view.php?id=100'),
+        dict(id=101, modname='url', name='Literacy module 1 (link)',
+             url=COURSE_URL + 'mod/url/view.php?id=101',
+             contents=[dict(type='url', fileurl=COURSE_URL + 'mod/oucontent/view.php?id=200')]),
+        dict(id=102, modname='url', name='External site', url=COURSE_URL + 'mod/url/view.php?id=102',
+             contents=[dict(type='url', fileurl='http://example.com/tessa')]),
+        dict(id=66697, modname='subpage', instance=11, name='Audio resources',
+             url=COURSE_URL + 'mod/subpage/view.php?id=66697'),
+    ]),
+    dict(id=2, name='', component='mod_subpage', itemid=10, modules=[
+        dict(id=200, modname='oucontent', name='Literacy module 1',
+             url=COURSE_URL + 'mod/oucontent/view.php?id=200'),
+        dict(id=201, modname='resource', name='Teacher guide', url=COURSE_URL + 'mod/resource/view.php?id=201',
+             contents=[dict(type='file', mimetype='application/pdf', filesize=12345,
+                            fileurl=COURSE_URL + 'webservice/pluginfile.php/5/mod_resource/content/1/guide.pdf')]),
+        dict(id=202, modname='oucontent', name='Hidden module', uservisible=False,
+             url=COURSE_URL + 'mod/oucontent/view.php?id=202'),
+    ]),
+    dict(id=3, name='', component='mod_subpage', itemid=11, modules=[
+        dict(id=300, modname='subpage', instance=12, name='Numeracy audio',
+             url=COURSE_URL + 'mod/subpage/view.php?id=300'),
+    ]),
+    dict(id=4, name='Counting songs', component='mod_subpage', itemid=12, modules=[
+        dict(id=400, modname='label', name='label', description='<p>Songs for <b>counting</b></p>'),
+        dict(id=401, modname='resource', name='Song 1', url=COURSE_URL + 'mod/resource/view.php?id=401',
+             contents=[dict(type='file', mimetype='audio/mpeg', filesize=2048,
+                            fileurl=COURSE_URL + 'webservice/pluginfile.php/6/mod_resource/content/1/song1.mp3')]),
+        dict(id=402, modname='resource', name='Song words', url=COURSE_URL + 'mod/resource/view.php?id=402',
+             contents=[dict(type='file', mimetype='text/plain', filesize=10,
+                            fileurl=COURSE_URL + 'webservice/pluginfile.php/6/mod_resource/content/1/words.txt')]),
+    ]),
+    dict(id=5, name=' ', component='mod_subpage', itemid=12, modules=[]),
+]
+
+
+class MoodleWsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for the Moodle REST endpoint (webservice/rest/server.php).
+    """
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path == '/broken/server.php':
+            self.send_json(500, dict(error='internal'))
+            return
+        length = int(self.headers['Content-Length'])
+        params = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        assert params['moodlewsrestformat'] == 'json'
+        if params['wstoken'] != TOKEN:
+            self.send_json(200, dict(exception='moodle_exception', errorcode='invalidtoken',
+                                     message='Invalid token - token not found'))
+        elif params['wsfunction'] == 'core_course_get_contents' and params['courseid'] == '2042':
+            self.send_json(200, COURSE_CONTENTS)
+        else:
+            self.send_json(200, dict(exception='invalid_parameter_exception', errorcode='invalidparameter',
+                                     message='Invalid parameter value detected'))
+
+
+@pytest.fixture
+def ws_url(serve):
+    return serve(MoodleWsHandler) + '/webservice/rest/server.php'
+
+
+def make_crawler(ws_url, token=TOKEN):
+    return MoodleApiCrawler(lang='en', ws_url=ws_url, ws_token=token, main_source_domain='http://www.open.edu')
+
+
+def get_kinds_and_titles(node):
+    return [(child['kind'], child.get('title'), get_kinds_and_titles(child)) for child in node.get('children', [])]
+
+
+def test_get_course_sections(ws_url):
+    crawler = make_crawler(ws_url)
+    top_sections = crawler.get_course_sections()
+    assert [section['id'] for section in top_sections] == [1]
+    assert sorted(crawler.subpage_sections) == ['10', '11', '12']
+    assert [section['id'] for section in crawler.subpage_sections['12']] == [4, 5]
+    assert set(crawler.modules_by_id) == set(['100', '101', '102', '66697', '200', '201', '202', '300',
+                                              '400', '401', '402'])
+    subpage_module = crawler.modules_by_id['100']
+    assert [module['id'] for module in crawler.get_section_modules(subpage_module)] == [200, 201, 202]
+
+
+def test_resolve_module(ws_url):
+    crawler = make_crawler(ws_url)
+    crawler.get_course_sections()
+    modules = crawler.modules_by_id
+    # not a link: returned as it is
+    assert crawler.resolve_module(modules['100']) == ('subpage', modules['100']['url'], modules['100'])
+    # link to a module in the course: followed to that module
+    assert crawler.resolve_module(modules['101']) == ('oucontent', COURSE_URL + 'mod/oucontent/view.php?id=200',
+                                                      modules['200'])
+    # link to a module that isn't in the course contents: still a module
+    link = dict(modname='url', url=COURSE_URL + 'mod/url/view.php?id=9',
+                contents=[dict(type='url', fileurl=COURSE_URL + 'mod/oucontent/view.php?id=999')])
+    assert crawler.resolve_module(link) == ('oucontent', COURSE_URL + 'mod/oucontent/view.php?id=999', link)
+    # external links and links without contents are skipped
+    assert crawler.resolve_module(modules['102']) == (None, 'http://example.com/tessa', None)
+    assert crawler.resolve_module(dict(modname='url', url=COURSE_URL + 'mod/url/view.php?id=8')) \
+        == (None, COURSE_URL + 'mod/url/view.php?id=8', None)
+
+
+def test_add_audio_resource_sections(ws_url):
+    crawler = make_crawler(ws_url)
+    crawler.get_course_sections()
+    topic_url = COURSE_URL + 'mod/subpage/view.php?id=300'
+    topic_subpage_dict = dict(kind='audio_resource_topic_subpage', url=topic_url, title='Numeracy audio', children=[])
+    crawler.add_audio_resource_sections(topic_subpage_dict, crawler.modules_by_id['300'])
+    assert topic_subpage_dict['children'] == [
+        dict(
+            kind='TessaAudioResourceSection',
+            url=topic_url + '#Counting+songs',
+            source_id=topic_url + '#Counting+songs',
+            title='Counting songs',
+            description='Songs for counting',
+            children=[
+                {
+                    'kind': 'MediaWebResource',
+                    'url': COURSE_URL + 'pluginfile.php/6/mod_resource/content/1/song1.mp3',
+                    'original_url': COURSE_URL + 'mod/resource/view.php?id=401',
+                    'title': 'Song 1',
+                    'children': [],
+                    'content-type': 'audio/mp3',
+                    'content-length': '2048',
+                },
+            ],
+        ),
+    ]
+
+
+def test_crawl(ws_url, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # the tree and HEAD cache are written to chefdata/
+    crawler = make_crawler(ws_url)
+    tree = crawler.crawl()
+    assert crawler.request_stats['requests'] == 1
+    # breadth-first like the crawler: the module is placed where the top-level
+    # link to it is, not again on the subpage; the hidden module and the txt
+    # file are left out
+    assert get_kinds_and_titles(tree) == [
+        ('TessaSubpage', 'Literacy', [
+            ('TessaPDFDocument', 'Teacher guide', []),
+        ]),
+        ('TessaModule', 'Literacy module 1 (link)', []),
+        ('TessaAudioResourcesSubpage', 'Audio resources', [
+            ('TessaAudioResourceTopicSubpage', 'Numeracy audio', [
+                ('TessaAudioResourceSection', 'Counting songs', [
+                    ('TessaAudioResouce', 'Song 1', []),
+                ]),
+            ]),
+        ]),
+    ]
+    pdf_node = tree['children'][0]['children'][0]
+    assert pdf_node['content-length'] == '12345'
+    assert pdf_node['url'] == COURSE_URL + 'pluginfile.php/5/mod_resource/content/1/guide.pdf'
+    assert (tmp_path / 'chefdata' / 'trees' / 'web_resource_tree_en.json').exists()
+
+
+def test_error_responses(ws_url, serve):
+    with pytest.raises(ValueError, match='invalidtoken'):
+        make_crawler(ws_url, token='wrong-token').get_course_sections()
+    with pytest.raises(ValueError, match='invalidparameter'):
+        make_crawler(ws_url).call_ws('core_course_get_contents', courseid='1')
+    broken_url = ws_url.replace('/webservice/rest/', '/broken/')
+    with pytest.raises(ValueError, match='core_course_get_contents failed'):
+        make_crawler(broken_url).get_course_sections()
+
+
+def test_needs_token(monkeypatch):
+    monkeypatch.delenv('MOODLE_WS_TOKEN', raising=False)
+    with pytest.raises(ValueError, match='token'):
+        MoodleApiCrawler(lang='en', main_source_domain='http://www.open.edu')
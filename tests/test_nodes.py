@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from tessa_nodes import Node, dumps_binary, dumps_json, load_tree, loads_binary, loads_json, save_tree
+
+
+TREE = dict(
+    kind='TessaLangWebRessourceTree',
+    url='http://www.open.edu/openlearncreate/course/view.php?id=2042',
+    title='TESSA',
+    lang='en',
+    children=[
+        dict(kind='TessaSubpage', source_id='subpage:100', url='http://www.open.edu/subpage/view.php?id=100',
+             title='Literacy', lang='en', children=[
+                 dict(kind='TessaAudioResouce', source_id='song1.mp3', url='http://www.open.edu/song1.mp3',
+                      title='Song 1', children=[], **{'content-type': 'audio/mp3', 'content-length': '2048'}),
+             ]),
+        dict(kind='TessaModule', source_id='oucontent:200', url='http://www.open.edu/view.php?id=200',
+             title=None, lang='en', description=None, children=None),
+    ],
+)
+
+
+def test_dict_access():
+    node = Node.from_dict(TREE)
+    assert node['kind'] == 'TessaLangWebRessourceTree'
+    assert node.get('source_id') is None and 'source_id' not in node
+    audio = node['children'][0]['children'][0]
+    assert audio['content-length'] == '2048'
+    assert audio.get('description', '') == ''
+    with pytest.raises(KeyError):
+        audio['description']
+
+
+def test_none_values():
+    module = Node.from_dict(TREE)['children'][1]
+    # keys present with a None value behave as in the dict
+    assert 'title' in module and module['title'] is None
+    assert 'children' in module and module.get('children', []) is None
+    assert 'description' in module and module['description'] is None
+    assert module.to_dict() == TREE['children'][1]
+
+
+def test_round_trips(tmp_path):
+    node = Node.from_dict(TREE)
+    assert node.to_dict() == TREE
+    assert loads_json(dumps_json(node)).to_dict() == TREE
+    assert loads_binary(dumps_binary(node)) == node
+    assert loads_binary(dumps_binary(node)).to_dict() == TREE
+    for filename in ['tree.json', 'tree.nodes']:
+        path = str(tmp_path / filename)
+        save_tree(node, path)
+        assert load_tree(path).to_dict() == TREE
+    assert json.loads(open(str(tmp_path / 'tree.json')).read()) == TREE
+
+
+def test_parent_links_are_dropped():
+    child = dict(kind='TessaModule', title='M')
+    tree = dict(kind='TessaSubpage', children=[child])
+    child['parent'] = tree
+    assert Node.from_dict(tree).to_dict() == dict(kind='TessaSubpage', children=[dict(kind='TessaModule', title='M')])
+
+
+def test_bad_binary_header():
+    with pytest.raises(ValueError):
+        loads_binary(b'not a tree')
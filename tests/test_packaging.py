@@ -0,0 +1,78 @@
+from concurrent.futures import Future
+import zipfile
+
+from tessa_packaging import _compress_in_order, compress_zip_entry, minify_html, write_predictable_zip
+
+
+def test_whitespace_and_comments():
+    html = '<p>Hello   <b>big</b>\n\n  world</p><!-- note --><!--[if IE]><p>old</p><![endif]-->'
+    assert minify_html(html) == '<p>Hello <b>big</b>\nworld</p><!--[if IE]><p>old</p><![endif]-->'
+
+
+def test_preserved_blocks():
+    html = '<pre>a   b\n\n c</pre>  <script>if (a  >  b) { x(); }</script>'
+    assert minify_html(html) == '<pre>a   b\n\n c</pre> <script>if (a  >  b) { x(); }</script>'
+
+
+def test_empty_wrappers():
+    assert minify_html('<div><span></span></div><p>a</p>') == '<p>a</p>'
+    assert minify_html('<div class="clear"></div>') == '<div class="clear"></div>'
+    # a wrapper around the only space between two words keeps the space
+    assert minify_html('<p>Hello<span> </span>world</p>') == '<p>Hello world</p>'
+    assert minify_html('<p>Hello<div><span>\n</span></div>world</p>') == '<p>Hello\nworld</p>'
+
+
+def test_quoted_attributes():
+    # tags are kept byte for byte, also with > inside quoted attribute values
+    html = '<img alt="a > b"  src="x.png"/>  <a title=\'x  >  y\' href="#">t</a>'
+    assert minify_html(html) == '<img alt="a > b"  src="x.png"/> <a title=\'x  >  y\' href="#">t</a>'
+    doctype = '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">'
+    assert minify_html(doctype + '\n\n<html>') == doctype + '\n<html>'
+
+
+def make_module_dir(path):
+    (path / 'Shared').mkdir()
+    (path / 'index.html').write_text('<html>' + 'text ' * 5000 + '</html>')
+    (path / 'Shared' / 'styles.css').write_text('p { margin: 0; }\n' * 100)
+    (path / 'Shared' / 'logo.png').write_bytes(bytes(range(256)) * 40)
+    (path / 'section-2_1.html').write_text('<p>é ü ا</p>')
+    (path / 'élève.html').write_text('<p>nom</p>')
+
+
+def test_predictable_zip(tmp_path):
+    directory = tmp_path / 'module'
+    directory.mkdir()
+    make_module_dir(directory)
+    zips = []
+    for workers in [1, 2, 8]:
+        zip_path = str(tmp_path / ('out_%d.zip' % workers))
+        assert write_predictable_zip(str(directory), zip_path, workers=workers)[0] == 5
+        with open(zip_path, 'rb') as f:
+            zips.append(f.read())
+    assert zips[0] == zips[1] == zips[2]
+    with zipfile.ZipFile(str(tmp_path / 'out_1.zip')) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == sorted(zf.namelist())
+        assert zf.getinfo('Shared/logo.png').compress_type == zipfile.ZIP_STORED
+        assert zf.read('élève.html') == (directory / 'élève.html').read_bytes()
+
+
+def test_compress_window(tmp_path):
+    class RecordingExecutor(object):
+        submitted = 0
+        def submit(self, fn, *args):
+            self.submitted += 1
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+    paths = []
+    for i in range(20):
+        path = tmp_path / ('%02d.html' % i)
+        path.write_text('<p>%d</p>' % i)
+        paths.append(str(path))
+    executor = RecordingExecutor()
+    results = []
+    for result in _compress_in_order(executor, paths, 6, window=3):
+        assert executor.submitted - len(results) <= 3   # entries not written yet
+        results.append(result)
+    assert results == [compress_zip_entry(path, 6) for path in paths]
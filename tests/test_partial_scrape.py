@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+from tessa_chef import partial_scraping_part
+from tessa_nodes import Node, save_tree
+
+
+@pytest.fixture
+def trees(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('chefdata', 'trees'))
+    web_resource_tree = dict(kind='TessaLangWebRessourceTree', children=[
+        dict(source_id='broken', title='Link without kind', children=[]),
+        dict(kind='TessaResource', source_id='resource', title='Skipped kind', children=[]),
+    ])
+    save_tree(Node.from_dict(web_resource_tree), os.path.join('chefdata', 'trees', 'web_resource_tree_en.json'))
+    with open(os.path.join('chefdata', 'trees', 'ricecooker_json_tree_en.json'), 'w') as json_file:
+        json.dump(dict(title='TESSA', children=[]), json_file)
+
+
+def test_unknown_source_id(trees):
+    with pytest.raises(ValueError, match='source_id missing not found in the web resource tree'):
+        partial_scraping_part(dict(lang='en', only='missing'))
+
+
+@pytest.mark.parametrize('source_id', ['broken', 'resource'])
+def test_source_id_without_node(trees, source_id):
+    with pytest.raises(ValueError, match='source_id ' + source_id + ' of kind .* does not produce a node'):
+        partial_scraping_part(dict(lang='en', only=source_id))
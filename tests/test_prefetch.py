@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+import tessa_chef
+from tessa_chef import SectionPrefetcher
+
+
+MODULE_URL = 'http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=105334'
+
+
+class FakeResponse(object):
+    def __init__(self, url):
+        self.url = url
+        self.content = ('<p>' + url + '</p>').encode('utf-8')
+        self.headers = {}
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    """
+    URLs requested through make_request, in the job thread or the prefetch threads.
+    """
+    urls = []
+    lock = threading.Lock()
+    def make_request(url, *args, **kwargs):
+        with lock:
+            urls.append(url)
+        return FakeResponse(url)
+    monkeypatch.setattr(tessa_chef, 'make_request', make_request)
+    return urls
+
+
+def test_prefetched_pages_need_the_same_url(requested):
+    with SectionPrefetcher(MODULE_URL, window=2) as prefetcher:
+        prefetcher.get(MODULE_URL)
+        assert sorted(prefetcher.inflight) == sorted(MODULE_URL + '&section=' + guess
+                                                     for guess in ['1.1', '2', '2.1'])
+        doc = prefetcher.get(MODULE_URL + '&section=1.1#top')
+        assert doc.p.get_text() == MODULE_URL + '&section=1.1'
+        assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+        # same section number, but another module or extra parameters: not the guessed page
+        for url in [MODULE_URL.replace('105334', '105335') + '&section=1.2',
+                    MODULE_URL + '&section=1.2&content=scxml']:
+            assert prefetcher.get(url).p.get_text() == url
+        assert (prefetcher.hits, prefetcher.misses) == (1, 3)
+
+
+def test_close_on_error(requested):
+    with pytest.raises(ValueError):
+        with SectionPrefetcher(MODULE_URL, window=2) as prefetcher:
+            prefetcher.get(MODULE_URL)
+            raise ValueError('write_section failed')
+    assert prefetcher.inflight == {}
+    assert prefetcher.executor._shutdown
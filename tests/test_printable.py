@@ -0,0 +1,62 @@
+import bs4
+
+from tessa_chef import split_printable_module
+
+
+MODULE_URL = 'http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=200'
+
+# printable view of a module with nested section wrappers, and content headings
+# that are also in (or equal to) TOC titles at other levels
+PRINTABLE_HTML = (
+    '<section id="region-main">'
+    '<div class="course-details-content-header"><h2>Literacy module 1</h2></div>'
+    '<div class="oucontent-section" id="s1"><h2>1 Introduction</h2><p>intro</p>'
+    '<h3>Activity 1</h3><p>do it</p>'
+    '<div class="oucontent-section" id="s1_1"><h3>1.1 Activity 1: reading aloud</h3><p>read</p></div>'
+    '<div class="oucontent-section" id="s1_2"><h3>Summary</h3><p>sum</p><h4>Resources</h4><p>list</p></div>'
+    '</div>'
+    '<div class="oucontent-section" id="s2"><h2>2 Resources</h2><p>res</p></div>'
+    '</section>'
+)
+
+
+def make_toc(subsection_titles=('Activity 1: reading aloud', 'Summary')):
+    subsections = [dict(title=title, href=MODULE_URL + '&section=1.%d' % i, filename='section-1_%d.html' % i)
+                   for i, title in enumerate(subsection_titles, 1)]
+    return dict(title='Literacy module 1', children=[
+        dict(title='1 Introduction', href=MODULE_URL, filename='section-1.html', children=subsections),
+        dict(title='2 Resources', href=MODULE_URL + '&section=2', filename='section-2.html', children=[]),
+    ])
+
+
+def split(html=PRINTABLE_HTML, toc=None):
+    return split_printable_module(bs4.BeautifulSoup(html, 'html.parser'), toc or make_toc())
+
+
+def test_split_nested_sections():
+    sections = split()
+    assert [entry['filename'] for entry, section in sections] == \
+        ['section-1.html', 'section-1_1.html', 'section-1_2.html', 'section-2.html']
+    # each part is well-formed and keeps the wrappers around it
+    assert [str(section) for entry, section in sections] == [
+        '<section id="region-main"><div class="oucontent-section" id="s1"><h2>1 Introduction</h2><p>intro</p>'
+        '<h3>Activity 1</h3><p>do it</p></div></section>',
+        '<section id="region-main"><div class="oucontent-section" id="s1">'
+        '<div class="oucontent-section" id="s1_1"><h3>1.1 Activity 1: reading aloud</h3><p>read</p></div>'
+        '</div></section>',
+        '<section id="region-main"><div class="oucontent-section" id="s1">'
+        '<div class="oucontent-section" id="s1_2"><h3>Summary</h3><p>sum</p><h4>Resources</h4><p>list</p></div>'
+        '</div></section>',
+        '<section id="region-main"><div class="oucontent-section" id="s2"><h2>2 Resources</h2><p>res</p></div>'
+        '</section>',
+    ]
+
+
+def test_split_falls_back():
+    # a TOC entry without its heading
+    assert split(toc=make_toc(['Activity 1: reading aloud', 'Summary', 'Glossary'])) is None
+    # a heading in the content with the same title as a subsection
+    html = PRINTABLE_HTML.replace('<p>res</p>', '<h3>Summary</h3><p>res</p>')
+    assert split(html) is None
+    # no printable content
+    assert split('<section id="other"></section>') is None
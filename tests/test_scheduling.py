@@ -0,0 +1,53 @@
+import bs4
+
+import tessa_chef
+from tessa_cralwer import get_section_count
+
+
+MODULE_URL = 'http://www.open.edu/openlearncreate/mod/oucontent/view.php?id=%d'
+
+
+def make_module_page(sections):
+    """
+    Module page with the TOC sidebar of oucontent modules: `sections` is a list
+    of the number of subsections of each section.
+    """
+    section_lis = []
+    for num, num_subsections in enumerate(sections, 1):
+        subsection_lis = ''.join('<li><a href="?section=%d.%d">%d.%d</a></li>' % (num, sub, num, sub)
+                                 for sub in range(1, num_subsections + 1))
+        current = ' class="oucontent-tree-current"' if num == 1 else ''
+        section_lis.append('<li%s><span class="oucontent-tree-item">Section %d</span><ul>%s</ul></li>'
+                           % (current, num, subsection_lis))
+    html = ('<ul><li class="item-section"><a>Module</a><ul class="child-item-list">'
+            '<div class="oucontent-contents"><ul>' + ''.join(section_lis) + '</ul></div>'
+            '</ul></li></ul>')
+    return bs4.BeautifulSoup(html, 'html.parser')
+
+
+def test_get_section_count():
+    assert get_section_count(make_module_page([0, 3, 2])) == 8
+    assert get_section_count(make_module_page([4])) == 1   # simple module, one page
+    assert get_section_count(bs4.BeautifulSoup('<div class="oucontent-contents"></div>', 'html.parser')) is None
+
+
+def test_expected_seconds_without_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(tessa_chef, 'MODULE_MEMO', tessa_chef.ModuleMemo(str(tmp_path / 'memo')))
+    scheduler = tessa_chef.ScrapeScheduler(workers=2, history=tessa_chef.ScrapeHistory(str(tmp_path / 'h.json')))
+    def make_job(module_id, **attrs):
+        source_node = dict(kind='TessaModule', url=MODULE_URL % module_id, source_id=str(module_id),
+                           lang='en', **attrs)
+        return tessa_chef.ScrapeJob(source_node, {}, None)
+    small, big, unknown = make_job(1, section_count=2), make_job(2, section_count=40), make_job(3)
+    seconds_per_page = tessa_chef.SCRAPE_SECONDS_PER_PAGE
+    assert scheduler.expected_seconds(small) == 2 * seconds_per_page
+    assert scheduler.expected_seconds(big) == 40 * seconds_per_page
+    assert scheduler.expected_seconds(unknown) == tessa_chef.ESTIMATE_DEFAULTS['module_pages'] * seconds_per_page
+
+    order = []
+    for job in [small, unknown, big]:
+        job.run = lambda job=job: order.append(job.source_node['source_id'])
+        scheduler.add(job)
+    scheduler.workers = 1
+    scheduler.run()
+    assert order == ['2', '3', '1']   # longest first